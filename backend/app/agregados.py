@@ -0,0 +1,489 @@
+"""
+Tablas de agregados (1 minuto, 1 hora, 1 día) de la tabla 'mediciones'.
+
+Cada tabla guarda por intervalo el mínimo, máximo, promedio, cantidad
+y percentil 95 de cada métrica, de cada estación y de toda la red (con
+estacion_id = RED, porque el percentil no se puede combinar a partir de
+los de cada estación). Se actualizan de forma incremental: solo
+se recalculan los intervalos que cambiaron desde el último refresco, sin
+volver a recorrer el histórico.
+
+Los minutos se calculan desde las filas crudas; las horas, desde los
+minutos, y los días, desde las horas, combinando mínimos, máximos,
+cantidades y promedios ponderados. El percentil no se combina: el de
+las horas y los días se recalcula desde las filas crudas en una pasada
+aparte (refrescar_percentiles), como mucho cada INTERVALO_PERCENTILES
+segundos, y hasta entonces conserva el valor anterior.
+
+Los intervalos cambiados se registran en 'agregados_pendientes' con
+disparadores sobre 'mediciones', en la misma transacción que cada
+INSERT, UPDATE o DELETE. Un refresco solo ve los registros de las
+transacciones ya confirmadas, por lo que, a diferencia de una marca de
+agua sobre el id, no saltea las filas de una transacción que obtuvo sus
+ids antes que otra pero se confirmó después.
+
+Uso desde la línea de comandos (desde backend/):
+    python -m app.agregados crear
+    python -m app.agregados refrescar
+    python -m app.agregados reconstruir [desde] [hasta]
+"""
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from .db import conexion
+from .esquema import NOMBRES_AGREGABLES
+from .registro import configurar_registro
+
+logger = logging.getLogger(__name__)
+
+# Métricas agregadas: las del registro de app.esquema salvo las crudas
+METRICAS = NOMBRES_AGREGABLES
+
+# Estadísticas por métrica: sufijo de columna -> expresión SQL
+ESTADISTICAS = {
+    "min": "min({0})",
+    "max": "max({0})",
+    "avg": "avg({0})",
+    "n": "count({0})",
+    "p95": "percentile_cont(0.95) WITHIN GROUP (ORDER BY {0})",
+}
+
+# Estadísticas de un intervalo a partir de las de los intervalos de la
+# resolución anterior que contiene: sufijo de columna -> expresión SQL
+COMBINACIONES = {
+    "min": "min({0}_min)",
+    "max": "max({0}_max)",
+    "avg": "sum({0}_avg::float8 * {0}_n) / nullif(sum({0}_n), 0)",
+    "n": "sum({0}_n)",
+}
+
+# Resoluciones de la más fina a la más gruesa: nombre -> (tabla, campo de date_trunc, segundos)
+RESOLUCIONES = {
+    "1m": ("mediciones_1m", "minute", 60),
+    "1h": ("mediciones_1h", "hour", 3600),
+    "1d": ("mediciones_1d", "day", 86400),
+}
+
+# Segundos mínimos entre dos pasadas de percentiles de horas y días
+# desde un mismo proceso
+INTERVALO_PERCENTILES = float(os.environ.get("AGREGADOS_INTERVALO_PERCENTILES_SEGUNDOS", "300"))
+
+# Días de mediciones que se registran y recalculan por transacción al reconstruir
+DIAS_POR_BLOQUE = 7
+
+# Puntos por serie que se devuelven como máximo si no se indica otro valor
+PUNTOS_POR_DEFECTO = 1000
+
+# estacion_id de las filas de toda la red (los ids de estación empiezan en 1)
+RED = 0
+
+
+def _columnas_estadisticas(metricas=METRICAS):
+    return [f"{metrica}_{sufijo}" for metrica in metricas for sufijo in ESTADISTICAS]
+
+
+# Registro de los minutos con filas insertadas, modificadas o eliminadas.
+# Las tablas de transición solo admiten un evento por disparador
+SQL_DISPARADORES = """
+    CREATE TABLE IF NOT EXISTS agregados_pendientes (
+        bucket TIMESTAMP NOT NULL                  -- Minuto con filas cambiadas
+    );
+
+    -- Horas con el percentil de las horas y los días desactualizado
+    CREATE TABLE IF NOT EXISTS agregados_percentiles_pendientes (
+        bucket TIMESTAMP NOT NULL                  -- Hora con filas cambiadas
+    );
+
+    CREATE OR REPLACE FUNCTION marcar_agregados_pendientes() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO agregados_pendientes (bucket)
+            SELECT DISTINCT date_trunc('minute', fecha_hora) FROM nuevas;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO agregados_pendientes (bucket)
+            SELECT DISTINCT date_trunc('minute', fecha_hora) FROM viejas;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER mediciones_agregados_insertar
+        AFTER INSERT ON mediciones REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_agregados_pendientes();
+    CREATE OR REPLACE TRIGGER mediciones_agregados_actualizar
+        AFTER UPDATE ON mediciones REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_agregados_pendientes();
+    CREATE OR REPLACE TRIGGER mediciones_agregados_eliminar
+        AFTER DELETE ON mediciones REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_agregados_pendientes();
+
+    -- Tablas creadas con la marca de agua anterior: se registran las
+    -- filas que aún no se habían agregado
+    DO $$
+    BEGIN
+        IF to_regclass('agregados_estado') IS NOT NULL THEN
+            INSERT INTO agregados_pendientes (bucket)
+            SELECT DISTINCT date_trunc('minute', fecha_hora) FROM mediciones
+            WHERE id > (SELECT ultimo_id FROM agregados_estado WHERE id = 1);
+            DROP TABLE agregados_estado;
+        END IF;
+    END;
+    $$;
+"""
+
+# Toma los registros pendientes confirmados y los borra; los de
+# transacciones aún abiertas quedan para el próximo refresco
+SQL_TOMAR_PENDIENTES = """
+    CREATE TEMP TABLE agregados_modificados (bucket TIMESTAMP PRIMARY KEY) ON COMMIT DROP;
+    WITH tomados AS (DELETE FROM agregados_pendientes RETURNING bucket)
+    INSERT INTO agregados_modificados SELECT DISTINCT bucket FROM tomados;
+"""
+
+# Clave del advisory lock que serializa los refrescos: uno más viejo no
+# debe sobrescribir los intervalos que otro ya recalculó con más filas
+BLOQUEO_REFRESCO = 0x61677265
+# Clave del advisory lock que serializa las pasadas de percentiles
+BLOQUEO_PERCENTILES = 0x70393563
+
+# Momento (time.monotonic) de la última pasada de percentiles del proceso
+_ultimos_percentiles = None
+
+
+def crear_tablas_agregadas():
+    """
+    Crea las tablas de agregados, la tabla de intervalos pendientes y
+    los disparadores que la llenan. A las tablas existentes se les
+    agregan las columnas de las métricas nuevas del registro, que se
+    completan a medida que se refrescan sus intervalos.
+    """
+    tipos = {columna: "INTEGER" if columna.endswith("_n") else "REAL"
+             for columna in _columnas_estadisticas()}
+    definiciones = ",\n".join(f"    {columna} {tipo}" for columna, tipo in tipos.items())
+    with conexion() as conn, conn.cursor() as cursor:
+        for tabla, _, _ in RESOLUCIONES.values():
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {tabla} (
+                    estacion_id INTEGER NOT NULL,     -- Estación, o RED para toda la red
+                    bucket TIMESTAMP NOT NULL,        -- Inicio del intervalo
+                    filas INTEGER NOT NULL,           -- Mediciones en el intervalo
+                {definiciones},
+                    PRIMARY KEY (estacion_id, bucket)
+                );
+            """)
+            # Tablas anteriores a estacion_id: sus filas son de toda la red
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = %s AND column_name = 'estacion_id'",
+                (tabla,),
+            )
+            if cursor.fetchone() is None:
+                cursor.execute(f"""
+                    ALTER TABLE {tabla} ADD COLUMN estacion_id INTEGER NOT NULL DEFAULT {RED};
+                    ALTER TABLE {tabla} ALTER COLUMN estacion_id DROP DEFAULT;
+                    ALTER TABLE {tabla} DROP CONSTRAINT {tabla}_pkey;
+                    ALTER TABLE {tabla} ADD PRIMARY KEY (estacion_id, bucket);
+                """)
+            for columna, tipo in tipos.items():
+                cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS {columna} {tipo}")
+            # Los refrescos buscan por intervalo, de todas las estaciones
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {tabla}_bucket ON {tabla} (bucket)")
+        cursor.execute(SQL_DISPARADORES)
+
+
+def _sql_refresco(tabla, campo, segundos):
+    columnas = _columnas_estadisticas()
+    expresiones = ",\n".join(
+        f"    {plantilla.format('m.' + metrica)}"
+        for metrica in METRICAS for plantilla in ESTADISTICAS.values()
+    )
+    # Los intervalos modificados se borran y se recalculan completos, de
+    # todas las estaciones y de la red en una sola lectura (GROUPING SETS),
+    # a partir de las filas crudas del intervalo, que se leen por el índice
+    # (fecha_hora, id); un intervalo que quedó sin filas no se vuelve a insertar
+    return f"""
+        CREATE TEMP TABLE {tabla}_modificados ON COMMIT DROP AS
+        SELECT DISTINCT date_trunc('{campo}', bucket) AS bucket FROM agregados_modificados;
+        DELETE FROM {tabla} t USING {tabla}_modificados b WHERE t.bucket = b.bucket;
+        INSERT INTO {tabla} (estacion_id, bucket, filas, {', '.join(columnas)})
+        SELECT CASE WHEN GROUPING(m.estacion_id) = 1 THEN {RED} ELSE m.estacion_id END,
+               b.bucket, count(*),
+        {expresiones}
+        FROM {tabla}_modificados b
+        JOIN mediciones m
+          ON m.fecha_hora >= b.bucket
+         AND m.fecha_hora < b.bucket + interval '{segundos} seconds'
+        GROUP BY GROUPING SETS ((b.bucket), (b.bucket, m.estacion_id))
+    """
+
+
+def _sql_combinacion(tabla, campo, segundos, fina):
+    columnas = [f"{metrica}_{sufijo}" for metrica in METRICAS for sufijo in COMBINACIONES]
+    expresiones = ",\n".join(
+        f"    {plantilla.format('f.' + metrica)}"
+        for metrica in METRICAS for plantilla in COMBINACIONES.values()
+    )
+    actualizaciones = ", ".join(f"{columna} = EXCLUDED.{columna}" for columna in ["filas"] + columnas)
+    # Los intervalos modificados se recalculan desde los de la tabla
+    # 'fina' (ya refrescada en la misma transacción), estación por
+    # estación y la red desde sus propias filas. Se actualizan en el
+    # lugar para conservar el percentil hasta la próxima pasada de
+    # refrescar_percentiles, y se borran los que quedaron sin filas
+    return f"""
+        CREATE TEMP TABLE {tabla}_modificados ON COMMIT DROP AS
+        SELECT DISTINCT date_trunc('{campo}', bucket) AS bucket FROM agregados_modificados;
+        WITH combinados AS (
+            INSERT INTO {tabla} (estacion_id, bucket, filas, {', '.join(columnas)})
+            SELECT f.estacion_id, b.bucket, sum(f.filas),
+            {expresiones}
+            FROM {tabla}_modificados b
+            JOIN {fina} f
+              ON f.bucket >= b.bucket
+             AND f.bucket < b.bucket + interval '{segundos} seconds'
+            GROUP BY f.estacion_id, b.bucket
+            ON CONFLICT (estacion_id, bucket) DO UPDATE SET {actualizaciones}
+            RETURNING estacion_id, bucket
+        )
+        DELETE FROM {tabla} t USING {tabla}_modificados b
+        WHERE t.bucket = b.bucket
+          AND (t.estacion_id, t.bucket) NOT IN (SELECT estacion_id, bucket FROM combinados);
+    """
+
+
+def _sql_percentiles(tabla, campo, segundos):
+    columnas = [f"{metrica}_p95" for metrica in METRICAS]
+    expresiones = ",\n".join(
+        f"    {ESTADISTICAS['p95'].format('m.' + metrica)} AS {metrica}_p95" for metrica in METRICAS
+    )
+    # Se calculan en una tabla temporal, sin bloquear los refrescos, que
+    # solo esperan a la actualización posterior
+    return f"""
+        CREATE TEMP TABLE {tabla}_percentiles ON COMMIT DROP AS
+        SELECT CASE WHEN GROUPING(m.estacion_id) = 1 THEN {RED} ELSE m.estacion_id END AS estacion_id,
+               b.bucket,
+        {expresiones}
+        FROM (SELECT DISTINCT date_trunc('{campo}', bucket) AS bucket FROM percentiles_modificados) b
+        JOIN mediciones m
+          ON m.fecha_hora >= b.bucket
+         AND m.fecha_hora < b.bucket + interval '{segundos} seconds'
+        GROUP BY GROUPING SETS ((b.bucket), (b.bucket, m.estacion_id));
+    """, f"""
+        UPDATE {tabla} t SET {', '.join(f"{c} = p.{c}" for c in columnas)}
+        FROM {tabla}_percentiles p
+        WHERE t.estacion_id = p.estacion_id AND t.bucket = p.bucket;
+    """
+
+
+def refrescar_agregados():
+    """
+    Recalcula en todas las resoluciones los intervalos registrados en
+    'agregados_pendientes' por transacciones confirmadas y borra esos
+    registros, todo en una transacción. Las horas modificadas quedan
+    registradas para la pasada de percentiles, que se hace aquí mismo si
+    pasaron INTERVALO_PERCENTILES segundos desde la última del proceso.
+
+    Returns:
+        Cantidad de minutos con cambios que se recalcularon.
+    """
+    global _ultimos_percentiles
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (BLOQUEO_REFRESCO,))
+            cursor.execute(SQL_TOMAR_PENDIENTES)
+            cursor.execute("SELECT count(*) FROM agregados_modificados")
+            modificados = cursor.fetchone()[0]
+            if modificados:
+                resoluciones = list(RESOLUCIONES.values())
+                tabla, campo, segundos = resoluciones[0]
+                cursor.execute(_sql_refresco(tabla, campo, segundos))
+                for (fina, _, _), (tabla, campo, segundos) in zip(resoluciones, resoluciones[1:]):
+                    cursor.execute(_sql_combinacion(tabla, campo, segundos, fina))
+                cursor.execute("""
+                    INSERT INTO agregados_percentiles_pendientes (bucket)
+                    SELECT DISTINCT date_trunc('hour', bucket) FROM agregados_modificados
+                """)
+    except psycopg2.Error as e:
+        logger.error("Error al refrescar los agregados: %s", e)
+        raise
+    ahora = time.monotonic()
+    if _ultimos_percentiles is None or ahora - _ultimos_percentiles >= INTERVALO_PERCENTILES:
+        _ultimos_percentiles = ahora
+        refrescar_percentiles()
+    return modificados
+
+
+def refrescar_percentiles():
+    """
+    Recalcula desde las filas crudas el percentil 95 de las horas y los
+    días con cambios registrados por refrescar_agregados, y borra esos
+    registros.
+
+    Returns:
+        Cantidad de horas con cambios cuyo percentil se recalculó.
+    """
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (BLOQUEO_PERCENTILES,))
+            cursor.execute("""
+                CREATE TEMP TABLE percentiles_modificados (bucket TIMESTAMP PRIMARY KEY) ON COMMIT DROP;
+                WITH tomados AS (DELETE FROM agregados_percentiles_pendientes RETURNING bucket)
+                INSERT INTO percentiles_modificados SELECT DISTINCT bucket FROM tomados;
+            """)
+            cursor.execute("SELECT count(*) FROM percentiles_modificados")
+            modificados = cursor.fetchone()[0]
+            if not modificados:
+                return 0
+            actualizaciones = []
+            for tabla, campo, segundos in list(RESOLUCIONES.values())[1:]:
+                calculo, actualizacion = _sql_percentiles(tabla, campo, segundos)
+                cursor.execute(calculo)
+                actualizaciones.append(actualizacion)
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (BLOQUEO_REFRESCO,))
+            for actualizacion in actualizaciones:
+                cursor.execute(actualizacion)
+            return modificados
+    except psycopg2.Error as e:
+        logger.error("Error al refrescar los percentiles de los agregados: %s", e)
+        raise
+
+
+def reconstruir_agregados(desde=None, hasta=None, dias_por_bloque=DIAS_POR_BLOQUE):
+    """
+    Recalcula los intervalos con filas en [desde, hasta) (todo el
+    histórico sin rango), por ejemplo tras agregar una métrica o la
+    columna estacion_id: registra sus minutos como pendientes y los
+    refresca en bloques de 'dias_por_bloque' días.
+
+    Returns:
+        Cantidad de minutos recalculados.
+    """
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT min(fecha_hora), max(fecha_hora) FROM mediciones")
+            primera, ultima = cursor.fetchone()
+    except psycopg2.Error as e:
+        logger.error("Error al reconstruir los agregados: %s", e)
+        raise
+    if primera is None:
+        return 0
+    inicio = desde or primera
+    fin = hasta or ultima + timedelta(microseconds=1)
+    recalculados = 0
+    while inicio < fin:
+        siguiente = min(inicio + timedelta(days=dias_por_bloque), fin)
+        try:
+            with conexion() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO agregados_pendientes (bucket)
+                    SELECT DISTINCT date_trunc('minute', fecha_hora) FROM mediciones
+                    WHERE fecha_hora >= %s AND fecha_hora < %s
+                """, (inicio, siguiente))
+        except psycopg2.Error as e:
+            logger.error("Error al reconstruir los agregados: %s", e)
+            raise
+        recalculados += refrescar_agregados()
+        refrescar_percentiles()
+        inicio = siguiente
+    return recalculados
+
+
+def acotar_rango(desde, hasta, puntos=PUNTOS_POR_DEFECTO, minima="1m"):
+    """
+    Completa el inicio de un rango abierto: sin 'desde', el rango son los
+    últimos 'puntos' intervalos de 'minima' hasta 'hasta', en lugar de
+    todo el histórico.
+
+    Returns:
+        (desde, hasta)
+    """
+    if minima not in RESOLUCIONES:
+        raise ValueError(f"Resolución no soportada: {minima}")
+    if puntos < 1:
+        raise ValueError("La cantidad de puntos debe ser al menos 1")
+    if desde is None:
+        desde = hasta - timedelta(seconds=puntos * RESOLUCIONES[minima][2])
+    return desde, hasta
+
+
+def elegir_resolucion(desde, hasta, puntos=PUNTOS_POR_DEFECTO, minima="1m"):
+    """
+    Elige la resolución más fina, no menor que 'minima', con la que el
+    rango [desde, hasta) no supera 'puntos' intervalos. Si ninguna
+    alcanza, o el rango no tiene inicio o fin (ver acotar_rango), devuelve
+    la más gruesa.
+    """
+    if minima not in RESOLUCIONES:
+        raise ValueError(f"Resolución no soportada: {minima}")
+    nombres = list(RESOLUCIONES)
+    candidatas = nombres[nombres.index(minima):]
+    if desde is None or hasta is None:
+        return candidatas[-1]
+    duracion = (hasta - desde).total_seconds()
+    for nombre in candidatas:
+        if duracion / RESOLUCIONES[nombre][2] <= puntos:
+            return nombre
+    return candidatas[-1]
+
+
+def obtener_agregados(resolucion, desde=None, hasta=None, metricas=None, estacion=None):
+    """
+    Obtiene los intervalos de la tabla de agregados de 'resolucion' dentro
+    del rango [desde, hasta), ordenados por tiempo: los de 'estacion' o,
+    sin ella, los de toda la red.
+
+    Returns:
+        Diccionario con las columnas y las filas (como diccionarios).
+    """
+    if metricas is None:
+        metricas = METRICAS
+    invalidas = [m for m in metricas if m not in METRICAS]
+    if invalidas:
+        raise ValueError(f"Métricas no válidas: {', '.join(invalidas)}")
+    tabla = RESOLUCIONES[resolucion][0]
+    columnas = ["bucket", "filas"] + _columnas_estadisticas(metricas)
+
+    condiciones = ["estacion_id = %s"]
+    parametros = [RED if estacion is None else estacion]
+    if desde is not None:
+        condiciones.append("bucket >= %s")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("bucket < %s")
+        parametros.append(hasta)
+    consulta = f"SELECT {', '.join(columnas)} FROM {tabla} WHERE {' AND '.join(condiciones)}"
+    consulta += " ORDER BY bucket"
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute(consulta, parametros)
+            filas = cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error("Error al obtener los agregados: %s", e)
+        raise
+    return {
+        "columnas": columnas,
+        "filas": [dict(zip(columnas, fila)) for fila in filas],
+    }
+
+
+if __name__ == "__main__":
+    configurar_registro()
+    comando = sys.argv[1] if len(sys.argv) > 1 else "refrescar"
+    if comando == "crear":
+        crear_tablas_agregadas()
+        print("[+] Tablas de agregados creadas")
+    elif comando == "refrescar":
+        print(f"[+] Minutos con cambios agregados: {refrescar_agregados()}")
+        print(f"[+] Horas con percentiles recalculados: {refrescar_percentiles()}")
+    elif comando == "reconstruir":
+        desde = datetime.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+        hasta = datetime.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else None
+        print(f"[+] Minutos recalculados: {reconstruir_agregados(desde, hasta)}")
+    else:
+        print("Uso: python -m app.agregados [crear|refrescar|reconstruir [desde] [hasta]]")
+        sys.exit(1)
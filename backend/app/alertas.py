@@ -0,0 +1,203 @@
+"""
+Detección en línea de umbrales de calidad del aire y anomalías de
+sensores sobre el flujo de mediciones.
+
+Cada serie (estación, métrica) guarda un estado de tamaño fijo: medias
+y varianza exponenciales (EWMA), una ventana circular de las últimas
+muestras con su suma y un contador de valores repetidos. Procesar una
+muestra cuesta O(1) sin importar cuántas se hayan visto.
+
+Los eventos se guardan en la tabla 'eventos_alerta' y se notifican en el
+canal 'alertas_nuevas', que app.difusion reenvía al flujo en vivo.
+"""
+import json
+import math
+
+from .db import conexion
+from .ingesta import COLUMNAS_INSERCION
+
+# Umbrales sobre la media móvil de la ventana (valores de "dañino para
+# grupos sensibles" del AQI de la EPA de EE. UU.)
+UMBRALES = {
+    "pm25_ugm3": 35.4,
+    "ozono_ppb": 70.0,
+}
+
+SQL_INSERTAR_EVENTO = """
+    INSERT INTO eventos_alerta (fecha_hora, serie, metrica, tipo, valor, detalle)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+SQL_NOTIFICAR_ALERTA = "SELECT pg_notify('alertas_nuevas', %s)"
+
+
+class EstadoSerie:
+    """
+    Estado de tamaño fijo de una serie.
+    """
+
+    __slots__ = ("n", "media", "varianza", "media_lenta", "ventana", "posicion",
+                 "suma_ventana", "ultimo", "repeticiones", "sobre_umbral", "en_deriva")
+
+    def __init__(self, tamano_ventana):
+        self.n = 0
+        self.media = 0.0
+        self.varianza = 0.0
+        self.media_lenta = 0.0
+        self.ventana = [0.0] * tamano_ventana
+        self.posicion = 0
+        self.suma_ventana = 0.0
+        self.ultimo = None
+        self.repeticiones = 0
+        self.sobre_umbral = False
+        self.en_deriva = False
+
+
+class DetectorAnomalias:
+    """
+    Detector de eventos por serie:
+
+    - "umbral": la media de las últimas 'tamano_ventana' muestras supera
+      el umbral de la métrica (se emite al cruzarlo hacia arriba).
+    - "pico": la muestra se aleja más de 'z_maximo' desviaciones de la
+      EWMA.
+    - "atascado": el mismo valor se repite 'repeticiones_atasco' veces.
+    - "deriva": la EWMA rápida se separa de la lenta más de
+      'deriva_maxima' desviaciones (se emite al empezar).
+
+    Los eventos son diccionarios con fecha_hora, serie, metrica, tipo,
+    valor y detalle.
+    """
+
+    def __init__(self, alfa=0.05, alfa_lenta=0.005, z_maximo=4.0, deriva_maxima=3.0,
+                 tamano_ventana=120, repeticiones_atasco=20, calentamiento=30, umbrales=None):
+        self.alfa = alfa
+        self.alfa_lenta = alfa_lenta
+        self.z_maximo = z_maximo
+        self.deriva_maxima = deriva_maxima
+        self.tamano_ventana = tamano_ventana
+        self.repeticiones_atasco = repeticiones_atasco
+        self.calentamiento = calentamiento
+        self.umbrales = UMBRALES if umbrales is None else umbrales
+        self.series = {}
+
+    def procesar(self, serie, metrica, valor, fecha_hora, eventos):
+        """
+        Procesa una muestra de la serie (serie, metrica) y agrega a
+        'eventos' los eventos que genere.
+        """
+        if valor is None or valor != valor:
+            return
+        clave = (serie, metrica)
+        estado = self.series.get(clave)
+        if estado is None:
+            estado = self.series[clave] = EstadoSerie(self.tamano_ventana)
+            estado.media = estado.media_lenta = valor
+
+        # Valor atascado
+        if valor == estado.ultimo:
+            estado.repeticiones += 1
+            if estado.repeticiones == self.repeticiones_atasco:
+                eventos.append(self._evento(fecha_hora, serie, metrica, "atascado", valor,
+                                            f"{estado.repeticiones} lecturas iguales"))
+        else:
+            estado.ultimo = valor
+            estado.repeticiones = 1
+
+        # Pico respecto de la EWMA (antes de actualizarla con la muestra)
+        n = estado.n
+        desvio = valor - estado.media
+        if n >= self.calentamiento and estado.varianza > 0:
+            sigma = math.sqrt(estado.varianza)
+            if abs(desvio) > self.z_maximo * sigma:
+                eventos.append(self._evento(fecha_hora, serie, metrica, "pico", valor,
+                                            f"z={desvio / sigma:.1f}"))
+        alfa = self.alfa
+        estado.media += alfa * desvio
+        estado.varianza = (1 - alfa) * (estado.varianza + alfa * desvio * desvio)
+        estado.media_lenta += self.alfa_lenta * (valor - estado.media_lenta)
+
+        # Deriva: la media rápida se separa de la lenta
+        if n >= self.calentamiento and estado.varianza > 0:
+            separacion = abs(estado.media - estado.media_lenta) / math.sqrt(estado.varianza)
+            if separacion > self.deriva_maxima:
+                if not estado.en_deriva:
+                    estado.en_deriva = True
+                    eventos.append(self._evento(fecha_hora, serie, metrica, "deriva", valor,
+                                                f"{separacion:.1f} desviaciones"))
+            elif separacion < self.deriva_maxima / 2:
+                estado.en_deriva = False
+
+        # Media móvil sobre la ventana circular
+        posicion = estado.posicion
+        estado.suma_ventana += valor - estado.ventana[posicion]
+        estado.ventana[posicion] = valor
+        estado.posicion = (posicion + 1) % self.tamano_ventana
+        estado.n = n + 1
+        umbral = self.umbrales.get(metrica)
+        if umbral is not None:
+            media_ventana = estado.suma_ventana / min(estado.n, self.tamano_ventana)
+            if media_ventana > umbral:
+                if not estado.sobre_umbral:
+                    estado.sobre_umbral = True
+                    eventos.append(self._evento(fecha_hora, serie, metrica, "umbral", valor,
+                                                f"media {media_ventana:.1f} > {umbral}"))
+            else:
+                estado.sobre_umbral = False
+
+    def procesar_lote(self, filas, serie="estacion"):
+        """
+        Procesa filas en el orden de COLUMNAS_INSERCION (fecha_hora primero),
+        como las que recibe un callback 'al_vaciar' de EscritorMediciones.
+
+        Returns:
+            Lista de eventos generados.
+        """
+        eventos = []
+        metricas = COLUMNAS_INSERCION[1:]
+        procesar = self.procesar
+        for fecha_hora, *valores in filas:
+            for metrica, valor in zip(metricas, valores):
+                procesar(serie, metrica, valor, fecha_hora, eventos)
+        return eventos
+
+    @staticmethod
+    def _evento(fecha_hora, serie, metrica, tipo, valor, detalle):
+        return {
+            "fecha_hora": fecha_hora,
+            "serie": serie,
+            "metrica": metrica,
+            "tipo": tipo,
+            "valor": valor,
+            "detalle": detalle,
+        }
+
+
+def guardar_eventos(conn, eventos):
+    """
+    Inserta los eventos en 'eventos_alerta' y los notifica en el canal
+    'alertas_nuevas' dentro de la transacción de 'conn'.
+    """
+    with conn.cursor() as cursor:
+        cursor.executemany(SQL_INSERTAR_EVENTO, [
+            (e["fecha_hora"], e["serie"], e["metrica"], e["tipo"], e["valor"], e["detalle"])
+            for e in eventos
+        ])
+        for evento in eventos:
+            cursor.execute(SQL_NOTIFICAR_ALERTA, (json.dumps(evento, default=str),))
+
+
+def crear_callback_alertas(detector=None, serie="estacion"):
+    """
+    Devuelve una función para 'al_vaciar' de EscritorMediciones que pasa
+    cada lote por el detector y guarda los eventos generados.
+    """
+    detector = detector or DetectorAnomalias()
+
+    def al_vaciar(lote):
+        eventos = detector.procesar_lote(lote, serie)
+        if eventos:
+            with conexion() as conn:
+                guardar_eventos(conn, eventos)
+
+    return al_vaciar
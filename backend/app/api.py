@@ -1,27 +1,139 @@
-from flask import Flask, jsonify, request
-from .models import obtener_mediciones
+import csv
+import io
+import json
+import threading
+import time
+from datetime import date, datetime
+
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from .models import (obtener_mediciones, iterar_mediciones, obtener_mediciones_desde_id,
+                     obtener_version, LIMITE_POR_DEFECTO)
+from .cache import CacheRespuestas, calcular_validadores, exponer_metricas
+from .parametros import parsear_estacion, parsear_filtros, parsear_formato
+from .serializacion import serializar
+from .difusion import obtener_difusor
+from .agregados import (acotar_rango, elegir_resolucion, obtener_agregados, ESTADISTICAS, METRICAS,
+                        PUNTOS_POR_DEFECTO, RESOLUCIONES)
+from .esquema import verificar_esquema
+from .estaciones import listar_estaciones
+from . import config
+from .metricas import HTTP_PETICION_SEGUNDOS, HTTP_RESPUESTA_BYTES, generar_texto
+from .registro import configurar_registro
 from flask_cors import CORS
 
 app = Flask(__name__)
-CORS(app, origins=["http://localhost:5173"])
+CORS(app, origins=config.CORS_ORIGENES)
+
+# Respuestas de /mediciones ya serializadas, por consulta y versión de la tabla
+cache_mediciones = CacheRespuestas(capacidad=256, ttl=30.0)
+exponer_metricas(cache_mediciones, "monitoreo_cache_mediciones", "/mediciones")
+
+
+@app.before_request
+def _iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+
+
+@app.after_request
+def _registrar_medicion(respuesta):
+    # La plantilla de la ruta y no la URL, para no crear una serie por parámetro
+    ruta = request.url_rule.rule if request.url_rule is not None else 'desconocida'
+    HTTP_PETICION_SEGUNDOS.observar(time.perf_counter() - g.inicio_peticion, ruta=ruta,
+                                    metodo=request.method, codigo=respuesta.status_code)
+    # Los flujos (export, stream) no tienen tamaño conocido de antemano
+    if respuesta.content_length is not None:
+        HTTP_RESPUESTA_BYTES.observar(respuesta.content_length, ruta=ruta)
+    return respuesta
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metricas():
+    """
+    Endpoint con las métricas del proceso en el formato de texto de
+    Prometheus (latencias de la API y de PostgreSQL, filas ingresadas).
+    """
+    return Response(generar_texto(), status=200,
+                    content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/estaciones', methods=['GET'])
+def get_estaciones():
+    """
+    Endpoint para obtener el registro de estaciones de la red.
+
+    Returns:
+        JSON con las estaciones o un mensaje de error.
+    """
+    try:
+        estaciones = listar_estaciones()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Error al obtener las estaciones'
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'columns': estaciones['columnas'],
+        'data': estaciones['filas'],
+        'message': 'Estaciones obtenidas exitosamente'
+    }), 200
+
 
 @app.route('/mediciones', methods=['GET'])
 def get_mediciones():
     """
-    Endpoint para obtener todas las mediciones ambientales.
-    
+    Endpoint para obtener las mediciones ambientales paginadas.
+
+    Parámetros de consulta (opcionales):
+        estacion: id de la estación.
+        desde, hasta: rango de tiempo en formato ISO 8601.
+        columnas: lista de columnas separadas por comas.
+        limite: cantidad máxima de filas por página.
+        cursor: valor 'next' devuelto por la página anterior.
+        formato: 'filas' (por defecto, un objeto por fila) o 'columnas'
+            (una lista de valores por columna y fechas en milisegundos).
+
+    Las páginas avanzan en orden de fecha_hora, por lo que sin 'desde' la
+    primera es la más antigua; para ver lo reciente, pedir 'desde' una
+    ventana corta hacia atrás y seguir 'next'.
+
     Returns:
-        JSON con la lista de mediciones o un mensaje de error.
+        JSON con la página de mediciones o un mensaje de error.
     """
     try:
-        # Obtener las mediciones de la base de datos
-        mediciones = obtener_mediciones()
-        # Devolver las mediciones en formato JSON
-        return jsonify({
-            'success': True,
-            'data': mediciones,
-            'message': 'Mediciones obtenidas exitosamente'
-        }), 200
+        # Validador barato: cambia con cada INSERT, UPDATE o DELETE
+        etag, ultima_modificacion = calcular_validadores(
+            *obtener_version(), request.args.items(multi=True)
+        )
+        if _no_modificado(etag, ultima_modificacion):
+            respuesta = Response(status=304)
+            return _agregar_validadores(respuesta, etag, ultima_modificacion)
+
+        cuerpo = cache_mediciones.obtener(etag)
+        if cuerpo is None:
+            filtros = parsear_filtros(request.args)
+            limite = request.args.get('limite', LIMITE_POR_DEFECTO, type=int)
+            formato = parsear_formato(request.args.get('formato'))
+            # Obtener la página de mediciones de la base de datos
+            pagina = obtener_mediciones(limite=limite, cursor=request.args.get('cursor'),
+                                        formato=formato, **filtros)
+            cuerpo = serializar({
+                'success': True,
+                'columns': pagina['columnas'],
+                'data': pagina['filas'],
+                'next': pagina['siguiente'],
+                'message': 'Mediciones obtenidas exitosamente'
+            })
+            cache_mediciones.guardar(etag, cuerpo)
+    except ValueError as e:
+        # Parámetros de consulta inválidos
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Parámetros de consulta inválidos'
+        }), 400
     except Exception as e:
         # Devolver un mensaje de error en formato JSON
         return jsonify({
@@ -30,6 +142,383 @@ def get_mediciones():
             'message': 'Error al obtener las mediciones'
         }), 500
 
+    # Devolver las mediciones en formato JSON
+    respuesta = Response(cuerpo, status=200, mimetype='application/json')
+    return _agregar_validadores(respuesta, etag, ultima_modificacion)
+
+
+def _no_modificado(etag, ultima_modificacion):
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    return (
+        request.if_modified_since is not None
+        and ultima_modificacion is not None
+        and ultima_modificacion <= request.if_modified_since
+    )
+
+
+def _agregar_validadores(respuesta, etag, ultima_modificacion):
+    respuesta.set_etag(etag)
+    if ultima_modificacion is not None:
+        respuesta.last_modified = ultima_modificacion
+    # El cliente puede guardar la respuesta pero debe revalidarla siempre
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+@app.route('/mediciones/cache', methods=['GET'])
+def get_estadisticas_cache():
+    """
+    Endpoint con los contadores de la caché de /mediciones.
+    """
+    return jsonify({
+        'success': True,
+        'data': cache_mediciones.estadisticas(),
+        'message': 'Estadísticas de la caché obtenidas exitosamente'
+    }), 200
+
+
+def obtener_agregados_con_archivo(resolucion, desde, hasta, metricas, estacion=None):
+    """
+    Obtiene los agregados del rango, de 'estacion' o de toda la red: la
+    parte anterior al horizonte del archivo columnar se calcula desde el
+    archivo y el resto desde las tablas de agregados de PostgreSQL.
+    """
+    # app.archivo y app.indices usan NumPy: se importan en la primera
+    # petición que los necesita y no al arrancar el servidor
+    from .archivo import agregar_rango, horizonte_archivo
+
+    horizonte = horizonte_archivo()
+    if horizonte is None or (desde is not None and desde >= horizonte):
+        return obtener_agregados(resolucion, desde, hasta, metricas, estacion)
+
+    metricas = metricas or list(METRICAS)
+    invalidas = [m for m in metricas if m not in METRICAS]
+    if invalidas:
+        raise ValueError(f"Métricas no válidas: {', '.join(invalidas)}")
+    historico = agregar_rango(desde, min(hasta, horizonte) if hasta else horizonte,
+                              RESOLUCIONES[resolucion][2], metricas, estacion)
+    columnas = ['bucket', 'filas'] + [f"{m}_{e}" for m in metricas for e in ESTADISTICAS]
+    historico = [{columna: fila[columna] for columna in columnas} for fila in historico]
+    if hasta is not None and hasta <= horizonte:
+        return {'columnas': columnas, 'filas': historico}
+    recientes = obtener_agregados(resolucion, horizonte, hasta, metricas, estacion)
+    return {'columnas': columnas, 'filas': historico + recientes['filas']}
+
+
+@app.route('/mediciones/agregadas', methods=['GET'])
+def get_mediciones_agregadas():
+    """
+    Endpoint para obtener estadísticas por intervalo de tiempo
+    (mín, máx, promedio, cantidad y p95 de cada métrica).
+
+    Parámetros de consulta (opcionales):
+        desde, hasta: rango de tiempo en formato ISO 8601. Sin 'desde'
+            se devuelven los últimos 'puntos' intervalos de la
+            resolución mínima.
+        resolucion: resolución mínima ('1m', '1h' o '1d').
+        puntos: cantidad máxima de intervalos a devolver; se usa la
+            resolución más fina que no la supera.
+        columnas: métricas separadas por comas.
+        estacion: id de la estación; sin ella, estadísticas de toda la red.
+
+    Returns:
+        JSON con los intervalos o un mensaje de error.
+    """
+    try:
+        filtros = parsear_filtros(request.args)
+        puntos = request.args.get('puntos', PUNTOS_POR_DEFECTO, type=int)
+        minima = request.args.get('resolucion', '1m')
+        desde, hasta = acotar_rango(filtros['desde'], filtros['hasta'] or datetime.now(),
+                                    puntos, minima)
+        resolucion = elegir_resolucion(desde, hasta, puntos, minima)
+        agregados = obtener_agregados_con_archivo(resolucion, desde, filtros['hasta'],
+                                                  filtros['columnas'], filtros['estacion'])
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Parámetros de consulta inválidos'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Error al obtener las mediciones agregadas'
+        }), 500
+
+    return jsonify({
+        'success': True,
+        'resolution': resolucion,
+        'columns': agregados['columnas'],
+        'data': agregados['filas'],
+        'message': 'Mediciones agregadas obtenidas exitosamente'
+    }), 200
+
+
+@app.route('/mediciones/indices', methods=['GET'])
+def get_indices():
+    """
+    Endpoint para obtener las métricas derivadas de cada medición: índice
+    UV, promedios móviles de 24 h (PM2.5) y 8 h (ozono) y sus sub-índices
+    AQI.
+
+    Parámetros de consulta (opcionales):
+        estacion: id de la estación.
+        desde, hasta: rango de tiempo en formato ISO 8601.
+        limite: cantidad máxima de filas.
+        formato: 'filas' (por defecto) o 'columnas', como en /mediciones.
+
+    Returns:
+        JSON con los índices o un mensaje de error.
+    """
+    from .indices import obtener_indices
+
+    try:
+        filtros = parsear_filtros(request.args)
+        limite = request.args.get('limite', LIMITE_POR_DEFECTO, type=int)
+        formato = parsear_formato(request.args.get('formato'))
+        indices = obtener_indices(filtros['desde'], filtros['hasta'], limite, filtros['estacion'],
+                                  formato)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Parámetros de consulta inválidos'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Error al obtener los índices'
+        }), 500
+
+    cuerpo = serializar({
+        'success': True,
+        'columns': indices['columnas'],
+        'data': indices['filas'],
+        'message': 'Índices obtenidos exitosamente'
+    })
+    return Response(cuerpo, status=200, mimetype='application/json')
+
+
+# Filas que se agrupan en cada fragmento enviado al cliente
+FILAS_POR_FRAGMENTO = 500
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _generar_ndjson(columnas, filas):
+    fragmento = []
+    for fila in filas:
+        fragmento.append(json.dumps(dict(zip(columnas, fila)), default=_valor_json))
+        if len(fragmento) == FILAS_POR_FRAGMENTO:
+            yield "\n".join(fragmento) + "\n"
+            fragmento.clear()
+    if fragmento:
+        yield "\n".join(fragmento) + "\n"
+
+
+def _generar_csv(columnas, filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    pendientes = 0
+    for fila in filas:
+        escritor.writerow(fila)
+        pendientes += 1
+        if pendientes == FILAS_POR_FRAGMENTO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+    yield buffer.getvalue()
+
+
+FORMATOS_EXPORTACION = {
+    'ndjson': (_generar_ndjson, 'application/x-ndjson'),
+    'csv': (_generar_csv, 'text/csv'),
+}
+
+
+@app.route('/mediciones/export', methods=['GET'])
+def exportar_mediciones():
+    """
+    Endpoint para exportar mediciones como un flujo NDJSON o CSV.
+
+    Parámetros de consulta (opcionales):
+        formato: 'ndjson' (por defecto) o 'csv'.
+        estacion, desde, hasta, columnas: los mismos filtros que /mediciones.
+
+    Returns:
+        Respuesta en streaming con todas las filas del rango, o un
+        mensaje de error en formato JSON.
+    """
+    formato = request.args.get('formato', 'ndjson')
+    try:
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValueError(f"Formato no soportado: {formato}")
+        filtros = parsear_filtros(request.args)
+        filas = iterar_mediciones(**filtros)
+        # Abrir el cursor antes de responder para informar errores con un 500
+        columnas = next(filas)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Parámetros de consulta inválidos'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Error al exportar las mediciones'
+        }), 500
+
+    generar, mimetype = FORMATOS_EXPORTACION[formato]
+    return Response(
+        stream_with_context(generar(columnas, filas)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=mediciones.{formato}'}
+    )
+
+
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+INTERVALO_LATIDO = 15.0
+
+# Milisegundos que el cliente espera antes de reconectarse cuando el
+# servidor cierra el flujo (por ejemplo, si su suscripción se desbordó)
+ESPERA_RECONEXION_MS = 1000
+
+# Flujos abiertos en este proceso, hasta config.MAXIMO_FLUJOS
+_flujos = threading.BoundedSemaphore(config.MAXIMO_FLUJOS)
+
+
+def _evento_sse(evento, id_evento, datos):
+    lineas = [f"event: {evento}"]
+    if id_evento is not None:
+        lineas.append(f"id: {id_evento}")
+    lineas.append(f"data: {json.dumps(datos, default=_valor_json)}")
+    return "\n".join(lineas) + "\n\n"
+
+
+def _generar_sse(suscripcion, pendientes, estacion=None):
+    """
+    Envía las mediciones pendientes, leyendo páginas de hasta
+    LIMITE_POR_DEFECTO filas hasta alcanzar a las que ya llegan en vivo
+    por la suscripción, y luego los eventos en vivo.
+
+    Si la suscripción se desactiva (su cola se llenó mientras se
+    reenviaban las pendientes o el cliente no consumía a tiempo), el
+    flujo termina con un 'retry' para que el cliente se reconecte con
+    Last-Event-ID y siga desde la última medición recibida.
+    """
+    difusor = obtener_difusor()
+    try:
+        ultimo_enviado = 0
+        enviadas = set()
+        while pendientes and suscripcion.activa:
+            for fila in pendientes:
+                ultimo_enviado = fila['id']
+                enviadas.add(fila['id'])
+                yield _evento_sse('medicion', fila['id'], fila)
+            if len(pendientes) < LIMITE_POR_DEFECTO:
+                break
+            pendientes = obtener_mediciones_desde_id(ultimo_enviado, estacion=estacion)
+            # Solo pueden llegar de nuevo en vivo las del margen del difusor
+            piso = ultimo_enviado - config.MARGEN_IDS_VIVO
+            enviadas = {id_fila for id_fila in enviadas if id_fila > piso}
+        piso = ultimo_enviado - config.MARGEN_IDS_VIVO
+        while suscripcion.activa:
+            evento = suscripcion.siguiente(timeout=INTERVALO_LATIDO)
+            if evento is None:
+                yield ": latido\n\n"
+                continue
+            nombre, id_evento, datos = evento
+            # Las filas ya enviadas como pendientes pueden llegar de nuevo en vivo
+            if nombre == 'medicion' and (id_evento <= piso or id_evento in enviadas):
+                continue
+            if nombre == 'medicion' and estacion is not None and datos['estacion_id'] != estacion:
+                continue
+            yield _evento_sse(nombre, id_evento, datos)
+        yield f"retry: {ESPERA_RECONEXION_MS}\n\n"
+    finally:
+        difusor.cancelar(suscripcion)
+
+
+@app.route('/mediciones/stream', methods=['GET'])
+def stream_mediciones():
+    """
+    Endpoint Server-Sent Events que envía cada medición nueva al
+    confirmarse, con su id como id del evento.
+
+    Si el cliente envía la cabecera Last-Event-ID (o el parámetro
+    'ultimo_id'), primero recibe todas las mediciones posteriores a ese
+    id, en páginas, y luego las nuevas. La reanudación empieza
+    config.MARGEN_IDS_VIVO ids antes, para incluir las filas de ids
+    menores confirmadas después de enviado ese id: el cliente descarta
+    las que ya había recibido por su id.
+    Con el parámetro 'estacion' solo recibe las mediciones de esa
+    estación.
+
+    Cada flujo ocupa un hilo del trabajador mientras está abierto; por
+    encima de config.MAXIMO_FLUJOS flujos por proceso se responde 503
+    con Retry-After.
+
+    Returns:
+        Flujo 'text/event-stream' o un mensaje de error en formato JSON.
+    """
+    if not _flujos.acquire(blocking=False):
+        return jsonify({
+            'success': False,
+            'error': f'Se alcanzó el máximo de {config.MAXIMO_FLUJOS} flujos abiertos',
+            'message': 'Servicio de flujos saturado, reintente más tarde'
+        }), 503, {'Retry-After': str(max(1, ESPERA_RECONEXION_MS // 1000))}
+    try:
+        ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+        ultimo_id = int(ultimo_id) if ultimo_id is not None else None
+        estacion = parsear_estacion(request.args.get('estacion'))
+        # Suscribirse antes de leer las pendientes para no perder filas entre ambos pasos
+        suscripcion = obtener_difusor().suscribir()
+        try:
+            pendientes = (obtener_mediciones_desde_id(ultimo_id - config.MARGEN_IDS_VIVO, estacion=estacion)
+                          if ultimo_id is not None else [])
+        except Exception:
+            obtener_difusor().cancelar(suscripcion)
+            raise
+    except ValueError as e:
+        _flujos.release()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Parámetros de consulta inválidos'
+        }), 400
+    except Exception as e:
+        _flujos.release()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Error al suscribirse a las mediciones'
+        }), 500
+
+    respuesta = Response(
+        stream_with_context(_generar_sse(suscripcion, pendientes, estacion)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # El servidor cierra la respuesta aunque el generador no haya empezado
+    # (y entonces su finally no corre)
+    respuesta.call_on_close(_flujos.release)
+    respuesta.call_on_close(lambda: obtener_difusor().cancelar(suscripcion))
+    return respuesta
+
 if __name__ == "__main__":
-    # Ejecutar la aplicación Flask en modo debug y en el puerto 5000
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Servidor de desarrollo de Flask; en producción usar app.wsgi con gunicorn
+    configurar_registro()
+    verificar_esquema()
+    app.run(debug=config.DEBUG, host=config.HOST, port=config.PUERTO)
@@ -0,0 +1,261 @@
+"""
+Variante ASGI de los endpoints de solo lectura de la API, con psycopg 3
+y un pool de conexiones asíncrono.
+
+Mientras una consulta espera a PostgreSQL el proceso atiende otras
+peticiones, en lugar de ocupar un hilo bloqueado en psycopg2 por cada
+petición en curso. Las respuestas tienen el mismo formato que las de
+app.api.
+
+Rutas: /estaciones, /mediciones y /mediciones/indices (con los mismos
+parámetros que en app.api) y /metrics.
+
+Desde backend/:
+    METRICAS_DIR=$(mktemp -d) uvicorn app.api_async:app --workers 4 --port 5001
+
+Con varios trabajadores, METRICAS_DIR es el directorio en el que cada
+uno deja sus métricas para que /metrics devuelva la suma de todos (ver
+app.metricas); conviene uno nuevo por ejecución, para no sumar las de
+una anterior.
+"""
+import time
+from urllib.parse import parse_qsl
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from werkzeug.http import http_date, parse_date, parse_etags
+
+from . import config
+from .cache import CacheRespuestas, calcular_validadores, exponer_metricas
+from .db import DB_CONFIG, POOL_CONFIG
+from .esquema import SQL_COLUMNAS_TABLA, verificar_columnas
+from .metricas import HTTP_PETICION_SEGUNDOS, HTTP_RESPUESTA_BYTES, generar_texto, iniciar_instantaneas
+from .models import LIMITE_POR_DEFECTO, SQL_VERSION, armar_pagina, construir_consulta_pagina
+from .parametros import parsear_filtros, parsear_formato
+from .registro import configurar_registro
+from .serializacion import a_columnas, serializar
+
+# Respuestas de /mediciones ya serializadas, por consulta y versión de la tabla
+cache_mediciones = CacheRespuestas(capacidad=256, ttl=30.0)
+exponer_metricas(cache_mediciones, "monitoreo_cache_mediciones", "/mediciones")
+
+pool = AsyncConnectionPool(
+    make_conninfo(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        dbname=DB_CONFIG['database'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        connect_timeout=DB_CONFIG['connect_timeout'],
+    ),
+    min_size=POOL_CONFIG['minimo'],
+    max_size=POOL_CONFIG['maximo'],
+    timeout=POOL_CONFIG['timeout'],
+    max_lifetime=POOL_CONFIG['vida_maxima'],
+    check=AsyncConnectionPool.check_connection,
+    open=False,
+)
+
+
+class Respuesta:
+    """
+    Respuesta HTTP: código, cuerpo en bytes y cabeceras.
+    """
+
+    def __init__(self, estado, cuerpo=b"", cabeceras=None):
+        self.estado = estado
+        self.cuerpo = cuerpo
+        self.cabeceras = cabeceras or {}
+
+
+def _respuesta_json(estado, datos):
+    return Respuesta(estado, serializar(datos), {"content-type": "application/json"})
+
+
+def _entero(args, nombre, por_defecto):
+    valor = args.get(nombre)
+    if valor is None:
+        return por_defecto
+    try:
+        return int(valor)
+    except ValueError as e:
+        raise ValueError(f"Parámetro '{nombre}' no es un entero válido: {valor}") from e
+
+
+async def _consultar(conn, consulta, parametros=None):
+    cursor = await conn.execute(consulta, parametros)
+    columnas = [descripcion.name for descripcion in cursor.description]
+    return columnas, await cursor.fetchall()
+
+
+def _no_modificado(cabeceras, etag, ultima_modificacion):
+    # If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)
+    if "if-none-match" in cabeceras:
+        return parse_etags(cabeceras["if-none-match"]).contains(etag)
+    desde = parse_date(cabeceras.get("if-modified-since"))
+    return desde is not None and ultima_modificacion is not None and ultima_modificacion <= desde
+
+
+def _agregar_validadores(respuesta, etag, ultima_modificacion):
+    respuesta.cabeceras["etag"] = f'"{etag}"'
+    if ultima_modificacion is not None:
+        respuesta.cabeceras["last-modified"] = http_date(ultima_modificacion)
+    # El cliente puede guardar la respuesta pero debe revalidarla siempre
+    respuesta.cabeceras["cache-control"] = "no-cache"
+    return respuesta
+
+
+async def get_estaciones(args, argumentos, cabeceras):
+    async with pool.connection() as conn:
+        columnas, filas = await _consultar(conn, "SELECT * FROM estaciones ORDER BY id")
+    return _respuesta_json(200, {
+        'success': True,
+        'columns': columnas,
+        'data': [dict(zip(columnas, fila)) for fila in filas],
+        'message': 'Estaciones obtenidas exitosamente'
+    })
+
+
+async def get_mediciones(args, argumentos, cabeceras):
+    filtros = parsear_filtros(args)
+    limite = _entero(args, 'limite', LIMITE_POR_DEFECTO)
+    formato = parsear_formato(args.get('formato'))
+    consulta, parametros = construir_consulta_pagina(limite=limite, cursor=args.get('cursor'),
+                                                     **filtros)
+    async with pool.connection() as conn:
+        # Validador barato: cambia con cada INSERT, UPDATE o DELETE
+        _, (version,) = await _consultar(conn, SQL_VERSION)
+        etag, ultima_modificacion = calcular_validadores(*version, argumentos)
+        if _no_modificado(cabeceras, etag, ultima_modificacion):
+            return _agregar_validadores(Respuesta(304), etag, ultima_modificacion)
+
+        cuerpo = cache_mediciones.obtener(etag)
+        if cuerpo is None:
+            columnas, filas = await _consultar(conn, consulta, parametros)
+            pagina = armar_pagina(columnas, filas, limite, formato)
+            cuerpo = serializar({
+                'success': True,
+                'columns': pagina['columnas'],
+                'data': pagina['filas'],
+                'next': pagina['siguiente'],
+                'message': 'Mediciones obtenidas exitosamente'
+            })
+            cache_mediciones.guardar(etag, cuerpo)
+    respuesta = Respuesta(200, cuerpo, {"content-type": "application/json"})
+    return _agregar_validadores(respuesta, etag, ultima_modificacion)
+
+
+async def get_indices(args, argumentos, cabeceras):
+    # app.indices carga NumPy; se importa en la primera petición de índices
+    from .indices import construir_consulta_indices
+
+    filtros = parsear_filtros(args)
+    formato = parsear_formato(args.get('formato'))
+    consulta, parametros = construir_consulta_indices(
+        filtros['desde'], filtros['hasta'], _entero(args, 'limite', LIMITE_POR_DEFECTO),
+        filtros['estacion']
+    )
+    async with pool.connection() as conn:
+        columnas, filas = await _consultar(conn, consulta, parametros)
+    return _respuesta_json(200, {
+        'success': True,
+        'columns': columnas,
+        'data': (a_columnas(columnas, filas) if formato == 'columnas'
+                 else [dict(zip(columnas, fila)) for fila in filas]),
+        'message': 'Índices obtenidos exitosamente'
+    })
+
+
+async def get_metricas(args, argumentos, cabeceras):
+    return Respuesta(200, generar_texto().encode(),
+                     {"content-type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+# Ruta -> (función, mensaje en caso de error)
+RUTAS = {
+    '/estaciones': (get_estaciones, 'Error al obtener las estaciones'),
+    '/mediciones': (get_mediciones, 'Error al obtener las mediciones'),
+    '/mediciones/indices': (get_indices, 'Error al obtener los índices'),
+    '/metrics': (get_metricas, 'Error al generar las métricas'),
+}
+
+
+async def _atender(scope):
+    ruta = RUTAS.get(scope['path'])
+    if ruta is None:
+        return _respuesta_json(404, {'success': False, 'message': 'Ruta no encontrada'})
+    if scope['method'] not in ('GET', 'HEAD'):
+        return _respuesta_json(405, {'success': False, 'message': 'Método no permitido'})
+
+    funcion, mensaje_error = ruta
+    argumentos = parse_qsl(scope['query_string'].decode(), keep_blank_values=True)
+    # Como en Flask, el primer valor de cada parámetro repetido
+    args = {}
+    for nombre, valor in argumentos:
+        args.setdefault(nombre, valor)
+    cabeceras = {nombre.decode().lower(): valor.decode() for nombre, valor in scope['headers']}
+    try:
+        respuesta = await funcion(args, argumentos, cabeceras)
+    except ValueError as e:
+        return _respuesta_json(400, {
+            'success': False,
+            'error': str(e),
+            'message': 'Parámetros de consulta inválidos'
+        })
+    except Exception as e:
+        return _respuesta_json(500, {
+            'success': False,
+            'error': str(e),
+            'message': mensaje_error
+        })
+
+    origen = cabeceras.get('origin')
+    if origen in config.CORS_ORIGENES:
+        respuesta.cabeceras['access-control-allow-origin'] = origen
+        respuesta.cabeceras['vary'] = 'Origin'
+    return respuesta
+
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'lifespan.startup':
+            configurar_registro()
+            iniciar_instantaneas()
+            await pool.open()
+            try:
+                # Misma verificación que app.esquema.verificar_esquema, con el pool asíncrono
+                async with pool.connection() as conn:
+                    _, columnas_tabla = await _consultar(conn, SQL_COLUMNAS_TABLA)
+                verificar_columnas(dict(columnas_tabla))
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensaje['type'] == 'lifespan.shutdown':
+            await pool.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    Aplicación ASGI.
+    """
+    if scope['type'] == 'lifespan':
+        await _ciclo_de_vida(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    inicio = time.perf_counter()
+    respuesta = await _atender(scope)
+    ruta = scope['path'] if scope['path'] in RUTAS else 'desconocida'
+    HTTP_PETICION_SEGUNDOS.observar(time.perf_counter() - inicio, ruta=ruta,
+                                    metodo=scope['method'], codigo=respuesta.estado)
+    HTTP_RESPUESTA_BYTES.observar(len(respuesta.cuerpo), ruta=ruta)
+    cabeceras = [(nombre.encode(), valor.encode()) for nombre, valor in respuesta.cabeceras.items()]
+    cabeceras.append((b'content-length', str(len(respuesta.cuerpo)).encode()))
+    await send({'type': 'http.response.start', 'status': respuesta.estado, 'headers': cabeceras})
+    cuerpo = b'' if scope['method'] == 'HEAD' else respuesta.cuerpo
+    await send({'type': 'http.response.body', 'body': cuerpo})
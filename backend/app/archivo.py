@@ -0,0 +1,559 @@
+"""
+Archivo columnar en disco de las particiones cerradas de 'mediciones'.
+
+Cada partición mensual se exporta a un directorio con un archivo .npy
+por columna (float32 para los valores, int64 con milisegundos desde la
+época para fecha_hora, int32 para estacion_id) y un 'metadatos.json' con
+las estaciones presentes y el mínimo y el máximo de cada columna por
+bloque. La lectura usa np.load con mmap_mode, por lo
+que solo se cargan desde el disco las páginas del rango pedido.
+
+Las columnas crudas (ozono_mv, uv_mv) también se archivan, de modo que
+app.calibracion.recalibrar actualiza en el lugar los valores calibrados
+del archivo con recalibrar_archivo().
+
+Un mes ya archivado puede cambiar después (una carga masiva con
+app.backfill, un buffer local subido tarde): unos disparadores por
+sentencia cuentan los cambios de cada mes terminado en
+'archivo_pendiente', y exportar_particiones_cerradas() vuelve a exportar
+los meses archivados con cambios.
+
+Uso desde la línea de comandos (desde backend/), antes de purgar las
+particiones con database/mantenimiento_particiones.py:
+    python -m app.archivo exportar            # todas las particiones cerradas
+    python -m app.archivo exportar mediciones_2025_02
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import psycopg2
+
+from .db import conexion
+from .esquema import NOMBRES_METRICAS
+from .estaciones import ESTACION_POR_DEFECTO
+from .registro import configurar_registro
+
+logger = logging.getLogger(__name__)
+
+# Directorio raíz del archivo columnar
+DIRECTORIO_ARCHIVO = os.environ.get(
+    "MEDICIONES_ARCHIVO_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archivo"),
+)
+
+# Columnas de valores que se archivan: todas las métricas del registro
+# de app.esquema, incluidas las crudas, que permiten recalibrar
+COLUMNAS_ARCHIVO = NOMBRES_METRICAS
+
+# Filas por bloque de estadísticas y por lote leído de la base de datos
+TAMANO_BLOQUE = 65536
+
+PATRON_PARTICION = re.compile(r"^mediciones_(\d{4})_(\d{2})$")
+
+_EPOCA = datetime(1970, 1, 1)
+
+# Cambios en los meses terminados. Cada sentencia que modifica filas de
+# un mes incrementa su contador: una exportación borra la marca solo si
+# el contador no cambió desde su lectura, así un cambio confirmado
+# durante la exportación la deja pendiente
+SQL_MARCAS = """
+    CREATE TABLE IF NOT EXISTS archivo_pendiente (
+        mes DATE PRIMARY KEY,                      -- Mes terminado con filas cambiadas
+        cambios BIGINT NOT NULL                    -- Sentencias que lo modificaron
+    );
+
+    CREATE OR REPLACE FUNCTION marcar_archivo_pendiente() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO archivo_pendiente (mes, cambios)
+            SELECT DISTINCT date_trunc('month', fecha_hora)::date, 1 FROM nuevas
+            WHERE fecha_hora < date_trunc('month', localtimestamp)
+            ON CONFLICT (mes) DO UPDATE SET cambios = archivo_pendiente.cambios + 1;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO archivo_pendiente (mes, cambios)
+            SELECT DISTINCT date_trunc('month', fecha_hora)::date, 1 FROM viejas
+            WHERE fecha_hora < date_trunc('month', localtimestamp)
+            ON CONFLICT (mes) DO UPDATE SET cambios = archivo_pendiente.cambios + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER mediciones_archivo_pendiente_insertar
+        AFTER INSERT ON mediciones REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_archivo_pendiente();
+    CREATE OR REPLACE TRIGGER mediciones_archivo_pendiente_actualizar
+        AFTER UPDATE ON mediciones REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_archivo_pendiente();
+    CREATE OR REPLACE TRIGGER mediciones_archivo_pendiente_eliminar
+        AFTER DELETE ON mediciones REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_archivo_pendiente();
+"""
+
+
+def a_milisegundos(fecha_hora):
+    """
+    Convierte un datetime sin zona horaria en milisegundos desde la época,
+    con el mismo criterio que extract(epoch ...) sobre un TIMESTAMP.
+    """
+    return (fecha_hora - _EPOCA) // timedelta(milliseconds=1)
+
+
+def desde_milisegundos(milisegundos):
+    return _EPOCA + timedelta(milliseconds=int(milisegundos))
+
+
+def _mes_siguiente(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _rango_bloque(segmento):
+    """
+    [mínimo, máximo] del bloque para los metadatos, o None si no tiene valores
+    """
+    if np.isnan(segmento).all():
+        return None
+    return [float(np.nanmin(segmento)), float(np.nanmax(segmento))]
+
+
+def crear_marcas_archivo():
+    """
+    Crea la tabla 'archivo_pendiente' y los disparadores que la llenan
+    """
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute(SQL_MARCAS)
+    except psycopg2.Error as e:
+        logger.error("Error al crear las marcas del archivo: %s", e)
+        raise
+
+
+def exportar_particion(nombre, directorio=DIRECTORIO_ARCHIVO):
+    """
+    Exporta el mes de 'nombre' (mediciones_AAAA_MM) al archivo columnar.
+    Se leen las filas del mes desde 'mediciones' y no desde la partición,
+    de modo que también se exportan las que aún estén en la partición por
+    defecto (o todo el mes, si no tiene partición propia). El conteo y la
+    lectura usan la misma instantánea (REPEATABLE READ), de modo que las
+    escrituras concurrentes no cambian las filas entre uno y otra.
+    Escribe las columnas directamente en archivos mapeados en memoria, por
+    lo que la memoria usada no depende del tamaño de la partición.
+
+    Un mes ya archivado no se reemplaza por menos filas de las que tiene
+    el archivo: si su partición se purgó, la base de datos solo conserva
+    las filas llegadas después.
+
+    Returns:
+        Cantidad de filas exportadas, o None si el mes no se reemplazó.
+    """
+    coincidencia = PATRON_PARTICION.match(nombre)
+    if not coincidencia:
+        raise ValueError(f"Nombre de partición no válido: {nombre}")
+    mes = date(int(coincidencia[1]), int(coincidencia[2]), 1)
+    rango = (mes, _mes_siguiente(mes))
+    destino = os.path.join(directorio, nombre)
+    temporal = destino + ".tmp"
+    os.makedirs(temporal, exist_ok=True)
+
+    archivadas = None
+    if os.path.exists(os.path.join(destino, "metadatos.json")):
+        with open(os.path.join(destino, "metadatos.json")) as archivo:
+            archivadas = json.load(archivo)["filas"]
+    cambios = None
+    try:
+        with conexion() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("SELECT to_regclass('archivo_pendiente') IS NOT NULL")
+                if cursor.fetchone()[0]:
+                    cursor.execute("SELECT cambios FROM archivo_pendiente WHERE mes = %s", (mes,))
+                    fila = cursor.fetchone()
+                    cambios = fila[0] if fila else None
+                cursor.execute(
+                    "SELECT column_name FROM information_schema.columns WHERE table_name = 'mediciones'"
+                )
+                existentes = {fila[0] for fila in cursor.fetchall()}
+                columnas = [c for c in COLUMNAS_ARCHIVO if c in existentes]
+                cursor.execute("SELECT count(*) FROM mediciones WHERE fecha_hora >= %s AND fecha_hora < %s",
+                               rango)
+                filas = cursor.fetchone()[0]
+            if archivadas is not None and filas < archivadas:
+                logger.warning("%s tiene %d filas en la base de datos y %d en el archivo "
+                               "(¿partición purgada?): no se reemplaza", nombre, filas, archivadas)
+                shutil.rmtree(temporal)
+                return None
+
+            tiempos = np.lib.format.open_memmap(
+                os.path.join(temporal, "fecha_hora.npy"), mode="w+", dtype=np.int64, shape=(filas,)
+            )
+            estaciones = np.lib.format.open_memmap(
+                os.path.join(temporal, "estacion_id.npy"), mode="w+", dtype=np.int32, shape=(filas,)
+            )
+            valores = {
+                columna: np.lib.format.open_memmap(
+                    os.path.join(temporal, f"{columna}.npy"), mode="w+", dtype=np.float32, shape=(filas,)
+                )
+                for columna in columnas
+            }
+            with conn.cursor(name="exportar_archivo") as cursor:
+                cursor.itersize = TAMANO_BLOQUE
+                cursor.execute(
+                    f"SELECT (extract(epoch FROM fecha_hora) * 1000)::bigint, estacion_id, {', '.join(columnas)} "
+                    f"FROM mediciones WHERE fecha_hora >= %s AND fecha_hora < %s ORDER BY fecha_hora, id",
+                    rango,
+                )
+                inicio = 0
+                while True:
+                    lote = cursor.fetchmany(TAMANO_BLOQUE)
+                    if not lote:
+                        break
+                    fin = inicio + len(lote)
+                    tiempos[inicio:fin] = [fila[0] for fila in lote]
+                    estaciones[inicio:fin] = [fila[1] for fila in lote]
+                    for i, columna in enumerate(columnas, start=2):
+                        # None se convierte en NaN
+                        valores[columna][inicio:fin] = np.array([fila[i] for fila in lote], dtype=np.float32)
+                    inicio = fin
+    except psycopg2.Error as e:
+        logger.error("Error al exportar la partición %s: %s", nombre, e)
+        raise
+
+    bloques = []
+    for inicio in range(0, filas, TAMANO_BLOQUE):
+        fin = min(inicio + TAMANO_BLOQUE, filas)
+        bloque = {"inicio": inicio, "fin": fin, "fecha_hora": [int(tiempos[inicio]), int(tiempos[fin - 1])]}
+        for columna, arreglo in valores.items():
+            bloque[columna] = _rango_bloque(arreglo[inicio:fin])
+        bloques.append(bloque)
+    presentes = [int(estacion) for estacion in np.unique(estaciones)]
+    for arreglo in (tiempos, estaciones, *valores.values()):
+        arreglo.flush()
+    del tiempos, estaciones, valores
+
+    metadatos = {
+        "particion": nombre,
+        "desde": a_milisegundos(datetime(mes.year, mes.month, 1)),
+        "hasta": a_milisegundos(datetime.combine(_mes_siguiente(mes), datetime.min.time())),
+        "filas": filas,
+        "columnas": columnas,
+        "estaciones": presentes,
+        "tamano_bloque": TAMANO_BLOQUE,
+        "bloques": bloques,
+    }
+    with open(os.path.join(temporal, "metadatos.json"), "w") as archivo:
+        json.dump(metadatos, archivo)
+    # Publicar la partición completa de una vez
+    if os.path.exists(destino):
+        shutil.rmtree(destino)
+    os.rename(temporal, destino)
+    if cambios is not None:
+        _borrar_marca(mes, cambios)
+    return filas
+
+
+def _borrar_marca(mes, cambios):
+    # Solo si ninguna escritura confirmada desde la lectura volvió a marcar el mes
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM archivo_pendiente WHERE mes = %s AND cambios = %s", (mes, cambios))
+    except psycopg2.Error as e:
+        logger.error("Error al borrar la marca del mes %s: %s", mes, e)
+        raise
+
+
+def exportar_particiones_cerradas(directorio=DIRECTORIO_ARCHIVO, solo_archivadas=False):
+    """
+    Exporta los meses ya terminados que aún no están en el archivo (los
+    de cada partición mensual y los que solo tienen filas en la partición
+    por defecto) y vuelve a exportar los archivados que cambiaron desde
+    su exportación. Con solo_archivadas=True solo hace lo segundo.
+    Returns: lista de particiones exportadas.
+    """
+    crear_marcas_archivo()
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT 'mediciones_' || to_char(mes, 'YYYY_MM') FROM archivo_pendiente")
+            pendientes = {fila[0] for fila in cursor.fetchall()}
+            cursor.execute("""
+                SELECT hija.relname
+                FROM pg_inherits
+                JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+                JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+                WHERE padre.relname = 'mediciones'
+            """)
+            nombres = {fila[0] for fila in cursor.fetchall() if PATRON_PARTICION.match(fila[0])}
+            cursor.execute("SELECT to_regclass('mediciones_default')")
+            if cursor.fetchone()[0] is not None:
+                cursor.execute("""
+                    SELECT DISTINCT 'mediciones_' || to_char(fecha_hora, 'YYYY_MM')
+                    FROM mediciones_default
+                """)
+                nombres.update(fila[0] for fila in cursor.fetchall())
+    except psycopg2.Error as e:
+        logger.error("Error al listar las particiones a exportar: %s", e)
+        raise
+    nombres = sorted(nombres)
+    mes_actual = date.today().replace(day=1)
+    exportadas = []
+    for nombre in nombres:
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if date(int(coincidencia[1]), int(coincidencia[2]), 1) >= mes_actual:
+            continue
+        if os.path.exists(os.path.join(directorio, nombre, "metadatos.json")):
+            if nombre not in pendientes:
+                continue
+        elif solo_archivadas:
+            continue
+        if exportar_particion(nombre, directorio) is not None:
+            exportadas.append(nombre)
+    return exportadas
+
+
+_metadatos_cache = {}
+
+
+def listar_archivo(directorio=DIRECTORIO_ARCHIVO):
+    """
+    Devuelve los metadatos de las particiones archivadas ordenados por
+    tiempo. Se leen del disco solo cuando cambian.
+    """
+    if not os.path.isdir(directorio):
+        return []
+    resultado = []
+    for nombre in sorted(os.listdir(directorio)):
+        ruta = os.path.join(directorio, nombre, "metadatos.json")
+        if not PATRON_PARTICION.match(nombre) or not os.path.exists(ruta):
+            continue
+        modificado = os.path.getmtime(ruta)
+        en_cache = _metadatos_cache.get(ruta)
+        if en_cache is None or en_cache[0] != modificado:
+            with open(ruta) as archivo:
+                en_cache = (modificado, json.load(archivo))
+            _metadatos_cache[ruta] = en_cache
+        resultado.append(en_cache[1])
+    return sorted(resultado, key=lambda metadatos: metadatos["desde"])
+
+
+def horizonte_archivo(directorio=DIRECTORIO_ARCHIVO):
+    """
+    Devuelve el instante hasta el que cubre el archivo (fin del último
+    mes archivado) o None si está vacío.
+    """
+    particiones = listar_archivo(directorio)
+    return desde_milisegundos(particiones[-1]["hasta"]) if particiones else None
+
+
+def _estaciones_particion(metadatos):
+    # Las particiones exportadas antes de archivar estacion_id son todas
+    # de la estación por defecto
+    return metadatos.get("estaciones", [ESTACION_POR_DEFECTO])
+
+
+def estaciones_archivo(directorio=DIRECTORIO_ARCHIVO):
+    """
+    Devuelve los ids de las estaciones con filas en el archivo
+    """
+    return sorted({estacion for metadatos in listar_archivo(directorio)
+                   for estacion in _estaciones_particion(metadatos)})
+
+
+def recalibrar_archivo(estacion_id, coeficientes, desde=None, hasta=None, directorio=DIRECTORIO_ARCHIVO):
+    """
+    Vuelve a derivar ozono_ppb e intensidad_uv de las filas archivadas de
+    la estación en [desde, hasta) a partir de sus valores crudos, con el
+    mismo criterio que app.calibracion.recalibrar sobre la base de datos:
+    las filas sin valor crudo válido conservan el valor guardado. Los
+    archivos se modifican en el lugar y se actualizan las estadísticas de
+    los bloques modificados.
+
+    Returns:
+        Cantidad de filas archivadas recalibradas.
+    """
+    from .calibracion import calibrar_arreglos
+
+    desde_ms = a_milisegundos(desde) if desde is not None else None
+    hasta_ms = a_milisegundos(hasta) if hasta is not None else None
+    recalibradas = 0
+    for metadatos in listar_archivo(directorio):
+        if (desde_ms is not None and metadatos["hasta"] <= desde_ms) or \
+           (hasta_ms is not None and metadatos["desde"] >= hasta_ms) or metadatos["filas"] == 0:
+            continue
+        if estacion_id not in _estaciones_particion(metadatos):
+            continue
+        columnas = metadatos["columnas"]
+        if not {"ozono_mv", "uv_mv", "ozono_ppb", "intensidad_uv"} <= set(columnas):
+            continue
+        ruta = os.path.join(directorio, metadatos["particion"])
+        tiempos = np.load(os.path.join(ruta, "fecha_hora.npy"), mmap_mode="r")
+        inicio = 0 if desde_ms is None else int(np.searchsorted(tiempos, desde_ms, side="left"))
+        fin = len(tiempos) if hasta_ms is None else int(np.searchsorted(tiempos, hasta_ms, side="left"))
+        if len(_estaciones_particion(metadatos)) > 1:
+            estaciones = np.load(os.path.join(ruta, "estacion_id.npy"), mmap_mode="r")[inicio:fin]
+            filas = inicio + np.flatnonzero(estaciones == estacion_id)
+        else:
+            filas = np.arange(inicio, fin)
+        if not len(filas):
+            continue
+
+        def leer(columna):
+            if columna not in columnas:
+                return np.full(len(filas), np.nan, dtype=np.float32)
+            return np.load(os.path.join(ruta, f"{columna}.npy"), mmap_mode="r")[filas]
+
+        ppb, intensidad = calibrar_arreglos(leer("ozono_mv"), leer("uv_mv"), leer("temperatura"),
+                                            leer("humedad_relativa"), coeficientes)
+        modificados = set()
+        for columna, nuevos in (("ozono_ppb", ppb), ("intensidad_uv", intensidad)):
+            validos = ~np.isnan(nuevos)
+            arreglo = np.load(os.path.join(ruta, f"{columna}.npy"), mmap_mode="r+")
+            arreglo[filas[validos]] = nuevos[validos]
+            arreglo.flush()
+            for i in np.unique(filas[validos] // metadatos["tamano_bloque"]):
+                bloque = metadatos["bloques"][i]
+                bloque[columna] = _rango_bloque(arreglo[bloque["inicio"]:bloque["fin"]])
+                modificados.add(int(i))
+            del arreglo
+        if not modificados:
+            continue
+        recalibradas += int((~np.isnan(ppb) | ~np.isnan(intensidad)).sum())
+        # Reemplazar los metadatos de una vez para que los lectores no vean un JSON a medias
+        temporal = os.path.join(ruta, "metadatos.json.tmp")
+        with open(temporal, "w") as archivo:
+            json.dump(metadatos, archivo)
+        os.replace(temporal, os.path.join(ruta, "metadatos.json"))
+    return recalibradas
+
+
+def leer_rango(desde=None, hasta=None, columnas=None, directorio=DIRECTORIO_ARCHIVO, estacion=None):
+    """
+    Lee del archivo las filas del rango [desde, hasta) para 'columnas',
+    solo las de 'estacion' si se indica.
+
+    Returns:
+        Diccionario columna -> arreglo, con 'fecha_hora' en milisegundos
+        desde la época. Si el rango está en una sola partición y no se
+        filtra por estación, los arreglos son vistas de solo lectura sobre
+        los archivos mapeados (sin copia); si no, son copias.
+    """
+    columnas = list(columnas or COLUMNAS_ARCHIVO)
+    invalidas = [c for c in columnas if c not in COLUMNAS_ARCHIVO]
+    if invalidas:
+        raise ValueError(f"Columnas no válidas: {', '.join(invalidas)}")
+    desde_ms = a_milisegundos(desde) if desde is not None else None
+    hasta_ms = a_milisegundos(hasta) if hasta is not None else None
+
+    partes = []
+    for metadatos in listar_archivo(directorio):
+        if (desde_ms is not None and metadatos["hasta"] <= desde_ms) or \
+           (hasta_ms is not None and metadatos["desde"] >= hasta_ms) or metadatos["filas"] == 0:
+            continue
+        if estacion is not None and estacion not in _estaciones_particion(metadatos):
+            continue
+        ruta = os.path.join(directorio, metadatos["particion"])
+        tiempos = np.load(os.path.join(ruta, "fecha_hora.npy"), mmap_mode="r")
+        inicio = 0 if desde_ms is None else int(np.searchsorted(tiempos, desde_ms, side="left"))
+        fin = len(tiempos) if hasta_ms is None else int(np.searchsorted(tiempos, hasta_ms, side="left"))
+        if inicio >= fin:
+            continue
+        parte = {"fecha_hora": tiempos[inicio:fin]}
+        for columna in columnas:
+            if columna in metadatos["columnas"]:
+                parte[columna] = np.load(os.path.join(ruta, f"{columna}.npy"), mmap_mode="r")[inicio:fin]
+            else:
+                parte[columna] = np.full(fin - inicio, np.nan, dtype=np.float32)
+        if estacion is not None and len(_estaciones_particion(metadatos)) > 1:
+            seleccion = np.load(os.path.join(ruta, "estacion_id.npy"), mmap_mode="r")[inicio:fin] == estacion
+            parte = {clave: arreglo[seleccion] for clave, arreglo in parte.items()}
+        partes.append(parte)
+
+    if not partes:
+        vacio = {"fecha_hora": np.empty(0, dtype=np.int64)}
+        vacio.update({columna: np.empty(0, dtype=np.float32) for columna in columnas})
+        return vacio
+    if len(partes) == 1:
+        return partes[0]
+    return {clave: np.concatenate([parte[clave] for parte in partes]) for clave in partes[0]}
+
+
+def _percentiles_por_segmento(valores, segmentos, inicios, cantidad, percentil):
+    """
+    Percentil de los valores no NaN de cada segmento contiguo, con
+    interpolación lineal como np.nanpercentile y percentile_cont de
+    PostgreSQL. Un solo ordenamiento por (segmento, valor) deja los
+    valores de cada segmento ordenados a partir de su inicio, con los
+    NaN al final.
+    """
+    ordenados = valores[np.lexsort((valores, segmentos))]
+    posicion = percentil / 100 * np.maximum(cantidad - 1, 0)
+    bajo = np.floor(posicion).astype(np.int64)
+    alto = np.ceil(posicion).astype(np.int64)
+    inferior = ordenados[inicios + bajo]
+    superior = ordenados[inicios + alto]
+    return inferior + (superior - inferior) * (posicion - bajo)
+
+
+def agregar_rango(desde, hasta, segundos, metricas, estacion=None):
+    """
+    Calcula sobre el archivo las mismas estadísticas por intervalo que las
+    tablas de agregados (ver app.agregados) con intervalos de 'segundos',
+    de 'estacion' o, sin ella, de toda la red.
+
+    Returns:
+        Lista de diccionarios con 'bucket', 'filas' y '<métrica>_<estadística>'.
+    """
+    datos = leer_rango(desde, hasta, metricas, estacion=estacion)
+    tiempos = datos["fecha_hora"]
+    if len(tiempos) == 0:
+        return []
+    # Las filas están ordenadas por tiempo: cada intervalo es un segmento contiguo
+    intervalos = tiempos // (segundos * 1000)
+    inicios = np.flatnonzero(np.r_[True, intervalos[1:] != intervalos[:-1]])
+    tamanos = np.diff(np.r_[inicios, len(tiempos)])
+    segmentos = np.repeat(np.arange(len(inicios)), tamanos)
+    columnas = {
+        "bucket": [desde_milisegundos(i * segundos * 1000) for i in intervalos[inicios]],
+        "filas": tamanos.tolist(),
+    }
+    for metrica in metricas:
+        valores = np.asarray(datos[metrica], dtype=np.float64)
+        validos = ~np.isnan(valores)
+        cantidad = np.add.reduceat(validos, inicios)
+        suma = np.add.reduceat(np.where(validos, valores, 0.0), inicios)
+        vacios = cantidad == 0
+        estadisticas = {
+            "min": np.fmin.reduceat(valores, inicios),
+            "max": np.fmax.reduceat(valores, inicios),
+            "avg": suma / np.maximum(cantidad, 1),
+            "p95": _percentiles_por_segmento(valores, segmentos, inicios, cantidad, 95),
+        }
+        for estadistica, arreglo in estadisticas.items():
+            # Los intervalos sin valores de la métrica quedan en None, como en SQL
+            arreglo = arreglo.astype(object)
+            arreglo[vacios] = None
+            columnas[f"{metrica}_{estadistica}"] = arreglo.tolist()
+        columnas[f"{metrica}_n"] = cantidad.tolist()
+    return [dict(zip(columnas, fila)) for fila in zip(*columnas.values())]
+
+
+if __name__ == "__main__":
+    configurar_registro()
+    if len(sys.argv) < 2 or sys.argv[1] != "exportar":
+        print("Uso: python -m app.archivo exportar [particion ...]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        for particion in sys.argv[2:]:
+            filas = exportar_particion(particion)
+            if filas is None:
+                print(f"[!] {particion}: no se reemplazó (el archivo tiene más filas)")
+            else:
+                print(f"[+] {particion}: {filas} filas exportadas")
+    else:
+        for particion in exportar_particiones_cerradas():
+            print(f"[+] {particion} exportada")
@@ -0,0 +1,536 @@
+"""
+Carga masiva en 'mediciones' de los registros históricos de una
+estación (por ejemplo, las semanas guardadas en el equipo mientras
+estuvo sin conexión).
+
+Formatos de entrada:
+    CSV     Primera línea con los nombres de las columnas: fecha_hora,
+            cualquier subconjunto de las métricas de app.esquema y,
+            opcionalmente, 'estacion' (código de la estación). Valores
+            separados por coma y sin comillas; un campo vacío es NULL.
+    NDJSON  Un objeto JSON por línea con las mismas claves.
+
+fecha_hora va como texto ISO 8601 sin zona horaria, como en
+'mediciones'; las filas con un número (por ejemplo, milisegundos desde la
+época) o con desplazamiento horario ('Z', '+02:00') se descartan. Las
+columnas que no están en el registro se ignoran.
+
+El archivo se lee por bloques de líneas que un pool de procesos
+convierte a arreglos de NumPy por columna (sin recorrer las filas en
+Python salvo para ubicar las inválidas, que se descartan) y carga con
+COPY binario en una tabla temporal. Desde ella un único INSERT ...
+SELECT agrega las filas cuya clave (estacion_id, fecha_hora) todavía no
+está en 'mediciones', por lo que volver a cargar un archivo no duplica
+filas. Antes se crea la partición mensual de cada mes del bloque que no
+la tenga, para que los datos históricos no queden en la partición por
+defecto. Dentro de un bloque, de dos filas con la misma clave queda la
+última; entre bloques, un advisory lock por estación y día evita que dos
+procesos inserten la misma clave a la vez.
+
+El avance se guarda en '<archivo>.progreso': la posición hasta la que
+todos los bloques están confirmados. Tras una interrupción, el mismo
+comando retoma desde ahí; los bloques posteriores que ya se habían
+confirmado se vuelven a procesar sin insertar nada.
+
+Uso desde la línea de comandos (desde backend/):
+    python -m app.backfill registros/estacion-07.csv --estacion estacion-07
+    python -m app.backfill registros/*.ndjson --procesos 4 --refrescar
+    python -m app.backfill registros/*.csv --archivo-metricas /var/lib/node_exporter/backfill.prom
+
+Las métricas de todos los procesos (filas ingresadas, latencias de
+PostgreSQL) se exponen sumadas con --puerto-metricas o se escriben tras
+cada bloque confirmado con --archivo-metricas (ver app.metricas).
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+import psycopg2
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from . import config
+from .db import conexion, obtener_pool
+from .esquema import NOMBRES_METRICAS, verificar_esquema
+from .estaciones import registrar_estacion, registrar_estaciones
+from .ingesta import copiar_arreglos
+from .metricas import (MEDICIONES_INGRESADAS_TOTAL, exportar_archivo, guardar_instantanea,
+                       iniciar_instantaneas, limpiar_directorio, servir_metricas, usar_directorio)
+from .registro import configurar_registro
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ("csv", "ndjson")
+
+# Formato según la extensión del archivo
+EXTENSIONES = {".csv": "csv", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# Líneas por bloque: cada bloque es una transacción
+FILAS_POR_BLOQUE = 100000
+
+SUFIJO_PROGRESO = ".progreso"
+
+# Tabla temporal de cada conexión; las métricas van en DOUBLE PRECISION
+# y se convierten al tipo de la columna en el INSERT
+SQL_CREAR_STAGING = (
+    "CREATE TEMP TABLE IF NOT EXISTS backfill_staging (estacion_id INTEGER, fecha_hora TIMESTAMP, "
+    + ", ".join(f"{nombre} DOUBLE PRECISION" for nombre in NOMBRES_METRICAS)
+    + ") ON COMMIT DELETE ROWS"
+)
+
+# Los NaN de la tabla temporal son valores ausentes. La condición sobre el
+# rango de fecha_hora limita la búsqueda de claves existentes a las
+# particiones del bloque
+SQL_MEZCLAR = (
+    f"INSERT INTO mediciones (estacion_id, fecha_hora, {', '.join(NOMBRES_METRICAS)}) "
+    f"SELECT s.estacion_id, s.fecha_hora, "
+    + ", ".join(f"NULLIF(s.{nombre}, 'NaN')" for nombre in NOMBRES_METRICAS)
+    + " FROM backfill_staging s WHERE NOT EXISTS ("
+    "SELECT 1 FROM mediciones m WHERE m.estacion_id = s.estacion_id "
+    "AND m.fecha_hora = s.fecha_hora "
+    "AND m.fecha_hora >= %(desde)s AND m.fecha_hora <= %(hasta)s)"
+)
+
+# Un lock por (estación, día) del bloque, tomados en orden para que dos
+# transacciones no se bloqueen mutuamente
+SQL_BLOQUEAR = "SELECT pg_advisory_xact_lock(e, d) FROM unnest(%s::int[], %s::int[]) AS claves(e, d)"
+
+# Crea la partición de cada mes si no existe (ver database/crear_tabla_mediciones.py)
+SQL_CREAR_PARTICIONES = "SELECT crear_particion_mediciones(mes) FROM unnest(%s::date[]) AS meses(mes)"
+
+_cargar_json = orjson.loads if orjson is not None else json.loads
+
+# Ids de las estaciones ya registradas, por proceso (código -> id)
+_ids_estaciones = {}
+
+# Meses cuya partición ya se comprobó, por proceso
+_meses_con_particion = set()
+
+
+def formato_de(ruta):
+    """
+    Formato del archivo según su extensión.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in EXTENSIONES:
+        raise ValueError(f"No se reconoce el formato de '{ruta}' (usar --formato)")
+    return EXTENSIONES[extension]
+
+
+def columnas_csv(cabecera):
+    """
+    Nombres de las columnas a partir de la primera línea del CSV.
+    """
+    columnas = [nombre.strip() for nombre in cabecera.decode("utf-8-sig").strip().split(",")]
+    if "fecha_hora" not in columnas:
+        raise ValueError("El CSV no tiene la columna 'fecha_hora'")
+    ignoradas = [c for c in columnas if c not in NOMBRES_METRICAS and c not in ("fecha_hora", "estacion")]
+    if ignoradas:
+        logger.warning("Columnas ignoradas (no están en app.esquema): %s", ", ".join(ignoradas))
+    return columnas
+
+
+def _columna_real(valores):
+    # Conversión en bloque; si falla, valor por valor para ubicar los
+    # inválidos. None y "" son valores ausentes (NaN)
+    try:
+        arreglo = np.array(valores, dtype=np.float64)
+    except (ValueError, TypeError):
+        arreglo = np.full(len(valores), np.nan)
+        invalidas = np.zeros(len(valores), dtype=bool)
+        for i, valor in enumerate(valores):
+            if valor is None or valor == "":
+                continue
+            try:
+                arreglo[i] = float(valor)
+            except (ValueError, TypeError):
+                invalidas[i] = True
+        return arreglo, invalidas | np.isinf(arreglo)
+    return arreglo, np.isinf(arreglo)
+
+
+def _columna_fecha(valores):
+    # Solo texto sin zona horaria: NumPy tomaría un número como unidades
+    # desde la época y convertiría a UTC un desplazamiento horario. Tras
+    # la fecha (AAAA-MM-DD) un '+', un '-' o una 'Z' final indican zona
+    es_texto = np.fromiter((isinstance(valor, str) for valor in valores), dtype=bool, count=len(valores))
+    textos = np.char.strip(np.array([valor if texto else "" for valor, texto in zip(valores, es_texto.tolist())],
+                                    dtype=str))
+    con_zona = ((np.char.find(textos, "+") >= 0) | (np.char.rfind(textos, "-") >= 10)
+                | np.char.endswith(np.char.upper(textos), "Z"))
+    aceptadas = np.flatnonzero(es_texto & ~con_zona & (textos != ""))
+    arreglo = np.full(len(valores), np.datetime64("NaT"), dtype="datetime64[us]")
+    try:
+        arreglo[aceptadas] = textos[aceptadas].astype("datetime64[us]")
+    except ValueError:
+        for i in aceptadas:
+            try:
+                arreglo[i] = np.datetime64(textos[i], "us")
+            except ValueError:
+                pass
+    return arreglo, np.isnat(arreglo)
+
+
+def armar_bloque(columnas, n):
+    """
+    Convierte los valores de texto de cada columna (nombre -> lista de n
+    valores) en arreglos y descarta las filas sin fecha_hora válida o con
+    algún valor que no es un número.
+
+    Returns:
+        (codigos, fecha_hora, valores, rechazadas): los códigos de
+        estación de cada fila (o None si no hay columna 'estacion'),
+        fecha_hora como datetime64[us], una matriz (filas, métricas) en
+        el orden de NOMBRES_METRICAS con NaN donde no hay valor, y la
+        cantidad de filas descartadas.
+    """
+    fecha_hora, invalidas = _columna_fecha(columnas["fecha_hora"])
+    valores = np.full((n, len(NOMBRES_METRICAS)), np.nan)
+    for j, nombre in enumerate(NOMBRES_METRICAS):
+        if nombre in columnas:
+            valores[:, j], invalidas_columna = _columna_real(columnas[nombre])
+            invalidas |= invalidas_columna
+    codigos = columnas.get("estacion")
+    validas = ~invalidas
+    if invalidas.any():
+        fecha_hora, valores = fecha_hora[validas], valores[validas]
+        if codigos is not None:
+            codigos = [codigo for codigo, valida in zip(codigos, validas.tolist()) if valida]
+    return codigos, fecha_hora, valores, int(invalidas.sum())
+
+
+def parsear_csv(datos, columnas):
+    """
+    Bloque de líneas CSV (bytes, sin cabecera) con las 'columnas' de la
+    cabecera; ver armar_bloque. Las líneas con otra cantidad de campos se
+    descartan.
+    """
+    lineas = [linea for linea in datos.decode(errors="replace").splitlines() if linea.strip()]
+    k = len(columnas)
+    campos = ",".join(lineas).split(",")
+    rechazadas = 0
+    if len(campos) != len(lineas) * k:
+        completas = [linea for linea in lineas if linea.count(",") == k - 1]
+        rechazadas = len(lineas) - len(completas)
+        lineas = completas
+        campos = ",".join(lineas).split(",")
+    por_columna = {nombre: campos[i::k] for i, nombre in enumerate(columnas)
+                   if nombre in NOMBRES_METRICAS or nombre in ("fecha_hora", "estacion")}
+    codigos, fecha_hora, valores, invalidas = armar_bloque(por_columna, len(lineas))
+    return codigos, fecha_hora, valores, rechazadas + invalidas
+
+
+def parsear_ndjson(datos):
+    """
+    Bloque de líneas NDJSON (bytes); ver armar_bloque. Las líneas que no
+    son un objeto JSON se descartan.
+    """
+    lineas = [linea for linea in datos.splitlines() if linea.strip()]
+    rechazadas = 0
+    try:
+        objetos = _cargar_json(b"[" + b",".join(lineas) + b"]")
+    except ValueError:
+        objetos = []
+        for linea in lineas:
+            try:
+                objetos.append(_cargar_json(linea))
+            except ValueError:
+                rechazadas += 1
+    if not all(isinstance(objeto, dict) for objeto in objetos):
+        objetos = [objeto for objeto in objetos if isinstance(objeto, dict)]
+        rechazadas = len(lineas) - len(objetos)
+    claves = set(NOMBRES_METRICAS) & set().union(*objetos) if objetos else set()
+    por_columna = {nombre: [objeto.get(nombre) for objeto in objetos] for nombre in claves}
+    por_columna["fecha_hora"] = [objeto.get("fecha_hora") for objeto in objetos]
+    if any("estacion" in objeto for objeto in objetos):
+        por_columna["estacion"] = [objeto.get("estacion") for objeto in objetos]
+    codigos, fecha_hora, valores, invalidas = armar_bloque(por_columna, len(objetos))
+    return codigos, fecha_hora, valores, rechazadas + invalidas
+
+
+def deduplicar(estacion_id, fecha_hora, valores):
+    """
+    Ordena el bloque por (estacion_id, fecha_hora) y deja, de cada clave
+    repetida, la última fila.
+    """
+    orden = np.lexsort((fecha_hora, estacion_id))
+    estacion_id, fecha_hora, valores = estacion_id[orden], fecha_hora[orden], valores[orden]
+    ultimas = np.ones(len(orden), dtype=bool)
+    ultimas[:-1] = (estacion_id[1:] != estacion_id[:-1]) | (fecha_hora[1:] != fecha_hora[:-1])
+    return estacion_id[ultimas], fecha_hora[ultimas], valores[ultimas]
+
+
+def _ids_de(codigos, estacion_id):
+    # Id de estación de cada fila; las filas sin código usan 'estacion_id'
+    # (None si no se indicó) y se marcan como inválidas si no hay ninguno
+    codigos = ["" if codigo is None else str(codigo).strip() for codigo in codigos]
+    unicos, inversa = np.unique(np.array(codigos, dtype=object), return_inverse=True)
+    nuevos = [codigo for codigo in unicos if codigo and codigo not in _ids_estaciones]
+    if nuevos:
+        with conexion() as conn, conn.cursor() as cursor:
+            _ids_estaciones.update(registrar_estaciones(cursor, nuevos))
+    ids = np.array([_ids_estaciones[codigo] if codigo else (estacion_id or -1) for codigo in unicos],
+                   dtype=np.int32)
+    return ids[inversa]
+
+
+def crear_particiones_de(conn, fecha_hora):
+    """
+    Crea, en una transacción propia de 'conn', las particiones mensuales
+    que falten para los meses de 'fecha_hora' (moviéndoles las filas de
+    esos meses que estén en la partición por defecto).
+    """
+    meses = {str(mes) for mes in np.unique(fecha_hora.astype("datetime64[M]"))} - _meses_con_particion
+    if not meses:
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_CREAR_PARTICIONES, (sorted(f"{mes}-01" for mes in meses),))
+    conn.commit()
+    _meses_con_particion.update(meses)
+
+
+def cargar_bloque(conn, estacion_id, fecha_hora, valores):
+    """
+    Inserta en 'mediciones', en la transacción de 'conn', las filas del
+    bloque cuya (estacion_id, fecha_hora) no existe.
+
+    Returns:
+        Cantidad de filas insertadas.
+    """
+    estacion_id, fecha_hora, valores = deduplicar(estacion_id, fecha_hora, valores)
+    if not len(fecha_hora):
+        return 0
+    dias = fecha_hora.astype("datetime64[D]").astype(np.int64)
+    claves = np.unique(np.stack([estacion_id.astype(np.int64), dias], axis=1), axis=0)
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_CREAR_STAGING)
+        arreglos = {"estacion_id": estacion_id, "fecha_hora": fecha_hora}
+        for j, nombre in enumerate(NOMBRES_METRICAS):
+            arreglos[nombre] = valores[:, j]
+        copiar_arreglos(conn, "backfill_staging", arreglos)
+        cursor.execute(SQL_BLOQUEAR, (claves[:, 0].tolist(), claves[:, 1].tolist()))
+        cursor.execute(SQL_MEZCLAR, {"desde": fecha_hora.min().item(), "hasta": fecha_hora.max().item()})
+        return cursor.rowcount
+
+
+def _procesar_bloque(datos, formato, columnas, estacion_id):
+    # Se ejecuta en el proceso hijo: el pool de conexiones se crea aquí
+    iniciar_instantaneas()
+    if formato == "csv":
+        codigos, fecha_hora, valores, rechazadas = parsear_csv(datos, columnas)
+    else:
+        codigos, fecha_hora, valores, rechazadas = parsear_ndjson(datos)
+    leidas = len(fecha_hora) + rechazadas
+    try:
+        if codigos is None:
+            ids = np.full(len(fecha_hora), estacion_id or -1, dtype=np.int32)
+        else:
+            ids = _ids_de(codigos, estacion_id)
+        sin_estacion = ids < 0
+        if sin_estacion.any():
+            rechazadas += int(sin_estacion.sum())
+            ids, fecha_hora, valores = ids[~sin_estacion], fecha_hora[~sin_estacion], valores[~sin_estacion]
+        with obtener_pool().conexion() as conn:
+            crear_particiones_de(conn, fecha_hora)
+            insertadas = cargar_bloque(conn, ids, fecha_hora, valores)
+    except psycopg2.Error as e:
+        logger.error("Error al cargar un bloque de mediciones: %s", e)
+        raise
+    finally:
+        # Los hijos del pool terminan sin ejecutar atexit
+        guardar_instantanea()
+    return leidas, insertadas, rechazadas
+
+
+class Progreso:
+    """
+    Avance de la carga de un archivo, guardado en 'ruta' como JSON.
+
+    'posicion' es el byte del archivo hasta el que todos los bloques están
+    confirmados. El archivo se identifica por tamaño y fecha de
+    modificación: si cambió, la carga empieza de nuevo.
+    """
+
+    __slots__ = ("ruta", "tamano", "modificado", "posicion", "leidas", "insertadas",
+                 "rechazadas", "completo")
+
+    def __init__(self, ruta, tamano, modificado):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.modificado = modificado
+        self.posicion = 0
+        self.leidas = 0
+        self.insertadas = 0
+        self.rechazadas = 0
+        self.completo = False
+
+    @classmethod
+    def cargar(cls, ruta, ruta_archivo, reiniciar=False):
+        """
+        Progreso guardado de 'ruta_archivo', o uno nuevo si no hay, si el
+        archivo cambió o con 'reiniciar'.
+        """
+        estado = os.stat(ruta_archivo)
+        progreso = cls(ruta, estado.st_size, estado.st_mtime_ns)
+        if reiniciar or not os.path.exists(ruta):
+            return progreso
+        with open(ruta, encoding="utf-8") as archivo:
+            guardado = json.load(archivo)
+        if (guardado["tamano"], guardado["modificado"]) != (progreso.tamano, progreso.modificado):
+            logger.warning("'%s' cambió desde la carga anterior; se carga desde el inicio", ruta_archivo)
+            return progreso
+        for campo in ("posicion", "leidas", "insertadas", "rechazadas", "completo"):
+            setattr(progreso, campo, guardado[campo])
+        return progreso
+
+    def avanzar(self, posicion, leidas, insertadas, rechazadas):
+        self.posicion = posicion
+        self.leidas += leidas
+        self.insertadas += insertadas
+        self.rechazadas += rechazadas
+        self.guardar()
+
+    def guardar(self):
+        # Se escribe aparte y se reemplaza, para no dejar un archivo a medias
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump({campo: getattr(self, campo) for campo in self.__slots__ if campo != "ruta"}, archivo)
+        os.replace(temporal, self.ruta)
+
+    @property
+    def fraccion(self):
+        return self.posicion / self.tamano if self.tamano else 1.0
+
+
+def backfill(ruta, estacion=None, procesos=None, filas_por_bloque=FILAS_POR_BLOQUE, formato=None,
+             ruta_progreso=None, reiniciar=False, al_avanzar=None):
+    """
+    Carga el archivo 'ruta' en 'mediciones', retomando la carga anterior
+    si quedó incompleta. 'estacion' es el código de la estación de las
+    filas sin columna 'estacion' (se registra si no existe).
+    'al_avanzar(progreso)' se llama cada vez que se confirma un bloque.
+
+    Returns:
+        El Progreso de la carga.
+    """
+    formato = formato or formato_de(ruta)
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no válido: {formato}")
+    progreso = Progreso.cargar(ruta_progreso or ruta + SUFIJO_PROGRESO, ruta, reiniciar)
+    if progreso.completo:
+        return progreso
+    estacion_id = registrar_estacion(estacion) if estacion else None
+    procesos = procesos or os.cpu_count() or 1
+
+    with open(ruta, "rb") as archivo, ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        columnas = None
+        if formato == "csv":
+            columnas = columnas_csv(archivo.readline())
+            if estacion_id is None and "estacion" not in columnas:
+                raise ValueError("Indicar la estación o incluir la columna 'estacion'")
+        archivo.seek(max(progreso.posicion, archivo.tell()))
+        # Bloques en curso en orden de lectura: el avance se confirma solo
+        # hasta el primero que no terminó
+        pendientes = deque()
+        while True:
+            datos = b"".join(islice(archivo, filas_por_bloque))
+            if datos:
+                futuro = ejecutor.submit(_procesar_bloque, datos, formato, columnas, estacion_id)
+                pendientes.append((futuro, archivo.tell()))
+            while pendientes and (not datos or len(pendientes) > 2 * procesos or pendientes[0][0].done()):
+                futuro, fin = pendientes.popleft()
+                leidas, insertadas, rechazadas = futuro.result()
+                progreso.avanzar(fin, leidas, insertadas, rechazadas)
+                MEDICIONES_INGRESADAS_TOTAL.incrementar(insertadas, origen="backfill")
+                if al_avanzar is not None:
+                    al_avanzar(progreso)
+            if not datos:
+                break
+    progreso.completo = True
+    progreso.guardar()
+    return progreso
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga masiva de registros históricos en 'mediciones'")
+    parser.add_argument("archivos", nargs="+", help="archivos CSV o NDJSON")
+    parser.add_argument("--estacion", help="código de la estación de las filas sin columna 'estacion'")
+    parser.add_argument("--formato", choices=FORMATOS, help="por defecto, según la extensión")
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por núcleo")
+    parser.add_argument("--filas-por-bloque", type=int, default=FILAS_POR_BLOQUE)
+    parser.add_argument("--reiniciar", action="store_true", help="ignorar el progreso guardado")
+    parser.add_argument("--refrescar", action="store_true",
+                        help="actualizar agregados, índices y meses archivados al terminar")
+    parser.add_argument("--puerto-metricas", type=int, default=config.METRICAS_PUERTO,
+                        help="exponer /metrics en este puerto")
+    parser.add_argument("--archivo-metricas",
+                        help="escribir las métricas en este archivo tras cada bloque")
+    args = parser.parse_args()
+
+    configurar_registro()
+    verificar_esquema()
+    if args.puerto_metricas:
+        servir_metricas(args.puerto_metricas)
+    elif args.archivo_metricas:
+        # Directorio en el que los procesos hijos dejan sus métricas
+        usar_directorio(tempfile.mkdtemp(prefix="metricas-"))
+        limpiar_directorio()
+    for ruta in args.archivos:
+        # Filas ya leídas en una carga anterior, para el ritmo de esta
+        previas = Progreso.cargar(ruta + SUFIJO_PROGRESO, ruta, args.reiniciar).leidas
+        comienzo = time.perf_counter()
+        ultimo_informe = comienzo
+
+        def informar(progreso):
+            nonlocal ultimo_informe
+            if args.archivo_metricas:
+                exportar_archivo(args.archivo_metricas)
+            ahora = time.perf_counter()
+            if ahora - ultimo_informe >= 1.0:
+                ultimo_informe = ahora
+                ritmo = (progreso.leidas - previas) / (ahora - comienzo)
+                print(f"[INFO] {ruta}: {progreso.fraccion:.0%} ({progreso.leidas} filas leídas, "
+                      f"{progreso.insertadas} insertadas, {progreso.rechazadas} rechazadas, "
+                      f"{ritmo:.0f} filas/s)", flush=True)
+
+        try:
+            progreso = backfill(ruta, args.estacion, args.procesos, args.filas_por_bloque, args.formato,
+                                reiniciar=args.reiniciar, al_avanzar=informar)
+        except KeyboardInterrupt:
+            print(f"[INFO] Carga de {ruta} interrumpida; volver a ejecutar el comando para retomarla")
+            sys.exit(1)
+        duracion = time.perf_counter() - comienzo
+        existentes = progreso.leidas - progreso.insertadas - progreso.rechazadas
+        print(f"[OK] {ruta}: {progreso.insertadas} filas insertadas, {existentes} ya existían "
+              f"o repetidas, {progreso.rechazadas} rechazadas en {duracion:.1f} s "
+              f"({(progreso.leidas - previas) / duracion:.0f} filas/s)")
+
+    if args.refrescar:
+        from .agregados import refrescar_agregados, refrescar_percentiles
+        from .indices import refrescar_indices
+        from .archivo import exportar_particiones_cerradas, listar_archivo
+        refrescar_agregados()
+        refrescar_percentiles()
+        refrescar_indices()
+        print("[+] Agregados e índices actualizados")
+        # Los meses ya archivados con filas nuevas se vuelven a exportar
+        if listar_archivo():
+            for particion in exportar_particiones_cerradas(solo_archivadas=True):
+                print(f"[+] {particion} exportada de nuevo al archivo")
+    if args.archivo_metricas:
+        exportar_archivo(args.archivo_metricas)
+
+
+if __name__ == "__main__":
+    main()
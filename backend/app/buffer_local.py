@@ -0,0 +1,255 @@
+"""
+Buffer local de almacenamiento y reenvío para estaciones con conexión
+inestable.
+
+Cada medición se agrega primero a un registro local SQLite en modo WAL
+con un número de secuencia creciente por estación, y un hilo de fondo lo
+sube al servidor en lotes grandes. El servidor guarda la última
+secuencia confirmada de cada estación en la misma transacción que las
+filas, por lo que un lote reenviado tras un corte no se duplica.
+
+Cada archivo SQLite tiene una época (un UUID aleatorio creado junto con
+él) que se sube con cada lote: si el archivo se borra y se vuelve a
+crear, la secuencia local reinicia en 1 y el servidor, al ver una época
+distinta, reinicia la suya en vez de descartar las filas nuevas.
+
+Las columnas de la tabla local salen del registro de app.esquema; a un
+buffer creado con una versión anterior se le agregan al abrirlo las
+métricas que le falten.
+"""
+import logging
+import socket
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import psycopg2
+
+from .db import obtener_pool
+from .esquema import METRICAS, NOMBRES_METRICAS
+from .estaciones import registrar_estaciones
+from .ingesta import escribir_lote
+from .metricas import MEDICIONES_INGRESADAS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+_COLUMNAS_PENDIENTES = ", ".join(("fecha_hora",) + NOMBRES_METRICAS)
+SQL_INSERTAR_PENDIENTE = (f"INSERT INTO pendientes ({_COLUMNAS_PENDIENTES}) "
+                          f"VALUES ({', '.join(['?'] * (len(NOMBRES_METRICAS) + 1))})")
+SQL_LEER_PENDIENTES = (f"SELECT secuencia, {_COLUMNAS_PENDIENTES} FROM pendientes "
+                       "ORDER BY secuencia LIMIT ?")
+
+
+class BufferLocal:
+    """
+    Registro local de mediciones pendientes de subir. Tiene la misma
+    interfaz agregar() que EscritorMediciones, por lo que puede usarse
+    como 'escritor' de EstacionMeteorologica.
+
+    Con journal_mode=WAL y synchronous=NORMAL cada escritura es un
+    append al WAL y los fsync se agrupan en los checkpoints.
+    """
+
+    def __init__(self, ruta, estacion=None):
+        self.ruta = ruta
+        self.estacion = estacion or socket.gethostname()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # AUTOINCREMENT garantiza que una secuencia nunca se reutiliza
+        metricas = "".join(f",\n    {columna.nombre} {columna.tipo}" for columna in METRICAS)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pendientes (\n"
+            "    secuencia INTEGER PRIMARY KEY AUTOINCREMENT,\n"
+            f"    fecha_hora TEXT NOT NULL{metricas}\n)"
+        )
+        existentes = {fila[1] for fila in self._conn.execute("PRAGMA table_info(pendientes)")}
+        for columna in METRICAS:
+            if columna.nombre not in existentes:
+                self._conn.execute(f"ALTER TABLE pendientes ADD COLUMN {columna.nombre} {columna.tipo}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS buffer (epoca TEXT NOT NULL)")
+        fila = self._conn.execute("SELECT epoca FROM buffer").fetchone()
+        if fila is None:
+            fila = (uuid.uuid4().hex,)
+            self._conn.execute("INSERT INTO buffer (epoca) VALUES (?)", fila)
+        self.epoca = fila[0]
+        self._conn.commit()
+
+    def agregar(self, datos, fecha_hora=None, timeout=None):
+        """
+        Registra una medición (sus métricas en el orden de
+        app.esquema.METRICAS). No depende de la disponibilidad de la base
+        de datos.
+        """
+        fecha_hora = (fecha_hora or datetime.now()).isoformat()
+        with self._lock:
+            self._conn.execute(SQL_INSERTAR_PENDIENTE, (fecha_hora, *datos))
+            self._conn.commit()
+
+    def leer_lote(self, tamano):
+        """
+        Devuelve hasta 'tamano' mediciones pendientes como
+        (secuencia, fecha_hora, *métricas).
+        """
+        with self._lock:
+            filas = self._conn.execute(SQL_LEER_PENDIENTES, (tamano,)).fetchall()
+        return [(secuencia, datetime.fromisoformat(fecha_hora), *valores)
+                for secuencia, fecha_hora, *valores in filas]
+
+    def confirmar(self, hasta_secuencia):
+        """
+        Elimina las mediciones ya subidas hasta 'hasta_secuencia' inclusive.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM pendientes WHERE secuencia <= ?", (hasta_secuencia,))
+            self._conn.commit()
+
+    def cantidad_pendientes(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM pendientes").fetchone()[0]
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BufferInconsistente(RuntimeError):
+    """
+    El lote local termina antes de la última secuencia que el servidor
+    confirmó para la misma época: las filas no se suben ni se confirman.
+    """
+
+
+def subir_lote(conn, estacion, lote, epoca=None):
+    """
+    Sube un lote (filas de BufferLocal.leer_lote) en la transacción de
+    'conn', descartando las secuencias que el servidor ya confirmó. La
+    estación se registra la primera vez que sube un lote.
+
+    Si 'epoca' difiere de la que el servidor tiene registrada, el buffer
+    local fue recreado y la secuencia del servidor se reinicia. Una
+    estación registrada sin época adopta la del lote.
+
+    Returns:
+        Última secuencia confirmada para la estación.
+
+    Raises:
+        BufferInconsistente: si, con la misma época, el lote termina
+        antes de la última secuencia confirmada.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO secuencias_estacion (estacion, ultima_secuencia, epoca) VALUES (%s, 0, %s) "
+            "ON CONFLICT (estacion) DO NOTHING",
+            (estacion, epoca),
+        )
+        # El bloqueo de la fila serializa las subidas de una misma estación
+        cursor.execute(
+            "SELECT ultima_secuencia, epoca FROM secuencias_estacion WHERE estacion = %s FOR UPDATE",
+            (estacion,),
+        )
+        ultima, epoca_servidor = cursor.fetchone()
+        if epoca is not None and epoca != epoca_servidor:
+            if epoca_servidor is not None:
+                logger.warning("El buffer local de '%s' cambió de época (%s -> %s); "
+                               "se reinicia su secuencia, que estaba en %d",
+                               estacion, epoca_servidor, epoca, ultima)
+                ultima = 0
+            cursor.execute(
+                "UPDATE secuencias_estacion SET ultima_secuencia = %s, epoca = %s WHERE estacion = %s",
+                (ultima, epoca, estacion),
+            )
+        if lote[-1][0] < ultima:
+            # Un reenvío legítimo siempre incluye la última secuencia
+            # confirmada; si el lote termina antes, el buffer se reinició
+            # sin que la época lo refleje y confirmarlo perdería las filas
+            logger.error("El buffer local de '%s' termina en la secuencia %d, anterior a la "
+                         "confirmada por el servidor (%d); se conservan las filas",
+                         estacion, lote[-1][0], ultima)
+            raise BufferInconsistente(
+                f"secuencia local {lote[-1][0]} anterior a la confirmada {ultima} para '{estacion}'")
+        nuevas = [fila[1:] for fila in lote if fila[0] > ultima]
+        if not nuevas:
+            return ultima
+        estacion_id = registrar_estaciones(cursor, [estacion])[estacion]
+        escribir_lote(conn, nuevas, estacion_id)
+        ultima = lote[-1][0]
+        cursor.execute(
+            "UPDATE secuencias_estacion SET ultima_secuencia = %s WHERE estacion = %s",
+            (ultima, estacion),
+        )
+        return ultima
+
+
+class CargadorBuffer:
+    """
+    Hilo de fondo que vacía un BufferLocal hacia el servidor en lotes de
+    hasta 'tamano_lote' filas. Ante un error espera con retroceso
+    exponencial entre 'espera_minima' y 'espera_maxima' segundos.
+
+    Cada función de 'al_subir' se llama con las filas subidas (en el
+    orden de COLUMNAS_INSERCION, como 'al_vaciar' de EscritorMediciones)
+    después de confirmar un lote.
+    """
+
+    def __init__(self, buffer, tamano_lote=5000, intervalo=5.0, espera_minima=1.0,
+                 espera_maxima=300.0, pool=None, al_subir=None):
+        self.buffer = buffer
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.espera_minima = espera_minima
+        self.espera_maxima = espera_maxima
+        self.al_subir = list(al_subir or [])
+        self.filas_subidas = 0
+        self._pool = pool
+        self._detenido = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name="cargador-buffer", daemon=True)
+        self._hilo.start()
+
+    def _subir_pendientes(self):
+        pool = self._pool or obtener_pool()
+        while not self._detenido.is_set():
+            lote = self.buffer.leer_lote(self.tamano_lote)
+            if not lote:
+                return
+            with pool.conexion() as conn:
+                ultima = subir_lote(conn, self.buffer.estacion, lote, self.buffer.epoca)
+            # Si se corta aquí, el lote se reenvía y el servidor lo descarta
+            self.buffer.confirmar(ultima)
+            self.filas_subidas += len(lote)
+            MEDICIONES_INGRESADAS_TOTAL.incrementar(len(lote), origen="buffer")
+            filas = [fila[1:] for fila in lote]
+            for funcion in self.al_subir:
+                try:
+                    funcion(filas)
+                except Exception as e:
+                    logger.exception("Error en el callback al_subir: %s", e)
+
+    def _ejecutar(self):
+        espera = self.espera_minima
+        while not self._detenido.is_set():
+            try:
+                self._subir_pendientes()
+                espera = self.espera_minima
+                # Esperar al intervalo para acumular lotes grandes
+                self._detenido.wait(self.intervalo)
+            except (psycopg2.Error, sqlite3.Error) as e:
+                logger.warning("Error al subir el buffer local, reintento en %.1f s: %s", espera, e)
+                self._detenido.wait(espera)
+                espera = min(espera * 2, self.espera_maxima)
+            except Exception as e:
+                # Nada debe terminar el hilo: las filas siguen en el buffer
+                logger.exception("Error inesperado al subir el buffer local, reintento en %.1f s: %s",
+                                 espera, e)
+                self._detenido.wait(espera)
+                espera = min(espera * 2, self.espera_maxima)
+
+    def cerrar(self, timeout=None):
+        """
+        Detiene el hilo de fondo. Las filas no subidas quedan en el
+        buffer local para la próxima ejecución.
+        """
+        self._detenido.set()
+        self._hilo.join(timeout)
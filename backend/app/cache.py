@@ -0,0 +1,93 @@
+"""
+Caché en memoria del proceso para respuestas ya serializadas.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+
+from .metricas import medidor
+
+
+class CacheRespuestas:
+    """
+    Caché LRU con vencimiento: guarda como máximo 'capacidad' entradas y
+    cada una vence 'ttl' segundos después de guardarse. Es segura para
+    hilos y cuenta aciertos y fallos.
+    """
+
+    def __init__(self, capacidad=256, ttl=30.0):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        """
+        Devuelve el valor guardado para 'clave' o None si no está o venció.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None or entrada[0] < time.monotonic():
+                if entrada is not None:
+                    del self._entradas[clave]
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1]
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self, *_):
+        """
+        Vacía la caché. Acepta argumentos para poder usarse como callback
+        'al_vaciar' de EscritorMediciones.
+        """
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': len(self._entradas),
+                'capacidad': self.capacidad,
+                'ttl': self.ttl,
+            }
+
+
+def exponer_metricas(cache, prefijo, descripcion):
+    """
+    Publica en /metrics los aciertos, fallos y entradas de 'cache' con
+    nombres que empiezan por 'prefijo'.
+    """
+    medidor(f"{prefijo}_aciertos_total", f"Aciertos de la caché de {descripcion}",
+            lambda: cache.aciertos, tipo="counter")
+    medidor(f"{prefijo}_fallos_total", f"Fallos de la caché de {descripcion}",
+            lambda: cache.fallos, tipo="counter")
+    medidor(f"{prefijo}_entradas", f"Respuestas guardadas en la caché de {descripcion}",
+            lambda: cache.estadisticas()['entradas'])
+
+
+def calcular_validadores(version, modificada, argumentos):
+    """
+    Calcula el ETag y la fecha Last-Modified de una consulta a partir de
+    la versión de la tabla y el momento de su último cambio (ver
+    obtener_version) y de sus parámetros.
+    """
+    etag = hashlib.sha1(repr((version, sorted(argumentos))).encode()).hexdigest()
+    ultima_modificacion = (
+        modificada.astimezone(timezone.utc).replace(microsecond=0)
+        if modificada else None
+    )
+    return etag, ultima_modificacion
@@ -0,0 +1,390 @@
+"""
+Calibración de los sensores que entregan valores crudos: la tensión de
+salida del MQ131 (ozono) y del GUVA-S12SD (radiación UV), en mV.
+
+MQ131: la resistencia del sensor se obtiene del divisor con la
+resistencia de carga, Rs = RL * (Vc - Vout) / Vout, y se compensa por
+temperatura y humedad con un factor lineal respecto de las condiciones
+de referencia de la hoja de datos (20 °C, 65 % HR). La concentración
+sale de la curva log-log ppb = a * (Rs / R0) ^ b.
+
+GUVA-S12SD: la intensidad es proporcional a la tensión, descontada la
+tensión en oscuridad: mW/cm² = (Vout - offset) / sensibilidad.
+
+Los coeficientes son por estación y sensor y se guardan en la tabla
+'calibraciones'; cada proceso los guarda en caché durante
+TTL_COEFICIENTES segundos, de modo que los cambios hechos desde otro
+proceso se aplican sin reiniciarlo. Las
+funciones de conversión usan solo operaciones aritméticas, por lo que
+sirven tanto para una lectura (floats) como para arreglos de NumPy.
+
+Los valores crudos se guardan junto a los calibrados (columnas ozono_mv
+y uv_mv, ver app.esquema), de modo que al cambiar los coeficientes el
+histórico (incluido el archivo columnar de app.archivo) se vuelve a
+derivar en bloque con recalibrar():
+
+    python -m app.calibracion crear
+    python -m app.calibracion recalibrar [estacion] [desde] [hasta]
+
+Las estaciones solo usan las conversiones escalares; NumPy, psycopg2 y
+los módulos de la base de datos se importan dentro de las funciones que
+los necesitan, para que app.sensores no los cargue.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from .registro import configurar_registro
+
+logger = logging.getLogger(__name__)
+
+# Coeficientes de fábrica, hasta que se calibre cada equipo
+COEFICIENTES_POR_DEFECTO = {
+    "ozono": {
+        "r0_kohm": 235.0,            # Rs en aire limpio, en condiciones de referencia
+        "rl_kohm": 1000.0,           # Resistencia de carga del módulo
+        "vc_mv": 5000.0,             # Tensión de alimentación del divisor
+        "a": 9.4783,                 # Curva de baja concentración: ppb = a * (Rs/R0)^b
+        "b": 2.3348,
+        "temperatura_ref": 20.0,
+        "humedad_ref": 65.0,
+        "k_temperatura": -0.0097,    # Variación relativa de Rs por °C
+        "k_humedad": -0.0029,        # Variación relativa de Rs por % de humedad
+    },
+    "uv": {
+        "offset_mv": 0.0,            # Tensión en oscuridad
+        "mv_por_mw_cm2": 1000.0,     # Sensibilidad: 0,1 V por unidad de índice UV
+    },
+}
+
+# Días de mediciones que se procesan por bloque al recalibrar
+DIAS_POR_BLOQUE = 30
+
+# Segundos que los coeficientes leídos de la base de datos quedan en caché
+TTL_COEFICIENTES = float(os.environ.get("CALIBRACION_TTL_SEGUNDOS", 300))
+
+# estacion_id -> (vencimiento monotónico, coeficientes)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def ozono_ppb(mv, temperatura, humedad, coeficientes):
+    """
+    Concentración de ozono (ppb) a partir de la tensión de salida del
+    MQ131 (mV), la temperatura (°C) y la humedad relativa (%).
+    """
+    c = coeficientes
+    rs = c["rl_kohm"] * (c["vc_mv"] - mv) / mv
+    compensacion = (1 + c["k_temperatura"] * (temperatura - c["temperatura_ref"])
+                    + c["k_humedad"] * (humedad - c["humedad_ref"]))
+    return c["a"] * (rs / (c["r0_kohm"] * compensacion)) ** c["b"]
+
+
+def mv_desde_ozono(ppb, coeficientes):
+    """
+    Tensión de salida del MQ131 para una concentración en condiciones de
+    referencia (inversa de ozono_ppb, para la simulación).
+    """
+    c = coeficientes
+    rs = c["r0_kohm"] * (ppb / c["a"]) ** (1 / c["b"])
+    return c["vc_mv"] * c["rl_kohm"] / (c["rl_kohm"] + rs)
+
+
+def intensidad_uv(mv, coeficientes):
+    """
+    Intensidad UV (mW/cm²) a partir de la tensión de salida del
+    GUVA-S12SD (mV).
+    """
+    return (mv - coeficientes["offset_mv"]) / coeficientes["mv_por_mw_cm2"]
+
+
+def mv_desde_uv(intensidad, coeficientes):
+    """
+    Tensión de salida del GUVA-S12SD para una intensidad (inversa de
+    intensidad_uv, para la simulación).
+    """
+    return intensidad * coeficientes["mv_por_mw_cm2"] + coeficientes["offset_mv"]
+
+
+def calibrar_lecturas(lecturas, coeficientes):
+    """
+    Agrega a las lecturas de la estación (nombre del sensor -> lectura)
+    los valores calibrados de los sensores con valores crudos. Las
+    lecturas no se modifican: se devuelve un diccionario nuevo.
+    """
+    lecturas = dict(lecturas)
+    c = coeficientes["ozono"]
+    clima = lecturas.get("clima", {})
+    temperatura = clima.get("temperatura", c["temperatura_ref"])
+    humedad = clima.get("humedad_relativa", c["humedad_ref"])
+
+    ozono = lecturas.get("ozono", {})
+    mv = ozono.get("ozono_mv")
+    if mv is not None and 0 < mv < c["vc_mv"]:
+        ppb = ozono_ppb(mv, temperatura, humedad, c)
+        lecturas["ozono"] = {**ozono, "ozono_ppb": round(ppb, 2)}
+
+    uv = lecturas.get("uv", {})
+    mv = uv.get("uv_mv")
+    if mv is not None:
+        intensidad = max(intensidad_uv(mv, coeficientes["uv"]), 0.0)
+        lecturas["uv"] = {**uv, "intensidad_uv": round(intensidad, 3)}
+    return lecturas
+
+
+def calibrar_arreglos(ozono_mv, uv_mv, temperatura, humedad, coeficientes):
+    """
+    Versión vectorizada de calibrar_lecturas sobre arreglos de NumPy (NaN
+    = sin dato). La humedad y temperatura faltantes se toman como las de
+    referencia.
+
+    Returns:
+        (ozono_ppb, intensidad_uv) como arreglos float32, con NaN donde
+        no hay valor crudo válido.
+    """
+    import numpy as np
+
+    c = coeficientes["ozono"]
+    ozono_mv = np.asarray(ozono_mv, dtype=np.float64)
+    temperatura = np.where(np.isnan(temperatura), c["temperatura_ref"], temperatura)
+    humedad = np.where(np.isnan(humedad), c["humedad_ref"], humedad)
+    validos = (ozono_mv > 0) & (ozono_mv < c["vc_mv"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ppb = ozono_ppb(np.where(validos, ozono_mv, np.nan), temperatura, humedad, c)
+    intensidad = np.maximum(intensidad_uv(np.asarray(uv_mv, dtype=np.float64), coeficientes["uv"]), 0.0)
+    return ppb.astype(np.float32), intensidad.astype(np.float32)
+
+
+def crear_tabla_calibraciones():
+    """
+    Crea la tabla con los coeficientes de cada estación y sensor.
+    """
+    from .db import conexion
+
+    with conexion() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS calibraciones (
+                estacion_id INTEGER NOT NULL,            -- Estación del equipo
+                sensor TEXT NOT NULL,                    -- 'ozono' o 'uv'
+                coeficientes JSONB NOT NULL,             -- Ver COEFICIENTES_POR_DEFECTO
+                actualizada TIMESTAMP NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (estacion_id, sensor)
+            );
+        """)
+
+
+def obtener_coeficientes(estacion_id):
+    """
+    Coeficientes de la estación ({sensor: {coeficiente: valor}}): los de
+    la tabla 'calibraciones' sobre los de fábrica. Se leen de la base de
+    datos y se sirven de la caché durante TTL_COEFICIENTES segundos.
+    """
+    with _cache_lock:
+        en_cache = _cache.get(estacion_id)
+    if en_cache is not None and en_cache[0] > time.monotonic():
+        return en_cache[1]
+    import psycopg2
+    from .db import conexion
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT sensor, coeficientes FROM calibraciones WHERE estacion_id = %s",
+                           (estacion_id,))
+            guardados = dict(cursor.fetchall())
+    except psycopg2.Error as e:
+        logger.error("Error al leer los coeficientes de calibración: %s", e)
+        raise
+    coeficientes = {sensor: {**valores, **guardados.get(sensor, {})}
+                    for sensor, valores in COEFICIENTES_POR_DEFECTO.items()}
+    with _cache_lock:
+        _cache[estacion_id] = (time.monotonic() + TTL_COEFICIENTES, coeficientes)
+    return coeficientes
+
+
+def invalidar_coeficientes(estacion_id=None):
+    """
+    Descarta de la caché los coeficientes de una estación (o de todas).
+    """
+    with _cache_lock:
+        if estacion_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(estacion_id, None)
+
+
+def guardar_coeficientes(estacion_id, sensor, coeficientes):
+    """
+    Guarda los coeficientes de un sensor de la estación (se combinan con
+    los de fábrica al leerlos). Para aplicarlos al histórico, llamar
+    después a recalibrar().
+    """
+    if sensor not in COEFICIENTES_POR_DEFECTO:
+        raise ValueError(f"Sensor sin calibración: {sensor}")
+    desconocidos = set(coeficientes) - set(COEFICIENTES_POR_DEFECTO[sensor])
+    if desconocidos:
+        raise ValueError(f"Coeficientes no válidos para '{sensor}': {', '.join(sorted(desconocidos))}")
+    import psycopg2
+    from .db import conexion
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO calibraciones (estacion_id, sensor, coeficientes) VALUES (%s, %s, %s)
+                ON CONFLICT (estacion_id, sensor) DO UPDATE
+                SET coeficientes = EXCLUDED.coeficientes, actualizada = NOW()
+            """, (estacion_id, sensor, json.dumps(coeficientes)))
+    except psycopg2.Error as e:
+        logger.error("Error al guardar los coeficientes de calibración: %s", e)
+        raise
+    invalidar_coeficientes(estacion_id)
+
+
+def _leer_crudos(cursor, estacion_id, desde, hasta):
+    """
+    Lee como arreglos las filas de la estación en [desde, hasta) que
+    tienen algún valor crudo. Los NULL se leen como NaN.
+    """
+    import numpy as np
+    from .ingesta import leer_arreglos
+
+    consulta = """
+        SELECT id::bigint, fecha_hora,
+               coalesce(ozono_mv, 'NaN'), coalesce(uv_mv, 'NaN'),
+               coalesce(temperatura, 'NaN'), coalesce(humedad_relativa, 'NaN')
+        FROM mediciones
+        WHERE estacion_id = %s AND fecha_hora >= %s AND fecha_hora < %s
+          AND (ozono_mv IS NOT NULL OR uv_mv IS NOT NULL)
+    """
+    return leer_arreglos(cursor.connection, consulta, [
+        ("id", np.int64),
+        ("fecha_hora", "datetime64[us]"),
+        ("ozono_mv", np.float32),
+        ("uv_mv", np.float32),
+        ("temperatura", np.float32),
+        ("humedad_relativa", np.float32),
+    ], (estacion_id, desde, hasta))
+
+
+def _recalibrar_rango(cursor, estacion_id, coeficientes, desde, hasta):
+    """
+    Vuelve a derivar ozono_ppb e intensidad_uv de las filas de la
+    estación en [desde, hasta): se calculan con NumPy, se copian en
+    binario a una tabla temporal y se aplican con un único UPDATE.
+
+    Returns:
+        Cantidad de mediciones recalibradas.
+    """
+    import numpy as np
+    from .ingesta import copiar_arreglos
+
+    crudos = _leer_crudos(cursor, estacion_id, desde, hasta)
+    if not len(crudos):
+        return 0
+    ppb, intensidad = calibrar_arreglos(crudos["ozono_mv"], crudos["uv_mv"],
+                                        crudos["temperatura"], crudos["humedad_relativa"], coeficientes)
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS calibraciones_staging (
+            id INTEGER, fecha_hora TIMESTAMP, ozono_ppb REAL, intensidad_uv REAL
+        ) ON COMMIT DELETE ROWS
+    """)
+    copiar_arreglos(cursor.connection, "calibraciones_staging", {
+        "id": crudos["id"].astype(np.int32),
+        "fecha_hora": crudos["fecha_hora"],
+        "ozono_ppb": ppb,
+        "intensidad_uv": intensidad,
+    })
+    # NaN (sin valor crudo válido) conserva el valor guardado. La
+    # condición sobre fecha_hora limita el UPDATE a las particiones del rango
+    cursor.execute("""
+        UPDATE mediciones m SET
+            ozono_ppb = CASE WHEN s.ozono_ppb = 'NaN' THEN m.ozono_ppb ELSE s.ozono_ppb END,
+            intensidad_uv = CASE WHEN s.intensidad_uv = 'NaN' THEN m.intensidad_uv
+                                 ELSE s.intensidad_uv END
+        FROM calibraciones_staging s
+        WHERE m.id = s.id AND m.fecha_hora = s.fecha_hora
+          AND m.fecha_hora >= %s AND m.fecha_hora < %s
+    """, (desde, hasta))
+    cursor.execute("TRUNCATE calibraciones_staging")
+    return len(crudos)
+
+
+def recalibrar(estacion_id=None, desde=None, hasta=None, dias_por_bloque=DIAS_POR_BLOQUE):
+    """
+    Vuelve a derivar los valores calibrados del histórico con los
+    coeficientes actuales, por estación y en bloques de 'dias_por_bloque'
+    días, cada uno en su propia transacción. Sin 'estacion_id' recorre
+    todas las estaciones con valores crudos.
+
+    El UPDATE de cada bloque incrementa el contador de cambios de
+    'mediciones' (ver app.models.obtener_version) y registra sus minutos
+    como pendientes para los agregados, que se refrescan al terminar,
+    igual que los índices derivados (app.indices) del rango. Las filas
+    del archivo columnar se recalibran en el lugar.
+
+    Returns:
+        Cantidad de mediciones recalibradas (en la base de datos y en el
+        archivo).
+    """
+    import psycopg2
+    from .agregados import refrescar_agregados, refrescar_percentiles
+    from .archivo import estaciones_archivo, recalibrar_archivo
+    from .db import conexion
+    from .indices import recalcular_indices
+
+    recalibradas = 0
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT min(fecha_hora), max(fecha_hora), array_agg(DISTINCT estacion_id)
+                FROM mediciones
+                WHERE (ozono_mv IS NOT NULL OR uv_mv IS NOT NULL)
+                  AND (%(estacion)s IS NULL OR estacion_id = %(estacion)s)
+                  AND (%(desde)s IS NULL OR fecha_hora >= %(desde)s)
+                  AND (%(hasta)s IS NULL OR fecha_hora < %(hasta)s)
+            """, {"estacion": estacion_id, "desde": desde, "hasta": hasta})
+            primera, ultima, estaciones = cursor.fetchone()
+        if estacion_id is None:
+            archivadas = set(estaciones_archivo())
+        else:
+            archivadas = {estacion_id}
+        for estacion in sorted(archivadas | set(estaciones or [])):
+            invalidar_coeficientes(estacion)
+            coeficientes = obtener_coeficientes(estacion)
+            recalibradas += recalibrar_archivo(estacion, coeficientes, desde, hasta)
+            if primera is None or estacion not in estaciones:
+                continue
+            inicio = desde or primera
+            fin = hasta or ultima + timedelta(microseconds=1)
+            while inicio < fin:
+                siguiente = min(inicio + timedelta(days=dias_por_bloque), fin)
+                with conexion() as conn, conn.cursor() as cursor:
+                    recalibradas += _recalibrar_rango(cursor, estacion, coeficientes, inicio, siguiente)
+                inicio = siguiente
+    except psycopg2.Error as e:
+        logger.error("Error al recalibrar las mediciones: %s", e)
+        raise
+    if primera is not None:
+        recalcular_indices(desde or primera, hasta or ultima + timedelta(microseconds=1))
+        refrescar_agregados()
+        refrescar_percentiles()
+    return recalibradas
+
+
+if __name__ == "__main__":
+    configurar_registro()
+    comando = sys.argv[1] if len(sys.argv) > 1 else "recalibrar"
+    if comando == "crear":
+        crear_tabla_calibraciones()
+        print("[+] Tabla de calibraciones creada")
+    elif comando == "recalibrar":
+        estacion = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2] != "-" else None
+        desde = datetime.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else None
+        hasta = datetime.fromisoformat(sys.argv[4]) if len(sys.argv) > 4 else None
+        print(f"[+] Mediciones recalibradas: {recalibrar(estacion, desde, hasta)}")
+    else:
+        print("Uso: python -m app.calibracion [crear|recalibrar [estacion|-] [desde] [hasta]]")
+        sys.exit(1)
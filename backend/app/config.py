@@ -0,0 +1,62 @@
+"""
+Configuración del servidor de la API, leída de variables de entorno
+para no depender de valores fijos en el código.
+
+    API_DEBUG           Modo debug de Flask ('1', 'true', 'si'); por defecto desactivado.
+    API_CORS_ORIGENES   Orígenes permitidos por CORS, separados por comas.
+    API_HOST            Dirección en la que escucha el servidor.
+    API_PUERTO          Puerto del servidor.
+    API_TRABAJADORES    Procesos del servidor de producción.
+    API_HILOS           Hilos por proceso (gunicorn con trabajadores gthread).
+    LOG_NIVEL           Nivel de los registros (DEBUG, INFO, WARNING, ERROR).
+    LOG_FORMATO         'texto' o 'json' (una línea JSON por registro).
+    PMS5003_PUERTO      Puerto serie del sensor PMS5003 (por ejemplo /dev/ttyUSB0);
+                        sin definir, sus lecturas se simulan.
+    PMS5003_TRAMAS      Tramas del PMS5003 que se promedian en cada lectura.
+"""
+import os
+
+
+def _booleano(valor):
+    return valor.strip().lower() in ("1", "true", "si", "sí", "yes", "on")
+
+
+def _lista(valor):
+    return [elemento.strip() for elemento in valor.split(",") if elemento.strip()]
+
+
+DEBUG = _booleano(os.environ.get("API_DEBUG", "0"))
+
+CORS_ORIGENES = _lista(os.environ.get("API_CORS_ORIGENES", "http://localhost:5173"))
+
+HOST = os.environ.get("API_HOST", "127.0.0.1")
+PUERTO = int(os.environ.get("API_PUERTO", "5000"))
+
+# Regla habitual de gunicorn: dos procesos por núcleo más uno
+TRABAJADORES = int(os.environ.get("API_TRABAJADORES", 2 * (os.cpu_count() or 1) + 1))
+HILOS = int(os.environ.get("API_HILOS", "8"))
+
+# Flujos /mediciones/stream abiertos a la vez por proceso; cada uno ocupa
+# un hilo mientras dure, por lo que se reserva el resto para las demás rutas
+MAXIMO_FLUJOS = int(os.environ.get("API_MAXIMO_FLUJOS", max(1, HILOS // 2)))
+
+# Las mediciones confirmadas con una fecha_hora más antigua (por ejemplo,
+# las de una carga masiva con app.backfill) no se envían en vivo por
+# /mediciones/stream
+ANTIGUEDAD_MAXIMA_VIVO = float(os.environ.get("API_ANTIGUEDAD_MAXIMA_VIVO_SEGUNDOS", "3600"))
+
+# Los ids de 'mediciones' se asignan al insertar pero las filas se ven al
+# confirmar, por lo que una transacción lenta puede confirmar ids menores a
+# los ya difundidos. La difusión en vivo y la reanudación con Last-Event-ID
+# vuelven a revisar esta cantidad de ids por debajo del último enviado
+MARGEN_IDS_VIVO = int(os.environ.get("API_MARGEN_IDS_VIVO", "1000"))
+
+# Puerto de /metrics del simulador, el servicio de ingesta y la carga
+# masiva (la API lo sirve en su propio puerto); sin valor no se expone
+METRICAS_PUERTO = int(os.environ["METRICAS_PUERTO"]) if os.environ.get("METRICAS_PUERTO") else None
+
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO").upper()
+LOG_FORMATO = os.environ.get("LOG_FORMATO", "texto").lower()
+
+PMS5003_PUERTO = os.environ.get("PMS5003_PUERTO") or None
+PMS5003_TRAMAS = int(os.environ.get("PMS5003_TRAMAS", "5"))
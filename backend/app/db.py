@@ -1,8 +1,21 @@
 """
 Maneja la conexión a la base de datos PostgreSQL 
-'mediciones_ambientales'.
+'mediciones_ambientales' (u otra indicada con MEDICIONES_DSN).
 """
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+
+from .metricas import (DB_COMMIT_SEGUNDOS, DB_CONEXION_SEGUNDOS, DB_CONSULTA_SEGUNDOS,
+                       DB_ESPERA_POOL_SEGUNDOS)
+
+logger = logging.getLogger(__name__)
 
 # Configuración de la conexión a la base de datos PostgreSQL
 DB_CONFIG = {
@@ -10,9 +23,28 @@ DB_CONFIG = {
     'port': 5432,                 # Puerto estándar de PostgreSQL
     'database': 'mediciones_ambientales',  # Nombre de la base de datos
     'user': 'postgres',           # Usuario de la base de datos
-    'password': 'postgres'        # Contraseña del usuario
+    'password': 'postgres',       # Contraseña del usuario
+    'connect_timeout': 5          # Segundos máximos para establecer la conexión
 }
 
+# Con MEDICIONES_DSN ("dbname=... host=..." o una URI postgresql://...)
+# se reemplazan los valores anteriores que indique, por ejemplo para
+# usar otra base de datos en pruebas y benchmarks
+if os.environ.get("MEDICIONES_DSN"):
+    DB_CONFIG.update(psycopg2.extensions.parse_dsn(os.environ["MEDICIONES_DSN"]))
+    if 'dbname' in DB_CONFIG:
+        DB_CONFIG['database'] = DB_CONFIG.pop('dbname')
+
+# Configuración del pool de conexiones compartido por el proceso
+POOL_CONFIG = {
+    'minimo': 1,                  # Conexiones abiertas al crear el pool
+    'maximo': 10,                 # Conexiones abiertas como máximo
+    'timeout': 5.0,               # Segundos de espera para obtener una conexión
+    'vida_maxima': 1800.0,        # Segundos antes de reciclar una conexión
+    'verificar_tras': 30.0        # Segundos de inactividad tras los que se verifica con SELECT 1
+}
+
+
 def get_connection():
     """
     Devuelve la conexión a la db con las configuraciones especificadas
@@ -24,5 +56,249 @@ def get_connection():
     try:
         return psycopg2.connect(**DB_CONFIG)
     except psycopg2.Error as e:
-        print(f"Error al conectar a la base de datos: {e}")
+        logger.error("Error al conectar a la base de datos: %s", e)
         raise
+
+
+def _operacion(sentencia):
+    # Primera palabra de la sentencia (select, insert, copy, ...) como etiqueta
+    if isinstance(sentencia, bytes):
+        sentencia = sentencia.decode(errors="replace")
+    elif not isinstance(sentencia, str):
+        # psycopg2.sql.Composed
+        return "compuesta"
+    palabras = sentencia.split(None, 1)
+    return palabras[0].lower() if palabras else "vacia"
+
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """
+    Cursor que registra la duración de cada sentencia en
+    DB_CONSULTA_SEGUNDOS, etiquetada por su tipo.
+    """
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            DB_CONSULTA_SEGUNDOS.observar(time.perf_counter() - inicio, operacion=_operacion(query))
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            DB_CONSULTA_SEGUNDOS.observar(time.perf_counter() - inicio, operacion=_operacion(query))
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            DB_CONSULTA_SEGUNDOS.observar(time.perf_counter() - inicio, operacion="copy")
+
+
+class PoolAgotado(psycopg2.pool.PoolError):
+    """
+    No se pudo obtener una conexión del pool dentro del timeout.
+    """
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones seguro para hilos.
+
+    Mantiene entre 'minimo' y 'maximo' conexiones abiertas. Al prestar
+    una conexión verifica que siga utilizable y recicla las que superan
+    'vida_maxima' segundos.
+    """
+
+    def __init__(self, minimo=1, maximo=10, timeout=5.0, vida_maxima=1800.0,
+                 verificar_tras=30.0, config=None):
+        if not 0 <= minimo <= maximo or maximo < 1:
+            raise ValueError("Se requiere 0 <= minimo <= maximo y maximo >= 1")
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.vida_maxima = vida_maxima
+        self.verificar_tras = verificar_tras
+        self._config = config or DB_CONFIG
+        self._condicion = threading.Condition()
+        # Conexiones libres como (conexión, creada_en, último_uso)
+        self._libres = []
+        # Momento de creación de cada conexión abierta (libre o prestada)
+        self._creadas = {}
+        self._abiertas = 0
+        self._cerrado = False
+        for _ in range(minimo):
+            conn = self._conectar()
+            self._abiertas += 1
+            self._libres.append((conn, self._creadas[conn], time.monotonic()))
+
+    def _conectar(self):
+        with DB_CONEXION_SEGUNDOS.cronometrar():
+            conn = psycopg2.connect(cursor_factory=CursorMedido, **self._config)
+        self._creadas[conn] = time.monotonic()
+        return conn
+
+    def _descartar(self, conn):
+        self._creadas.pop(conn, None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _es_utilizable(self, conn, creada, ultimo_uso):
+        ahora = time.monotonic()
+        if conn.closed or ahora - creada > self.vida_maxima:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if ahora - ultimo_uso > self.verificar_tras:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def obtener(self, timeout=None):
+        """
+        Presta una conexión del pool. Espera hasta 'timeout' segundos
+        si todas están en uso y lanza PoolAgotado si no se libera ninguna.
+        """
+        inicio = time.monotonic()
+        timeout = self.timeout if timeout is None else timeout
+        limite = inicio + timeout
+        with self._condicion:
+            while True:
+                if self._cerrado:
+                    raise psycopg2.pool.PoolError("El pool de conexiones está cerrado")
+                if self._libres:
+                    conn, creada, ultimo_uso = self._libres.pop()
+                    break
+                if self._abiertas < self.maximo:
+                    # Reservar el lugar antes de conectar fuera del lock
+                    self._abiertas += 1
+                    conn = None
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    DB_ESPERA_POOL_SEGUNDOS.observar(time.monotonic() - inicio)
+                    raise PoolAgotado(f"No hay conexiones libres tras {timeout} s")
+                self._condicion.wait(restante)
+        DB_ESPERA_POOL_SEGUNDOS.observar(time.monotonic() - inicio)
+
+        try:
+            if conn is not None and self._es_utilizable(conn, creada, ultimo_uso):
+                return conn
+            if conn is not None:
+                self._descartar(conn)
+            return self._conectar()
+        except psycopg2.Error:
+            with self._condicion:
+                self._abiertas -= 1
+                self._condicion.notify()
+            raise
+
+    def devolver(self, conn, descartar=False):
+        """
+        Devuelve una conexión prestada al pool. Si 'descartar' es True o
+        la conexión quedó inutilizable, se cierra en lugar de reutilizarse.
+        """
+        if not conn.closed and not descartar:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+        with self._condicion:
+            if conn.closed or descartar or self._cerrado:
+                self._descartar(conn)
+                self._abiertas -= 1
+            else:
+                self._libres.append((conn, self._creadas[conn], time.monotonic()))
+            self._condicion.notify()
+
+    @contextmanager
+    def conexion(self, timeout=None):
+        """
+        Context manager que presta una conexión, confirma la transacción
+        al salir sin errores o la revierte si hubo una excepción, y
+        finalmente la devuelve al pool.
+        """
+        conn = self.obtener(timeout)
+        descartar = False
+        try:
+            yield conn
+            with DB_COMMIT_SEGUNDOS.cronometrar():
+                conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                descartar = True
+            raise
+        finally:
+            self.devolver(conn, descartar)
+
+    def cerrar(self):
+        """
+        Cierra las conexiones libres; las prestadas se cierran al devolverse.
+        """
+        with self._condicion:
+            self._cerrado = True
+            for conn, _, _ in self._libres:
+                self._descartar(conn)
+                self._abiertas -= 1
+            self._libres.clear()
+            self._condicion.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """
+    Devuelve el pool de conexiones del proceso, creándolo con POOL_CONFIG
+    la primera vez que se necesita.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                try:
+                    _pool = PoolConexiones(**POOL_CONFIG)
+                except psycopg2.Error as e:
+                    logger.error("Error al conectar a la base de datos: %s", e)
+                    raise
+    return _pool
+
+
+def _reiniciar_pool_en_hijo():
+    # Las conexiones no se pueden compartir entre procesos: el hijo de un
+    # fork crea su propio pool en lugar de usar los sockets del padre.
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reiniciar_pool_en_hijo)
+
+
+def conexion(timeout=None):
+    """
+    Context manager sobre el pool del proceso:
+
+        with conexion() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(...)
+
+    Confirma al salir, revierte si hay una excepción y devuelve la
+    conexión al pool.
+    """
+    return obtener_pool().conexion(timeout)
@@ -0,0 +1,192 @@
+"""
+Difusión en vivo de mediciones nuevas a muchos suscriptores.
+
+Un único hilo por proceso escucha el canal de PostgreSQL
+'mediciones_nuevas' (LISTEN/NOTIFY), que el camino de escritura notifica
+al confirmar filas, y reparte las filas nuevas a todos los suscriptores.
+Si no llega ninguna notificación consulta igual cada 'intervalo_sondeo'
+segundos, para cubrir escritores que no notifican o una conexión de
+escucha caída.
+
+Los ids se asignan al insertar pero las filas se ven al confirmar: una
+transacción lenta puede confirmar ids menores que otros ya difundidos.
+Por eso cada consulta vuelve a leer 'margen_ids' ids por debajo del
+mayor difundido y descarta los que ya se enviaron. Las filas con una fecha_hora de más de
+'antiguedad_maxima' segundos atrás (datos históricos de app.backfill) no
+se difunden.
+
+Los eventos del detector de anomalías (canal 'alertas_nuevas', ver
+app.alertas) se reenvían como eventos "alerta".
+"""
+import json
+import logging
+import queue
+import select
+import threading
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from . import config
+from .db import DB_CONFIG
+from .models import obtener_mediciones_desde_id, obtener_ultimo_id
+
+logger = logging.getLogger(__name__)
+
+# Canal de notificaciones que usa el camino de escritura
+CANAL = "mediciones_nuevas"
+# Canal de los eventos de alerta; el contenido de la notificación es el evento en JSON
+CANAL_ALERTAS = "alertas_nuevas"
+
+
+class Suscripcion:
+    """
+    Cola de eventos (evento, id, datos) de un suscriptor. Si el
+    suscriptor no consume a tiempo y la cola se llena, la suscripción se
+    desactiva en lugar de acumular memoria sin límite.
+    """
+
+    def __init__(self, capacidad):
+        self.cola = queue.Queue(maxsize=capacidad)
+        self.activa = True
+
+    def siguiente(self, timeout=None):
+        """
+        Devuelve el siguiente evento o None si no llegó ninguno en 'timeout'.
+        """
+        try:
+            return self.cola.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class DifusorMediciones:
+    """
+    Reparte las mediciones nuevas (y otros eventos publicados) a todas
+    las suscripciones activas usando una sola conexión de escucha.
+    """
+
+    def __init__(self, intervalo_sondeo=5.0, capacidad_suscripcion=1000, filas_por_consulta=1000,
+                 antiguedad_maxima=config.ANTIGUEDAD_MAXIMA_VIVO, margen_ids=config.MARGEN_IDS_VIVO):
+        self.intervalo_sondeo = intervalo_sondeo
+        self.antiguedad_maxima = timedelta(seconds=antiguedad_maxima)
+        self.capacidad_suscripcion = capacidad_suscripcion
+        self.filas_por_consulta = filas_por_consulta
+        self.margen_ids = margen_ids
+        self.ultimo_id = None
+        # Ids ya vistos entre ultimo_id - margen_ids y ultimo_id
+        self._vistos = set()
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._detenido = threading.Event()
+
+    def suscribir(self):
+        """
+        Crea una suscripción y arranca el hilo de escucha si hace falta.
+        """
+        suscripcion = Suscripcion(self.capacidad_suscripcion)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escuchar, name="difusor-mediciones", daemon=True)
+                self._hilo.start()
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+        suscripcion.activa = False
+
+    def publicar(self, evento, datos, id_evento=None):
+        """
+        Envía un evento a todas las suscripciones activas.
+        """
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            try:
+                suscripcion.cola.put_nowait((evento, id_evento, datos))
+            except queue.Full:
+                # Cliente demasiado lento: se corta y reanuda con Last-Event-ID
+                self.cancelar(suscripcion)
+
+    def detener(self):
+        self._detenido.set()
+
+    def _publicar_nuevas(self, difundir=True):
+        """
+        Difunde las filas confirmadas desde la última consulta, incluidas
+        las de ids menores al último difundido (dentro de 'margen_ids').
+        Con difundir=False solo las marca como vistas.
+        """
+        desde = self.ultimo_id - self.margen_ids
+        while True:
+            filas = obtener_mediciones_desde_id(desde, self.filas_por_consulta, excluir=self._vistos)
+            limite = datetime.now() - self.antiguedad_maxima
+            for fila in filas:
+                self._vistos.add(fila["id"])
+                if difundir and fila["fecha_hora"] >= limite:
+                    self.publicar("medicion", fila, fila["id"])
+            if filas:
+                desde = filas[-1]["id"]
+                self.ultimo_id = max(self.ultimo_id, desde)
+            if len(filas) < self.filas_por_consulta:
+                break
+        piso = self.ultimo_id - self.margen_ids
+        self._vistos = {id_fila for id_fila in self._vistos if id_fila > piso}
+
+    def _conectar_escucha(self):
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CANAL}; LISTEN {CANAL_ALERTAS}")
+            return conn
+        except psycopg2.Error as e:
+            logger.warning("Error al escuchar '%s', se usa solo sondeo: %s", CANAL, e)
+            return None
+
+    def _escuchar(self):
+        conn = None
+        while not self._detenido.is_set():
+            try:
+                if self.ultimo_id is None:
+                    # Solo se difunden las filas posteriores al arranque
+                    self.ultimo_id = obtener_ultimo_id()
+                    self._publicar_nuevas(difundir=False)
+                if conn is None:
+                    conn = self._conectar_escucha()
+                if conn is not None:
+                    if select.select([conn], [], [], self.intervalo_sondeo)[0]:
+                        conn.poll()
+                        for notificacion in conn.notifies:
+                            if notificacion.channel == CANAL_ALERTAS:
+                                self.publicar("alerta", json.loads(notificacion.payload))
+                        conn.notifies.clear()
+                else:
+                    self._detenido.wait(self.intervalo_sondeo)
+                self._publicar_nuevas()
+            except psycopg2.Error as e:
+                logger.error("Error en la difusión de mediciones: %s", e)
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                self._detenido.wait(self.intervalo_sondeo)
+        if conn is not None:
+            conn.close()
+
+
+_difusor = None
+_difusor_lock = threading.Lock()
+
+
+def obtener_difusor():
+    """
+    Devuelve el difusor del proceso, creándolo la primera vez.
+    """
+    global _difusor
+    with _difusor_lock:
+        if _difusor is None:
+            _difusor = DifusorMediciones()
+        return _difusor
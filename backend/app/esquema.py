@@ -0,0 +1,223 @@
+"""
+Registro de las columnas de la tabla 'mediciones'.
+
+Cada métrica se declara una sola vez con su tipo, unidad y el sensor
+(y la clave de su lectura) del que proviene. A partir del registro se
+generan, al importar el módulo, las sentencias de inserción, COPY y
+consulta y el orden fijo de las filas que circulan por la ingesta
+(tuplas, sin diccionarios por fila). Para agregar una métrica basta con
+agregarla a METRICAS y ejecutar:
+
+    python -m app.esquema migrar     # agrega las columnas que falten
+    python -m app.esquema verificar  # compara la tabla con el registro
+
+Los servicios llaman a verificar_esquema() al iniciar, de modo que una
+tabla que no coincide con el registro se detecta antes de la primera
+escritura. psycopg2 y app.db se importan recién al consultar la tabla:
+los sensores y los clientes que solo usan el registro no los cargan.
+"""
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class Columna:
+    """
+    Métrica de la tabla 'mediciones'.
+
+    'sensor' es el nombre del sensor en EstacionMeteorologica.sensores y
+    'clave' la clave de su lectura que contiene el valor. Una métrica
+    'cruda' (la tensión de un sensor) se guarda y se archiva para poder
+    recalibrar, pero no se resume en las tablas de agregados.
+    """
+
+    __slots__ = ("nombre", "tipo", "unidad", "sensor", "clave", "descripcion", "cruda")
+
+    def __init__(self, nombre, tipo, unidad, sensor, clave, descripcion, cruda=False):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.unidad = unidad
+        self.sensor = sensor
+        self.clave = clave
+        self.descripcion = descripcion
+        self.cruda = cruda
+
+    def __repr__(self):
+        return f"Columna({self.nombre!r}, {self.tipo!r}, {self.unidad!r})"
+
+
+# Métricas medidas, en el orden de las filas de ingesta
+METRICAS = (
+    Columna("pm25_ugm3", "REAL", "μg/m³", "pm25", "pm25_ugm3", "Concentración de PM 2.5"),
+    Columna("pm10_ugm3", "REAL", "μg/m³", "pm25", "pm10_ugm3", "Concentración de PM 10"),
+    Columna("ozono_ppb", "REAL", "ppb", "ozono", "ozono_ppb", "Concentración de ozono"),
+    Columna("intensidad_uv", "REAL", "mW/cm²", "uv", "intensidad_uv", "Intensidad de la radiación UV"),
+    Columna("temperatura", "REAL", "°C", "clima", "temperatura", "Temperatura"),
+    Columna("humedad_relativa", "REAL", "%", "clima", "humedad_relativa", "Humedad relativa"),
+    # Valores crudos de los que se derivan ozono_ppb e intensidad_uv (ver app.calibracion)
+    Columna("ozono_mv", "REAL", "mV", "ozono", "ozono_mv", "Tensión de salida del MQ131", cruda=True),
+    Columna("uv_mv", "REAL", "mV", "uv", "uv_mv", "Tensión de salida del GUVA-S12SD", cruda=True),
+)
+
+NOMBRES_METRICAS = tuple(columna.nombre for columna in METRICAS)
+
+# Métricas que se resumen en las tablas de agregados (app.agregados)
+NOMBRES_AGREGABLES = tuple(columna.nombre for columna in METRICAS if not columna.cruda)
+
+# Columnas de cada fila de ingesta: fecha_hora y las métricas
+COLUMNAS_FILA = ("fecha_hora",) + NOMBRES_METRICAS
+
+# Columnas fijas de la tabla, antes de las métricas
+COLUMNAS_CLAVE = (
+    ("id", "INTEGER"),
+    ("estacion_id", "INTEGER"),
+    ("fecha_hora", "TIMESTAMP"),
+)
+
+# Columnas que se pueden proyectar en las consultas
+COLUMNAS_CONSULTA = tuple(nombre for nombre, _ in COLUMNAS_CLAVE) + NOMBRES_METRICAS
+
+# (sensor, clave) de cada métrica, en el orden de la fila
+ORIGENES = tuple((columna.sensor, columna.clave) for columna in METRICAS)
+
+_LISTA_INSERCION = ", ".join(("estacion_id",) + COLUMNAS_FILA)
+
+# Sentencias generadas a partir del registro
+SQL_INSERTAR = (f"INSERT INTO mediciones ({_LISTA_INSERCION}) "
+                f"VALUES ({', '.join(['%s'] * (len(COLUMNAS_FILA) + 1))})")
+SQL_COPY = f"COPY mediciones ({_LISTA_INSERCION}) FROM STDIN"
+SQL_SELECCIONAR = f"SELECT {', '.join(COLUMNAS_CONSULTA)} FROM mediciones"
+
+# Columnas actuales de la tabla (nombre, data_type)
+SQL_COLUMNAS_TABLA = (
+    "SELECT column_name, data_type FROM information_schema.columns "
+    "WHERE table_schema = current_schema() AND table_name = 'mediciones'"
+)
+
+# Nombre de cada tipo SQL del registro en information_schema.columns
+_TIPOS_INFORMATION_SCHEMA = {
+    "SMALLINT": "smallint",
+    "INTEGER": "integer",
+    "BIGINT": "bigint",
+    "REAL": "real",
+    "DOUBLE PRECISION": "double precision",
+    "TIMESTAMP": "timestamp without time zone",
+}
+
+
+class EsquemaInvalido(RuntimeError):
+    """
+    La tabla 'mediciones' no coincide con el registro de columnas.
+    """
+
+
+def fila_desde_lecturas(lecturas):
+    """
+    Arma la tupla de métricas (en el orden de METRICAS) a partir de las
+    lecturas de los sensores (nombre del sensor -> diccionario de la
+    lectura). Las claves ausentes, como las de un sensor con error, quedan
+    en None.
+    """
+    return tuple([lecturas[sensor].get(clave) for sensor, clave in ORIGENES])
+
+
+def fila_desde_valores(valores):
+    """
+    Tupla de métricas a partir de un diccionario nombre -> valor; las
+    métricas ausentes quedan en None.
+    """
+    return tuple([valores.get(nombre) for nombre in NOMBRES_METRICAS])
+
+
+def sql_migracion():
+    """
+    ALTER TABLE que agrega a 'mediciones' las métricas del registro que
+    todavía no existen.
+    """
+    return "ALTER TABLE mediciones\n" + ",\n".join(
+        f"    ADD COLUMN IF NOT EXISTS {columna.nombre} {columna.tipo}" for columna in METRICAS
+    )
+
+
+def diferencias(columnas_tabla):
+    """
+    Compara las columnas de la tabla (nombre -> data_type de
+    information_schema) con el registro. Las columnas de la tabla que no
+    están en el registro se ignoran.
+
+    Returns:
+        Lista de descripciones de las diferencias (vacía si coinciden).
+    """
+    esperadas = list(COLUMNAS_CLAVE) + [(columna.nombre, columna.tipo) for columna in METRICAS]
+    problemas = []
+    for nombre, tipo in esperadas:
+        actual = columnas_tabla.get(nombre)
+        if actual is None:
+            problemas.append(f"falta la columna '{nombre}' ({tipo})")
+        elif actual != _TIPOS_INFORMATION_SCHEMA[tipo]:
+            problemas.append(f"la columna '{nombre}' es {actual} y se esperaba {tipo}")
+    return problemas
+
+
+def verificar_columnas(columnas_tabla):
+    """
+    Lanza EsquemaInvalido si las columnas de la tabla (ver diferencias)
+    no coinciden con el registro.
+    """
+    problemas = diferencias(columnas_tabla)
+    if problemas:
+        raise EsquemaInvalido(
+            "La tabla 'mediciones' no coincide con app.esquema: " + "; ".join(problemas)
+            + " (ejecutar python -m app.esquema migrar)"
+        )
+
+
+def verificar_esquema():
+    """
+    Comprueba que la tabla 'mediciones' tenga las columnas del registro
+    con sus tipos. Lanza EsquemaInvalido si no coinciden.
+    """
+    import psycopg2
+    from .db import conexion
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute(SQL_COLUMNAS_TABLA)
+            columnas_tabla = dict(cursor.fetchall())
+    except psycopg2.Error as e:
+        logger.error("Error al verificar el esquema de 'mediciones': %s", e)
+        raise
+    verificar_columnas(columnas_tabla)
+
+
+def migrar_esquema():
+    """
+    Agrega a 'mediciones' las columnas del registro que falten.
+    """
+    import psycopg2
+    from .db import conexion
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute(sql_migracion())
+    except psycopg2.Error as e:
+        logger.error("Error al migrar el esquema de 'mediciones': %s", e)
+        raise
+
+
+if __name__ == "__main__":
+    comando = sys.argv[1] if len(sys.argv) > 1 else "verificar"
+    if comando == "migrar":
+        migrar_esquema()
+        print("[+] Columnas del registro agregadas a 'mediciones'")
+    elif comando == "verificar":
+        try:
+            verificar_esquema()
+        except EsquemaInvalido as e:
+            print(f"[!] {e}")
+            sys.exit(1)
+        print("[+] La tabla 'mediciones' coincide con el registro")
+    else:
+        print("Uso: python -m app.esquema [verificar|migrar]")
+        sys.exit(1)
@@ -0,0 +1,86 @@
+"""
+Registro de estaciones de la red.
+
+Cada estación tiene un código único (el que usa en su buffer local y en
+secuencias_estacion) y un id entero, que es el que se guarda en cada fila
+de 'mediciones'.
+
+psycopg2 y app.db se importan en las funciones que consultan la base de
+datos, de modo que ESTACION_POR_DEFECTO se puede usar sin cargarlos.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Estación de las filas escritas sin indicar una (instalaciones de una
+# sola estación); es la primera que crea database/crear_tabla_mediciones.py
+ESTACION_POR_DEFECTO = 1
+
+
+def registrar_estaciones(cursor, codigos):
+    """
+    Registra las estaciones que todavía no existen, en la transacción de
+    'cursor', y devuelve sus ids.
+
+    Returns:
+        Diccionario código -> id de estación.
+    """
+    codigos = list(codigos)
+    cursor.execute("""
+        INSERT INTO estaciones (codigo)
+        SELECT unnest(%s::text[])
+        ON CONFLICT (codigo) DO NOTHING
+    """, (codigos,))
+    cursor.execute("SELECT codigo, id FROM estaciones WHERE codigo = ANY(%s)", (codigos,))
+    return dict(cursor.fetchall())
+
+
+def registrar_estacion(codigo, nombre=None, latitud=None, longitud=None):
+    """
+    Registra una estación o actualiza los datos indicados si ya existe.
+
+    Returns:
+        Id de la estación.
+    """
+    import psycopg2
+    from .db import conexion
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO estaciones (codigo, nombre, latitud, longitud)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (codigo) DO UPDATE SET
+                    nombre = coalesce(EXCLUDED.nombre, estaciones.nombre),
+                    latitud = coalesce(EXCLUDED.latitud, estaciones.latitud),
+                    longitud = coalesce(EXCLUDED.longitud, estaciones.longitud)
+                RETURNING id
+            """, (codigo, nombre, latitud, longitud))
+            return cursor.fetchone()[0]
+    except psycopg2.Error as e:
+        logger.error("Error al registrar la estación '%s': %s", codigo, e)
+        raise
+
+
+def listar_estaciones():
+    """
+    Obtiene todas las estaciones registradas, ordenadas por id.
+
+    Returns:
+        Diccionario con las columnas y las filas (como diccionarios).
+    """
+    import psycopg2
+    from .db import conexion
+
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM estaciones ORDER BY id")
+            columnas = [descripcion[0] for descripcion in cursor.description]
+            filas = cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error("Error al listar las estaciones: %s", e)
+        raise
+    return {
+        "columnas": columnas,
+        "filas": [dict(zip(columnas, fila)) for fila in filas],
+    }
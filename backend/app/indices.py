@@ -0,0 +1,493 @@
+"""
+Métricas derivadas de 'mediciones': índice UV e índice de calidad del
+aire (AQI de la EPA de EE. UU.) de PM2.5 y ozono.
+
+Los sub-índices se calculan sobre promedios móviles hacia atrás de 24 h
+(PM2.5) y 8 h (ozono) de cada estación, con NumPy sobre ventanas
+completas en lugar de recorrer las filas en Python. Los resultados se guardan por medición en
+'indices_calidad_aire' y se actualizan de forma incremental: como en las
+tablas de agregados (ver app.agregados), unos disparadores registran en
+'indices_pendientes' el rango de tiempo cambiado de cada estación y el
+refresco solo recalcula esos rangos más la ventana de 24 h posterior.
+
+Uso desde la línea de comandos (desde backend/):
+    python -m app.indices crear
+    python -m app.indices refrescar
+    python -m app.indices recalcular [desde] [hasta]
+"""
+import logging
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import psycopg2
+
+from .db import conexion
+from .ingesta import copiar_arreglos, leer_arreglos
+from .models import LIMITE_MAXIMO, LIMITE_POR_DEFECTO
+from .serializacion import FORMATO_POR_DEFECTO, a_columnas
+from .registro import configurar_registro
+
+logger = logging.getLogger(__name__)
+
+# Índice UV por cada mW/cm² de intensidad: aproximación de la tabla del
+# módulo GUVA-S12SD (1 mW/cm² ~ UVI 10), no un valor ponderado eritémico
+FACTOR_UV = 10.0
+
+# Ventanas de los promedios móviles, en milisegundos
+VENTANA_PM25_MS = 24 * 3600 * 1000
+VENTANA_OZONO_MS = 8 * 3600 * 1000
+
+# Puntos de corte de la EPA: (concentración mínima, máxima, índice mínimo, máximo)
+# PM2.5 promedio de 24 h en µg/m³ (revisión de 2024)
+CORTES_PM25 = np.array([
+    (0.0, 9.0, 0, 50),
+    (9.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 125.4, 151, 200),
+    (125.5, 225.4, 201, 300),
+    (225.5, 325.4, 301, 500),
+])
+# Ozono promedio de 8 h en ppb (la EPA no define el AQI de 8 h sobre 200 ppb)
+CORTES_OZONO = np.array([
+    (0, 54, 0, 50),
+    (55, 70, 51, 100),
+    (71, 85, 101, 150),
+    (86, 105, 151, 200),
+    (106, 200, 201, 300),
+])
+
+# Columnas de 'indices_calidad_aire' además de medicion_id y fecha_hora
+COLUMNAS_INDICES = ("indice_uv", "pm25_24h", "ozono_8h", "aqi_pm25", "aqi_ozono", "aqi")
+
+# Días de mediciones que se procesan por bloque al recalcular el histórico
+# o un rango pendiente
+DIAS_POR_BLOQUE = 7
+
+# Clave del advisory lock que serializa los refrescos (ver app.agregados)
+BLOQUEO_REFRESCO = 0x696e6469
+
+# Rango de tiempo cambiado por cada sentencia, por estación
+SQL_DISPARADORES = """
+    CREATE TABLE IF NOT EXISTS indices_pendientes (
+        id BIGSERIAL PRIMARY KEY,
+        estacion_id INTEGER NOT NULL,              -- Estación con filas cambiadas
+        desde TIMESTAMP NOT NULL,                  -- Primera fecha_hora cambiada
+        hasta TIMESTAMP NOT NULL                   -- Última fecha_hora cambiada
+    );
+
+    CREATE OR REPLACE FUNCTION marcar_indices_pendientes() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO indices_pendientes (estacion_id, desde, hasta)
+            SELECT estacion_id, min(fecha_hora), max(fecha_hora) FROM nuevas GROUP BY estacion_id;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            INSERT INTO indices_pendientes (estacion_id, desde, hasta)
+            SELECT estacion_id, min(fecha_hora), max(fecha_hora) FROM viejas GROUP BY estacion_id;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER mediciones_indices_insertar
+        AFTER INSERT ON mediciones REFERENCING NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_indices_pendientes();
+    CREATE OR REPLACE TRIGGER mediciones_indices_actualizar
+        AFTER UPDATE ON mediciones REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_indices_pendientes();
+    CREATE OR REPLACE TRIGGER mediciones_indices_eliminar
+        AFTER DELETE ON mediciones REFERENCING OLD TABLE AS viejas
+        FOR EACH STATEMENT EXECUTE FUNCTION marcar_indices_pendientes();
+
+    -- Tablas creadas con la marca de agua anterior: se registran las
+    -- filas que aún no se habían procesado
+    DO $$
+    BEGIN
+        IF to_regclass('indices_estado') IS NOT NULL THEN
+            INSERT INTO indices_pendientes (estacion_id, desde, hasta)
+            SELECT estacion_id, min(fecha_hora), max(fecha_hora) FROM mediciones
+            WHERE id > (SELECT ultimo_id FROM indices_estado WHERE id = 1)
+            GROUP BY estacion_id;
+            DROP TABLE indices_estado;
+        END IF;
+    END;
+    $$;
+"""
+
+# Separación entre las claves de tiempo de dos grupos en media_movil:
+# mayor que cualquier tiempo en milisegundos más una ventana
+_SEPARACION_GRUPOS = 1 << 43
+
+
+def indice_uv(intensidad):
+    """
+    Convierte la intensidad UV (mW/cm²) en índice UV.
+    """
+    return np.round(np.asarray(intensidad, dtype=np.float64) * FACTOR_UV, 1)
+
+
+def media_movil(tiempos_ms, valores, ventana_ms, grupos=None):
+    """
+    Promedio de cada valor con los anteriores dentro de la ventana
+    (t - ventana, t], ignorando los NaN.
+
+    Se calcula con sumas acumuladas y búsqueda binaria del inicio de cada
+    ventana, por lo que el costo no depende del tamaño de la ventana. Los
+    tiempos deben estar ordenados. Si la ventana no tiene valores, el
+    resultado es NaN.
+
+    Con 'grupos' (por ejemplo, el id de estación de cada fila) las filas
+    deben estar ordenadas por (grupo, tiempo) y cada ventana solo
+    promedia valores de su grupo.
+    """
+    tiempos_ms = np.asarray(tiempos_ms, dtype=np.int64)
+    if grupos is not None:
+        # Desplazar cada grupo para que ninguna ventana alcance al anterior
+        tiempos_ms = tiempos_ms + np.asarray(grupos, dtype=np.int64) * _SEPARACION_GRUPOS
+    valores = np.asarray(valores, dtype=np.float64)
+    validos = ~np.isnan(valores)
+    sumas = np.concatenate(([0.0], np.cumsum(np.where(validos, valores, 0.0))))
+    cantidades = np.concatenate(([0], np.cumsum(validos)))
+    inicios = np.searchsorted(tiempos_ms, tiempos_ms - ventana_ms, side="right")
+    fin = np.arange(1, len(valores) + 1)
+    n = cantidades[fin] - cantidades[inicios]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (sumas[fin] - sumas[inicios]) / n, np.nan)
+
+
+def _sub_indice(concentracion, cortes):
+    """
+    Interpolación lineal de la EPA dentro del tramo de cada concentración,
+    redondeada al entero. Las concentraciones sobre el último tramo toman
+    el índice máximo de la tabla.
+    """
+    c_bajo, c_alto, i_bajo, i_alto = cortes.T
+    c = np.clip(concentracion, 0.0, c_alto[-1])
+    tramo = np.clip(np.searchsorted(c_bajo, c, side="right") - 1, 0, len(cortes) - 1)
+    indice = (i_alto[tramo] - i_bajo[tramo]) / (c_alto[tramo] - c_bajo[tramo]) \
+        * (c - c_bajo[tramo]) + i_bajo[tramo]
+    return np.where(np.isnan(concentracion), np.nan, np.round(indice))
+
+
+def aqi_pm25(concentracion):
+    """
+    Sub-índice AQI de PM2.5 a partir del promedio de 24 h (µg/m³),
+    truncado a un decimal como indica la EPA.
+    """
+    c = np.asarray(concentracion, dtype=np.float64)
+    return _sub_indice(np.floor(c * 10 + 1e-9) / 10, CORTES_PM25)
+
+
+def aqi_ozono(concentracion):
+    """
+    Sub-índice AQI de ozono a partir del promedio de 8 h (ppb), truncado
+    al entero.
+    """
+    c = np.asarray(concentracion, dtype=np.float64)
+    return _sub_indice(np.floor(c + 1e-9), CORTES_OZONO)
+
+
+def calcular_indices(tiempos_ms, pm25, ozono, intensidad_uv, grupos=None):
+    """
+    Calcula todas las métricas derivadas de una serie ordenada por tiempo
+    (o por grupo y tiempo, ver media_movil).
+
+    Returns:
+        Diccionario columna -> arreglo con las claves de COLUMNAS_INDICES.
+        El AQI es el mayor de los sub-índices disponibles.
+    """
+    pm25_24h = media_movil(tiempos_ms, pm25, VENTANA_PM25_MS, grupos)
+    ozono_8h = media_movil(tiempos_ms, ozono, VENTANA_OZONO_MS, grupos)
+    sub_pm25 = aqi_pm25(pm25_24h)
+    sub_ozono = aqi_ozono(ozono_8h)
+    return {
+        "indice_uv": indice_uv(intensidad_uv),
+        "pm25_24h": pm25_24h,
+        "ozono_8h": ozono_8h,
+        "aqi_pm25": sub_pm25,
+        "aqi_ozono": sub_ozono,
+        "aqi": np.fmax(sub_pm25, sub_ozono),
+    }
+
+
+def crear_tablas_indices():
+    """
+    Crea la tabla de índices por medición, la tabla de rangos pendientes
+    y los disparadores que la llenan.
+    """
+    with conexion() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS indices_calidad_aire (
+                medicion_id BIGINT PRIMARY KEY,         -- Id de la fila en 'mediciones'
+                estacion_id INTEGER NOT NULL DEFAULT 1, -- Estación de la medición
+                fecha_hora TIMESTAMP NOT NULL,
+                indice_uv REAL,                         -- Índice UV
+                pm25_24h REAL,                          -- Promedio móvil de 24 h de PM2.5 (µg/m³)
+                ozono_8h REAL,                          -- Promedio móvil de 8 h de ozono (ppb)
+                aqi_pm25 SMALLINT,                      -- Sub-índice AQI de PM2.5
+                aqi_ozono SMALLINT,                     -- Sub-índice AQI de ozono
+                aqi SMALLINT                            -- AQI (mayor sub-índice)
+            );
+            ALTER TABLE indices_calidad_aire
+                ADD COLUMN IF NOT EXISTS estacion_id INTEGER NOT NULL DEFAULT 1;
+            CREATE INDEX IF NOT EXISTS idx_indices_calidad_aire_fecha_hora
+                ON indices_calidad_aire (fecha_hora, medicion_id);
+            CREATE INDEX IF NOT EXISTS idx_indices_calidad_aire_estacion_fecha_hora
+                ON indices_calidad_aire (estacion_id, fecha_hora, medicion_id);
+        """)
+        cursor.execute(SQL_DISPARADORES)
+
+
+def _leer_serie(cursor, desde, hasta, estacion=None):
+    """
+    Lee las mediciones del rango [desde, hasta) como arreglos, ordenadas
+    por estación y tiempo. Los NULL se leen como NaN. Con 'estacion'
+    solo las de esa estación.
+    """
+    parametros = (desde, hasta)
+    filtro = ""
+    if estacion is not None:
+        filtro = "AND estacion_id = %s"
+        parametros += (estacion,)
+    consulta = f"""
+        SELECT id::bigint, estacion_id, fecha_hora,
+               coalesce(pm25_ugm3, 'NaN'), coalesce(ozono_ppb, 'NaN'),
+               coalesce(intensidad_uv, 'NaN')
+        FROM mediciones
+        WHERE fecha_hora >= %s AND fecha_hora < %s {filtro}
+        ORDER BY estacion_id, fecha_hora, id
+    """
+    return leer_arreglos(cursor.connection, consulta, [
+        ("id", np.int64),
+        ("estacion_id", np.int32),
+        ("fecha_hora", "datetime64[us]"),
+        ("pm25_ugm3", np.float32),
+        ("ozono_ppb", np.float32),
+        ("intensidad_uv", np.float32),
+    ], parametros)
+
+
+def _guardar_indices(cursor, serie, indices):
+    """
+    Inserta o actualiza los índices de las filas de 'serie': se copian en
+    binario a una tabla temporal y se combinan con un único INSERT.
+    """
+    reales = ", ".join(f"{c} REAL" for c in COLUMNAS_INDICES)
+    cursor.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS indices_staging (
+            medicion_id BIGINT, estacion_id INTEGER, fecha_hora TIMESTAMP, {reales}
+        ) ON COMMIT DELETE ROWS
+    """)
+    arreglos = {
+        "medicion_id": serie["id"],
+        "estacion_id": serie["estacion_id"],
+        "fecha_hora": serie["fecha_hora"],
+    }
+    for columna in COLUMNAS_INDICES:
+        arreglos[columna] = indices[columna].astype(np.float32)
+    copiar_arreglos(cursor.connection, "indices_staging", arreglos)
+
+    # NaN significa sin dato: se guarda como NULL
+    valores = ", ".join(f"NULLIF({c}, 'NaN')" for c in COLUMNAS_INDICES)
+    actualizaciones = ", ".join(f"{c} = EXCLUDED.{c}" for c in COLUMNAS_INDICES)
+    cursor.execute(f"""
+        INSERT INTO indices_calidad_aire
+            (medicion_id, estacion_id, fecha_hora, {', '.join(COLUMNAS_INDICES)})
+        SELECT medicion_id, estacion_id, fecha_hora, {valores} FROM indices_staging
+        ON CONFLICT (medicion_id) DO UPDATE SET
+            estacion_id = EXCLUDED.estacion_id, fecha_hora = EXCLUDED.fecha_hora, {actualizaciones}
+    """)
+    cursor.execute("TRUNCATE indices_staging")
+
+
+def _procesar_rango(cursor, desde, hasta, estacion=None):
+    """
+    Recalcula los índices de las mediciones de [desde, hasta), leyendo
+    además las 24 h previas como contexto de los promedios móviles. Con
+    'estacion' solo los de esa estación, y se borran los índices de sus
+    mediciones del rango que ya no existen.
+
+    Returns:
+        Cantidad de mediciones con índices escritos.
+    """
+    if estacion is not None:
+        cursor.execute("""
+            DELETE FROM indices_calidad_aire i
+            WHERE i.estacion_id = %s AND i.fecha_hora >= %s AND i.fecha_hora < %s
+              AND NOT EXISTS (SELECT 1 FROM mediciones m
+                              WHERE m.id = i.medicion_id AND m.fecha_hora = i.fecha_hora
+                                AND m.estacion_id = i.estacion_id)
+        """, (estacion, desde, hasta))
+    serie = _leer_serie(cursor, desde - timedelta(milliseconds=VENTANA_PM25_MS), hasta, estacion)
+    tiempos_ms = serie["fecha_hora"].astype("datetime64[ms]").astype(np.int64)
+    indices = calcular_indices(tiempos_ms, serie["pm25_ugm3"], serie["ozono_ppb"],
+                               serie["intensidad_uv"], serie["estacion_id"])
+    # Solo se escriben las filas del rango; las anteriores son contexto
+    en_rango = serie["fecha_hora"] >= np.datetime64(desde, "us")
+    serie = serie[en_rango]
+    indices = {columna: valores[en_rango] for columna, valores in indices.items()}
+    if len(serie):
+        _guardar_indices(cursor, serie, indices)
+    return len(serie)
+
+
+def ventanas_afectadas(pendientes):
+    """
+    Convierte los rangos pendientes [(estacion_id, desde, hasta)] en los
+    rangos [desde, fin) de cada estación cuyos índices cambian: como los
+    promedios móviles miran hacia atrás, una fila cambiada afecta a las
+    de las 24 h siguientes. Los rangos que se solapan se unen.
+
+    Returns:
+        Lista de (estacion_id, desde, fin) ordenada por estación y tiempo.
+    """
+    extension = timedelta(milliseconds=VENTANA_PM25_MS, microseconds=1)
+    ventanas = []
+    for estacion, desde, hasta in sorted(pendientes):
+        fin = hasta + extension
+        if ventanas and ventanas[-1][0] == estacion and desde <= ventanas[-1][2]:
+            ventanas[-1] = (estacion, ventanas[-1][1], max(ventanas[-1][2], fin))
+        else:
+            ventanas.append((estacion, desde, fin))
+    return ventanas
+
+
+def refrescar_indices(dias_por_bloque=DIAS_POR_BLOQUE):
+    """
+    Recalcula los índices de los rangos registrados en
+    'indices_pendientes' por transacciones confirmadas (ver
+    ventanas_afectadas), estación por estación y en bloques de
+    'dias_por_bloque' días, cada uno en su propia transacción.
+
+    Los registros se borran al terminar, en la transacción que mantiene
+    el advisory lock del refresco; si un bloque falla, quedan para el
+    próximo refresco.
+
+    Returns:
+        Cantidad de mediciones con índices escritos.
+    """
+    escritas = 0
+    try:
+        with conexion() as bloqueo, bloqueo.cursor() as cursor_bloqueo:
+            cursor_bloqueo.execute("SELECT pg_advisory_xact_lock(%s)", (BLOQUEO_REFRESCO,))
+            cursor_bloqueo.execute("SELECT id, estacion_id, desde, hasta FROM indices_pendientes")
+            pendientes = cursor_bloqueo.fetchall()
+            if not pendientes:
+                return 0
+            for estacion, inicio, fin in ventanas_afectadas([fila[1:] for fila in pendientes]):
+                while inicio < fin:
+                    siguiente = min(inicio + timedelta(days=dias_por_bloque), fin)
+                    with conexion() as conn, conn.cursor() as cursor:
+                        escritas += _procesar_rango(cursor, inicio, siguiente, estacion)
+                    inicio = siguiente
+            cursor_bloqueo.execute("DELETE FROM indices_pendientes WHERE id = ANY(%s)",
+                                   ([fila[0] for fila in pendientes],))
+    except psycopg2.Error as e:
+        logger.error("Error al refrescar los índices: %s", e)
+        raise
+    return escritas
+
+
+def recalcular_indices(desde=None, hasta=None, dias_por_bloque=DIAS_POR_BLOQUE):
+    """
+    Recalcula los índices del histórico en bloques de 'dias_por_bloque'
+    días, cada uno en su propia transacción. Sin rango, recorre toda la
+    tabla y descarta los rangos pendientes registrados antes de empezar.
+
+    Returns:
+        Cantidad de mediciones con índices escritos.
+    """
+    escritas = 0
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM indices_pendientes")
+            pendientes = [fila[0] for fila in cursor.fetchall()]
+            cursor.execute("SELECT min(fecha_hora), max(fecha_hora) FROM mediciones")
+            primera, ultima = cursor.fetchone()
+        if primera is None:
+            return 0
+        inicio = desde or primera
+        fin = hasta or ultima + timedelta(microseconds=1)
+        while inicio < fin:
+            siguiente = min(inicio + timedelta(days=dias_por_bloque), fin)
+            with conexion() as conn, conn.cursor() as cursor:
+                escritas += _procesar_rango(cursor, inicio, siguiente)
+            inicio = siguiente
+        if desde is None and hasta is None:
+            with conexion() as conn, conn.cursor() as cursor:
+                cursor.execute("DELETE FROM indices_pendientes WHERE id = ANY(%s)", (pendientes,))
+    except psycopg2.Error as e:
+        logger.error("Error al recalcular los índices: %s", e)
+        raise
+    return escritas
+
+
+def construir_consulta_indices(desde=None, hasta=None, limite=LIMITE_POR_DEFECTO, estacion=None):
+    """
+    Construye la consulta SQL (y sus parámetros) de los índices de las
+    primeras 'limite' mediciones del rango [desde, hasta), ordenados por
+    tiempo. Con 'estacion' solo los de esa estación.
+    """
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ValueError(f"El límite debe estar entre 1 y {LIMITE_MAXIMO}")
+    columnas = ["medicion_id", "estacion_id", "fecha_hora"] + list(COLUMNAS_INDICES)
+    condiciones = []
+    parametros = []
+    if estacion is not None:
+        condiciones.append("estacion_id = %s")
+        parametros.append(estacion)
+    if desde is not None:
+        condiciones.append("fecha_hora >= %s")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("fecha_hora < %s")
+        parametros.append(hasta)
+    consulta = f"SELECT {', '.join(columnas)} FROM indices_calidad_aire"
+    if condiciones:
+        consulta += " WHERE " + " AND ".join(condiciones)
+    consulta += " ORDER BY fecha_hora, medicion_id LIMIT %s"
+    parametros.append(limite)
+    return consulta, parametros
+
+
+def obtener_indices(desde=None, hasta=None, limite=LIMITE_POR_DEFECTO, estacion=None,
+                    formato=FORMATO_POR_DEFECTO):
+    """
+    Obtiene los índices de las mediciones (ver construir_consulta_indices).
+
+    Returns:
+        Diccionario con las columnas y las filas (como diccionarios, o
+        agrupadas por columna con formato='columnas').
+    """
+    consulta, parametros = construir_consulta_indices(desde, hasta, limite, estacion)
+    try:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute(consulta, parametros)
+            columnas = [descripcion[0] for descripcion in cursor.description]
+            filas = cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error("Error al obtener los índices: %s", e)
+        raise
+    return {
+        "columnas": columnas,
+        "filas": (a_columnas(columnas, filas) if formato == "columnas"
+                  else [dict(zip(columnas, fila)) for fila in filas]),
+    }
+
+
+if __name__ == "__main__":
+    configurar_registro()
+    comando = sys.argv[1] if len(sys.argv) > 1 else "refrescar"
+    if comando == "crear":
+        crear_tablas_indices()
+        print("[+] Tablas de índices creadas")
+    elif comando == "refrescar":
+        print(f"[+] Mediciones con índices actualizados: {refrescar_indices()}")
+    elif comando == "recalcular":
+        desde = datetime.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+        hasta = datetime.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else None
+        print(f"[+] Mediciones con índices recalculados: {recalcular_indices(desde, hasta)}")
+    else:
+        print("Uso: python -m app.indices [crear|refrescar|recalcular [desde] [hasta]]")
+        sys.exit(1)
@@ -0,0 +1,320 @@
+"""
+Escritura por lotes de mediciones en la tabla 'mediciones'.
+
+Las lecturas se acumulan en memoria y un hilo de fondo las vuelca con
+COPY FROM STDIN cuando el lote alcanza un tamaño o una antigüedad
+máxima, en lugar de hacer un INSERT y un commit por muestra.
+"""
+import atexit
+import io
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+
+from .db import PoolAgotado, obtener_pool
+from .esquema import COLUMNAS_FILA, NOMBRES_METRICAS, SQL_COPY
+from .estaciones import ESTACION_POR_DEFECTO
+from .metricas import MEDICIONES_FALLIDAS_TOTAL, MEDICIONES_INGRESADAS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Columnas que escribe el escritor, en el orden de cada fila (ver app.esquema)
+COLUMNAS_INSERCION = COLUMNAS_FILA
+
+# Notifica a los oyentes (ver app.difusion) al confirmar la transacción
+SQL_NOTIFICAR = "NOTIFY mediciones_nuevas"
+
+# Cabecera y final del formato binario de COPY
+_CABECERA_COPY_BINARIO = b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8
+_FINAL_COPY_BINARIO = b"\xff\xff"
+# 2000-01-01 (época de PostgreSQL) en microsegundos desde 1970-01-01
+_EPOCA_POSTGRES_US = 946684800 * 10**6
+
+
+def _valor_copy(valor):
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return str(valor)
+
+
+def escribir_lote(conn, filas, estacion_id=ESTACION_POR_DEFECTO):
+    """
+    Escribe las filas de la estación 'estacion_id' con un único COPY en la
+    transacción actual de 'conn'. Cada fila sigue el orden de
+    COLUMNAS_INSERCION.
+    """
+    prefijo = f"{estacion_id}\t"
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write(prefijo)
+        buffer.write("\t".join(map(_valor_copy, fila)))
+        buffer.write("\n")
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(SQL_COPY, buffer)
+        cursor.execute(SQL_NOTIFICAR)
+
+
+# Errores que se reintentan (conexión caída o pool agotado); los demás,
+# como un DataError, se repetirían igual en cada intento
+ERRORES_TRANSITORIOS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolAgotado)
+
+
+# Tipo binario de PostgreSQL para cada tipo de arreglo de NumPy (por
+# nombre, para no importar NumPy hasta el primer COPY binario)
+_TIPOS_BINARIOS = {
+    "int16": ">i2",      # SMALLINT
+    "int32": ">i4",      # INTEGER
+    "int64": ">i8",      # BIGINT
+    "float32": ">f4",    # REAL
+    "float64": ">f8",    # DOUBLE PRECISION
+}
+
+
+def copiar_arreglos(conn, tabla, columnas):
+    """
+    Escribe filas en 'tabla' con COPY en formato binario, armado con
+    NumPy sin recorrer las filas en Python.
+
+    'columnas' es un diccionario nombre -> arreglo de n elementos; los
+    datetime64 se escriben como TIMESTAMP y los enteros y reales con su
+    ancho. Los NaN se guardan como NaN, no como NULL.
+    """
+    import numpy as np
+
+    campos = [("campos", ">i2")]
+    datos = {}
+    for i, (nombre, arreglo) in enumerate(columnas.items()):
+        arreglo = np.asarray(arreglo)
+        if np.issubdtype(arreglo.dtype, np.datetime64):
+            tipo = ">i8"
+            arreglo = arreglo.astype("datetime64[us]").astype(np.int64) - _EPOCA_POSTGRES_US
+        elif arreglo.dtype.name in _TIPOS_BINARIOS:
+            tipo = _TIPOS_BINARIOS[arreglo.dtype.name]
+        else:
+            raise TypeError(f"Tipo no soportado para '{nombre}': {arreglo.dtype}")
+        campos += [(f"largo_{i}", ">i4"), (f"valor_{i}", tipo)]
+        datos[i] = arreglo
+
+    n = len(datos[0]) if datos else 0
+    registros = np.empty(n, dtype=campos)
+    registros["campos"] = len(datos)
+    for i, arreglo in datos.items():
+        registros[f"largo_{i}"] = registros.dtype[f"valor_{i}"].itemsize
+        registros[f"valor_{i}"] = arreglo
+
+    buffer = io.BytesIO(_CABECERA_COPY_BINARIO + registros.tobytes() + _FINAL_COPY_BINARIO)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT binary)", buffer
+        )
+
+
+def leer_arreglos(conn, consulta, columnas, parametros=None):
+    """
+    Lee el resultado de 'consulta' con COPY TO STDOUT en formato binario
+    y lo devuelve como un arreglo estructurado de NumPy, sin crear una
+    tupla de Python por fila.
+
+    'columnas' es una lista de pares (nombre, tipo) con los tipos de
+    _TIPOS_BINARIOS o "datetime64[us]" para TIMESTAMP. La consulta no
+    debe devolver NULL (usar coalesce), porque cada campo se lee con
+    ancho fijo.
+    """
+    import numpy as np
+
+    campos = [("campos", ">i2")]
+    for nombre, tipo in columnas:
+        tipo = np.dtype(tipo)
+        binario = ">i8" if np.issubdtype(tipo, np.datetime64) else _TIPOS_BINARIOS[tipo.name]
+        campos += [(f"largo_{nombre}", ">i4"), (nombre, binario)]
+
+    buffer = io.BytesIO()
+    with conn.cursor() as cursor:
+        consulta = cursor.mogrify(consulta, parametros).decode()
+        cursor.copy_expert(f"COPY ({consulta}) TO STDOUT WITH (FORMAT binary)", buffer)
+    datos = buffer.getbuffer()
+    # Cabecera: firma, flags y largo de la extensión (sin extensión)
+    inicio = len(_CABECERA_COPY_BINARIO) + int.from_bytes(datos[15:19], "big")
+    registros = np.frombuffer(datos[inicio:len(datos) - len(_FINAL_COPY_BINARIO)], dtype=campos)
+
+    resultado = np.empty(len(registros), dtype=[(nombre, tipo) for nombre, tipo in columnas])
+    for nombre, tipo in columnas:
+        if np.issubdtype(np.dtype(tipo), np.datetime64):
+            resultado[nombre] = (registros[nombre] + _EPOCA_POSTGRES_US).astype("datetime64[us]")
+        else:
+            resultado[nombre] = registros[nombre]
+    return resultado
+
+
+def copiar_binario(conn, fecha_hora, valores, columnas=NOMBRES_METRICAS,
+                   estacion_id=ESTACION_POR_DEFECTO):
+    """
+    Escribe un bloque de mediciones con COPY binario (ver copiar_arreglos).
+
+    'fecha_hora' es un arreglo datetime64 de n elementos y 'valores' una
+    matriz (n, len(columnas)) de reales; los NaN se guardan como NaN, no
+    como NULL. 'estacion_id' es un id para todo el bloque o un arreglo
+    con el id de cada fila.
+    """
+    import numpy as np
+
+    n, k = valores.shape
+    if k != len(columnas):
+        raise ValueError(f"Se esperaban {len(columnas)} columnas y se recibieron {k}")
+    arreglos = {
+        "estacion_id": np.broadcast_to(np.asarray(estacion_id, dtype=np.int32), (n,)),
+        "fecha_hora": fecha_hora,
+    }
+    for i, columna in enumerate(columnas):
+        arreglos[columna] = valores[:, i].astype(np.float32, copy=False)
+    copiar_arreglos(conn, "mediciones", arreglos)
+    with conn.cursor() as cursor:
+        cursor.execute(SQL_NOTIFICAR)
+
+
+class EscritorMediciones:
+    """
+    Escritor de mediciones con buffer en memoria.
+
+    Vuelca el buffer cuando acumula 'tamano_lote' filas o cuando la fila
+    más antigua supera 'edad_maxima' segundos. La cola admite como máximo
+    'capacidad' filas: si la base de datos está lenta o caída, agregar()
+    se bloquea (contrapresión) en lugar de crecer sin límite.
+
+    Cada función de 'al_vaciar' se llama con la lista de filas después
+    de confirmar un lote. Todas las filas son de la estación 'estacion_id'.
+
+    Solo los errores de conexión (ERRORES_TRANSITORIOS) se reintentan; un
+    lote que falla por otro motivo se descarta y se cuenta en
+    filas_fallidas, para que no bloquee la ingesta.
+    """
+
+    def __init__(self, tamano_lote=500, edad_maxima=1.0, capacidad=10000,
+                 pool=None, al_vaciar=None, espera_maxima_reintento=30.0,
+                 estacion_id=ESTACION_POR_DEFECTO):
+        self.tamano_lote = tamano_lote
+        self.estacion_id = estacion_id
+        self.edad_maxima = edad_maxima
+        self.espera_maxima_reintento = espera_maxima_reintento
+        self.al_vaciar = list(al_vaciar or [])
+        self.filas_escritas = 0
+        self.filas_fallidas = 0
+        self._pool = pool
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._cerrando = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, name="escritor-mediciones", daemon=True)
+        self._hilo.start()
+        atexit.register(self.cerrar)
+
+    def agregar(self, datos, fecha_hora=None, timeout=None):
+        """
+        Encola una medición: sus métricas en el orden de
+        app.esquema.METRICAS (por ejemplo, Medicion.valores()).
+
+        Se bloquea mientras la cola esté llena; con 'timeout' lanza
+        queue.Full si no hay lugar dentro de ese tiempo.
+        """
+        self._verificar_abierto()
+        self._cola.put((fecha_hora or datetime.now(), *datos), timeout=timeout)
+
+    def vaciar(self, timeout=None):
+        """
+        Espera a que se escriba todo lo encolado hasta este momento.
+        """
+        self._verificar_abierto()
+        listo = threading.Event()
+        self._cola.put(listo)
+        return listo.wait(timeout)
+
+    def _verificar_abierto(self):
+        if self._cerrando.is_set() or not self._hilo.is_alive():
+            raise RuntimeError("El escritor de mediciones está cerrado")
+
+    def cerrar(self, timeout=None):
+        """
+        Escribe las filas pendientes y detiene el hilo de fondo.
+        """
+        if self._cerrando.is_set():
+            return
+        self._cerrando.set()
+        atexit.unregister(self.cerrar)
+        self._cola.put(None)
+        self._hilo.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def _ejecutar(self):
+        lote = []
+        limite = None
+        while True:
+            espera = None if limite is None else max(0.0, limite - time.monotonic())
+            try:
+                elemento = self._cola.get(timeout=espera)
+            except queue.Empty:
+                # La fila más antigua del lote superó edad_maxima
+                self._escribir(lote)
+                lote, limite = [], None
+                continue
+
+            if elemento is None or isinstance(elemento, threading.Event):
+                self._escribir(lote)
+                lote, limite = [], None
+                if elemento is None:
+                    return
+                elemento.set()
+                continue
+
+            if not lote:
+                limite = time.monotonic() + self.edad_maxima
+            lote.append(elemento)
+            if len(lote) >= self.tamano_lote:
+                self._escribir(lote)
+                lote, limite = [], None
+
+    def _escribir(self, lote):
+        if not lote:
+            return
+        espera = 0.1
+        while True:
+            try:
+                with (self._pool or obtener_pool()).conexion() as conn:
+                    escribir_lote(conn, lote, self.estacion_id)
+                break
+            except ERRORES_TRANSITORIOS as e:
+                if self._cerrando.is_set():
+                    self._descartar(lote, "al cerrar", e)
+                    return
+                # Reintentar con espera exponencial; mientras tanto la cola
+                # se llena y agregar() aplica contrapresión
+                logger.warning("Error al escribir mediciones, reintento en %.1f s: %s", espera, e)
+                time.sleep(espera)
+                espera = min(espera * 2, self.espera_maxima_reintento)
+            except Exception as e:
+                # Un error no transitorio (datos inválidos, error de
+                # programación) no mata el hilo: el lote se descarta
+                self._descartar(lote, "por un error no transitorio", e)
+                return
+
+        self.filas_escritas += len(lote)
+        MEDICIONES_INGRESADAS_TOTAL.incrementar(len(lote), origen="escritor")
+        for funcion in self.al_vaciar:
+            try:
+                funcion(lote)
+            except Exception as e:
+                logger.exception("Error en el callback al_vaciar: %s", e)
+
+    def _descartar(self, lote, motivo, error):
+        logger.error("Se descartan %d mediciones %s: %s", len(lote), motivo, error)
+        self.filas_fallidas += len(lote)
+        MEDICIONES_FALLIDAS_TOTAL.incrementar(len(lote), origen="escritor")
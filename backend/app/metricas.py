@@ -0,0 +1,513 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (/metrics).
+
+Cada métrica acumula sus valores en un fragmento por hilo
+(threading.local), por lo que registrar una observación no toma ningún
+lock ni compite con otros hilos: solo la lectura de /metrics recorre y
+suma los fragmentos. Los valores de los hilos que terminaron se
+conservan sumados aparte.
+
+Cada proceso tiene sus propias métricas. Con un directorio compartido
+(variable METRICAS_DIR, que gunicorn.conf.py fija para los trabajadores)
+cada proceso guarda en él una instantánea cada INTERVALO_INSTANTANEA
+segundos y generar_texto() suma las de todos: /metrics devuelve lo mismo
+en cualquier trabajador. Los contadores e histogramas de los procesos que
+terminaron se siguen sumando; los medidores, solo los de procesos vivos.
+
+Los procesos que no sirven la API (simulador, servicio de ingesta, carga
+masiva) exponen /metrics con servir_metricas(puerto) o escriben el texto
+en un archivo con exportar_archivo(ruta), para el colector de archivos
+de texto de node_exporter.
+
+Uso:
+    with DB_COMMIT_SEGUNDOS.cronometrar():
+        conn.commit()
+    MEDICIONES_INGRESADAS_TOTAL.incrementar(len(lote), origen="escritor")
+
+En los caminos más usados conviene fijar las etiquetas una sola vez:
+    consultas = DB_CONSULTA_SEGUNDOS.etiquetar(operacion="copy")
+    consultas.observar(duracion)
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Límites de los buckets por defecto: latencias en segundos
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Tamaños en bytes
+LIMITES_BYTES = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+
+# Segundos entre instantáneas en el directorio compartido
+INTERVALO_INSTANTANEA = 5.0
+
+_registro = {}
+_registro_lock = threading.Lock()
+
+# Directorio compartido entre procesos (None: solo las métricas propias)
+_directorio = os.environ.get("METRICAS_DIR") or None
+# Proceso que ya arrancó su hilo de instantáneas (un hijo creado con fork
+# hereda el valor, pero no el hilo)
+_exportando_en = None
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas_texto(nombres, valores, extra=()):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    pares += [f'{nombre}="{valor}"' for nombre, valor in extra]
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _orden(elemento):
+    # Las etiquetas pueden tener valores de distintos tipos
+    return tuple(map(str, elemento[0]))
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    """
+    Base de las métricas con fragmentos por hilo. Cada fragmento es un
+    diccionario valores de etiquetas -> valor acumulado.
+    """
+
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._local = threading.local()
+        # Fragmentos de los hilos vivos como (hilo, diccionario)
+        self._fragmentos = []
+        # Valores sumados de los hilos que ya terminaron
+        self._retirados = {}
+        self._lock = threading.Lock()
+
+    def _fragmento(self):
+        try:
+            return self._local.valores
+        except AttributeError:
+            valores = self._local.valores = {}
+            with self._lock:
+                # Con hilos de corta vida (uno por petición) la lista no
+                # crece aunque nadie recolecte
+                self._retirar_terminados()
+                self._fragmentos.append((threading.current_thread(), valores))
+            return valores
+
+    def _retirar_terminados(self):
+        # Pasa a _retirados los fragmentos de los hilos que terminaron; con _lock tomado
+        vivos = []
+        for hilo, valores in self._fragmentos:
+            if hilo.is_alive():
+                vivos.append((hilo, valores))
+            else:
+                self._sumar(self._retirados, valores)
+        self._fragmentos = vivos
+
+    def _clave(self, etiquetas):
+        if len(etiquetas) != len(self.etiquetas):
+            raise ValueError(f"La métrica {self.nombre} requiere las etiquetas {self.etiquetas}")
+        # Los valores se convierten a texto recién al exponer
+        return tuple(map(etiquetas.__getitem__, self.etiquetas))
+
+    def etiquetar(self, **etiquetas):
+        """
+        Devuelve la métrica con los valores de 'etiquetas' ya fijados, para
+        no validarlos en cada observación.
+        """
+        return MetricaEtiquetada(self, self._clave(etiquetas))
+
+    def _sumar(self, destino, origen):
+        raise NotImplementedError
+
+    def recolectar(self):
+        """
+        Suma los fragmentos de todos los hilos.
+
+        Returns:
+            Diccionario valores de etiquetas -> valor acumulado.
+        """
+        total = {}
+        with self._lock:
+            self._retirar_terminados()
+            for _, valores in self._fragmentos:
+                self._sumar(total, valores)
+            self._sumar(total, self._retirados)
+        return total
+
+    def exponer(self, valores=None):
+        raise NotImplementedError
+
+
+class Contador(Metrica):
+    """
+    Valor que solo crece (filas ingresadas, errores, ...).
+    """
+
+    tipo = "counter"
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        self._incrementar(self._clave(etiquetas) if etiquetas else (), cantidad)
+
+    def _incrementar(self, clave, cantidad):
+        valores = self._fragmento()
+        valores[clave] = valores.get(clave, 0) + cantidad
+
+    def _sumar(self, destino, origen):
+        # list() copia el diccionario de una vez aunque otro hilo lo modifique
+        for clave, valor in list(origen.items()):
+            destino[clave] = destino.get(clave, 0) + valor
+
+    def exponer(self, valores=None):
+        if valores is None:
+            valores = self.recolectar()
+        return [f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}"
+                for clave, valor in sorted(valores.items(), key=_orden)]
+
+
+class Histograma(Metrica):
+    """
+    Distribución de observaciones (latencias, tamaños) en buckets con
+    límites fijos, más su suma y cantidad.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, **etiquetas):
+        self._observar(self._clave(etiquetas) if etiquetas else (), valor)
+
+    def _observar(self, clave, valor):
+        valores = self._fragmento()
+        cubetas = valores.get(clave)
+        if cubetas is None:
+            # Una cuenta por bucket, el bucket +Inf, la suma y la cantidad
+            cubetas = valores[clave] = [0] * (len(self.limites) + 1) + [0.0, 0]
+        cubetas[bisect_left(self.limites, valor)] += 1
+        cubetas[-2] += valor
+        cubetas[-1] += 1
+
+    @contextmanager
+    def cronometrar(self, **etiquetas):
+        """
+        Observa el tiempo que tarda el bloque, aunque termine con una
+        excepción.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **etiquetas)
+
+    def _sumar(self, destino, origen):
+        for clave, cubetas in list(origen.items()):
+            cubetas = list(cubetas)
+            acumuladas = destino.get(clave)
+            if acumuladas is None:
+                destino[clave] = cubetas
+            else:
+                destino[clave] = [a + b for a, b in zip(acumuladas, cubetas)]
+
+    def exponer(self, valores=None):
+        if valores is None:
+            valores = self.recolectar()
+        lineas = []
+        for clave, cubetas in sorted(valores.items(), key=_orden):
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + (float("inf"),), cubetas):
+                acumulado += cuenta
+                etiquetas = _etiquetas_texto(self.etiquetas, clave, [("le", _numero(limite))])
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {acumulado}")
+            etiquetas = _etiquetas_texto(self.etiquetas, clave)
+            lineas.append(f"{self.nombre}_sum{etiquetas} {_numero(cubetas[-2])}")
+            lineas.append(f"{self.nombre}_count{etiquetas} {cubetas[-1]}")
+        return lineas
+
+
+class MetricaEtiquetada:
+    """
+    Un contador o histograma con los valores de sus etiquetas fijados
+    (ver Metrica.etiquetar).
+    """
+
+    def __init__(self, metrica, clave):
+        self._metrica = metrica
+        self._clave = clave
+
+    def incrementar(self, cantidad=1):
+        self._metrica._incrementar(self._clave, cantidad)
+
+    def observar(self, valor):
+        self._metrica._observar(self._clave, valor)
+
+    @contextmanager
+    def cronometrar(self):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._metrica._observar(self._clave, time.perf_counter() - inicio)
+
+
+class Medidor:
+    """
+    Métrica que se lee al exponer llamando a 'funcion', para valores que
+    ya lleva otro objeto (por ejemplo, los contadores de una caché).
+    'funcion' devuelve un número o, con etiquetas, un diccionario
+    valores de etiquetas -> número.
+    """
+
+    def __init__(self, nombre, ayuda, funcion, etiquetas=(), tipo="gauge"):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiquetas = tuple(etiquetas)
+        self.tipo = tipo
+
+    def recolectar(self):
+        valores = self.funcion()
+        return valores if self.etiquetas else {(): valores}
+
+    def _sumar(self, destino, origen):
+        for clave, valor in origen.items():
+            destino[clave] = destino.get(clave, 0) + valor
+
+    def exponer(self, valores=None):
+        if valores is None:
+            valores = self.recolectar()
+        return [f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}"
+                for clave, valor in sorted(valores.items(), key=_orden)]
+
+
+def registrar(metrica):
+    """
+    Registra una métrica para exponerla en /metrics. Si ya hay una con el
+    mismo nombre (el módulo se importó de nuevo) se devuelve la existente.
+    """
+    with _registro_lock:
+        return _registro.setdefault(metrica.nombre, metrica)
+
+
+def contador(nombre, ayuda, etiquetas=()):
+    return registrar(Contador(nombre, ayuda, etiquetas))
+
+
+def histograma(nombre, ayuda, etiquetas=(), limites=LIMITES_SEGUNDOS):
+    return registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+
+def medidor(nombre, ayuda, funcion, etiquetas=(), tipo="gauge"):
+    with _registro_lock:
+        # Se reemplaza: la función puede referirse a un objeto nuevo
+        _registro[nombre] = Medidor(nombre, ayuda, funcion, etiquetas, tipo)
+        return _registro[nombre]
+
+
+def usar_directorio(directorio):
+    """
+    Fija el directorio compartido del proceso y de los procesos hijos que
+    cree después (se hereda por la variable de entorno METRICAS_DIR).
+    """
+    global _directorio
+    _directorio = directorio
+    os.environ["METRICAS_DIR"] = directorio
+
+
+def limpiar_directorio():
+    """
+    Borra las instantáneas del directorio compartido, para que las de una
+    ejecución anterior no se sumen a las de esta.
+    """
+    if _directorio is None or not os.path.isdir(_directorio):
+        return
+    for nombre in os.listdir(_directorio):
+        if nombre.endswith(".json"):
+            os.remove(os.path.join(_directorio, nombre))
+
+
+def guardar_instantanea():
+    """
+    Guarda los valores de las métricas del proceso en el directorio
+    compartido, en '<pid>.json'. Sin directorio no hace nada.
+    """
+    if _directorio is None:
+        return
+    with _registro_lock:
+        metricas = list(_registro.values())
+    instantanea = {
+        metrica.nombre: [[list(map(str, clave)), valor] for clave, valor in metrica.recolectar().items()]
+        for metrica in metricas
+    }
+    os.makedirs(_directorio, exist_ok=True)
+    ruta = os.path.join(_directorio, f"{os.getpid()}.json")
+    # Se escribe aparte y se reemplaza, para que no se lea a medias
+    with open(ruta + ".tmp", "w") as archivo:
+        json.dump(instantanea, archivo)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def _guardar_periodicamente():
+    while True:
+        time.sleep(INTERVALO_INSTANTANEA)
+        try:
+            guardar_instantanea()
+        except OSError:
+            pass
+
+
+def iniciar_instantaneas():
+    """
+    Con un directorio compartido, arranca (una vez por proceso) el hilo
+    que guarda las instantáneas del proceso, y guarda la última al
+    terminar. Sin directorio no hace nada.
+    """
+    global _exportando_en
+    if _directorio is None or _exportando_en == os.getpid():
+        return
+    _exportando_en = os.getpid()
+    guardar_instantanea()
+    threading.Thread(target=_guardar_periodicamente, name="metricas-instantaneas", daemon=True).start()
+    atexit.register(guardar_instantanea)
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _sumar_instantaneas(metricas):
+    # nombre -> valores sumados de todos los procesos del directorio
+    totales = {}
+    for nombre in os.listdir(_directorio):
+        if not nombre.endswith(".json"):
+            continue
+        vivo = _proceso_vivo(int(nombre[:-len(".json")]))
+        try:
+            with open(os.path.join(_directorio, nombre)) as archivo:
+                instantanea = json.load(archivo)
+        except (OSError, ValueError):
+            continue
+        for nombre_metrica, valores in instantanea.items():
+            metrica = metricas.get(nombre_metrica)
+            if metrica is None or (metrica.tipo == "gauge" and not vivo):
+                continue
+            metrica._sumar(totales.setdefault(nombre_metrica, {}),
+                           {tuple(clave): valor for clave, valor in valores})
+    return totales
+
+
+def generar_texto():
+    """
+    Todas las métricas registradas en el formato de texto de Prometheus:
+    las del proceso o, con un directorio compartido, la suma de las de
+    todos los procesos que guardan instantáneas en él.
+    """
+    with _registro_lock:
+        metricas = sorted(_registro.values(), key=lambda metrica: metrica.nombre)
+    totales = None
+    if _directorio is not None:
+        guardar_instantanea()
+        totales = _sumar_instantaneas({metrica.nombre: metrica for metrica in metricas})
+    lineas = []
+    for metrica in metricas:
+        lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+        lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+        lineas.extend(metrica.exponer(None if totales is None else totales.get(metrica.nombre, {})))
+    return "\n".join(lineas) + "\n"
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        cuerpo = generar_texto().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *argumentos):
+        # Los scrapes no se registran
+        pass
+
+
+def servir_metricas(puerto, host="0.0.0.0"):
+    """
+    Expone /metrics en 'puerto' desde un hilo, para los procesos que no
+    sirven la API. Si no hay un directorio compartido se usa uno temporal,
+    de modo que se suman también las métricas de los procesos hijos que
+    llamen a iniciar_instantaneas().
+
+    Returns:
+        El servidor HTTP (server.shutdown() lo detiene).
+    """
+    if _directorio is None:
+        usar_directorio(tempfile.mkdtemp(prefix="metricas-"))
+    limpiar_directorio()
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return servidor
+
+
+def exportar_archivo(ruta):
+    """
+    Escribe las métricas en 'ruta' (formato de texto de Prometheus), por
+    ejemplo para el colector de archivos de texto de node_exporter.
+    """
+    with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+        archivo.write(generar_texto())
+    os.replace(ruta + ".tmp", ruta)
+
+
+# Métricas de los caminos críticos
+
+SENSOR_LECTURA_SEGUNDOS = histograma(
+    "monitoreo_sensor_lectura_segundos", "Duración de la lectura de cada sensor", ("sensor",))
+SENSOR_ERRORES_TOTAL = contador(
+    "monitoreo_sensor_errores_total", "Lecturas de sensor con error", ("sensor",))
+
+DB_CONEXION_SEGUNDOS = histograma(
+    "monitoreo_db_conexion_segundos", "Duración de la apertura de una conexión a PostgreSQL")
+DB_ESPERA_POOL_SEGUNDOS = histograma(
+    "monitoreo_db_espera_pool_segundos", "Espera para obtener una conexión del pool")
+DB_CONSULTA_SEGUNDOS = histograma(
+    "monitoreo_db_consulta_segundos", "Duración de cada sentencia en PostgreSQL", ("operacion",))
+DB_COMMIT_SEGUNDOS = histograma(
+    "monitoreo_db_commit_segundos", "Duración de la confirmación de las transacciones")
+
+MEDICIONES_INGRESADAS_TOTAL = contador(
+    "monitoreo_mediciones_ingresadas_total", "Mediciones confirmadas en la base de datos", ("origen",))
+MEDICIONES_FALLIDAS_TOTAL = contador(
+    "monitoreo_mediciones_fallidas_total", "Mediciones que no se pudieron escribir", ("origen",))
+
+HTTP_PETICION_SEGUNDOS = histograma(
+    "monitoreo_http_peticion_segundos", "Duración de las peticiones hasta generar la respuesta",
+    ("ruta", "metodo", "codigo"))
+HTTP_RESPUESTA_BYTES = histograma(
+    "monitoreo_http_respuesta_bytes", "Tamaño del cuerpo de las respuestas", ("ruta",), LIMITES_BYTES)
@@ -2,28 +2,247 @@
 Maneja las operaciones en la tabla
 'mediciones'
 """
-from .db import get_connection
+import base64
+import json
+import logging
+from datetime import datetime
 
-def obtener_mediciones():
+import psycopg2
+
+from .db import conexion
+from .esquema import COLUMNAS_CONSULTA, SQL_SELECCIONAR
+from .serializacion import FORMATO_POR_DEFECTO, a_columnas
+
+logger = logging.getLogger(__name__)
+
+# Columnas que se pueden proyectar desde la tabla 'mediciones' (ver app.esquema)
+COLUMNAS_MEDICIONES = COLUMNAS_CONSULTA
+
+# Tamaño de página por defecto y máximo permitido
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO = 10000
+
+
+def codificar_cursor(fecha_hora, id_medicion):
+    """
+    Codifica la posición (fecha_hora, id) de la última fila de una página
+    en un cursor opaco para la siguiente consulta.
+    """
+    posicion = json.dumps([fecha_hora.isoformat(), id_medicion])
+    return base64.urlsafe_b64encode(posicion.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """
+    Devuelve la tupla (fecha_hora, id) codificada en el cursor.
+
+    Lanza ValueError si el cursor no es válido.
+    """
+    try:
+        fecha_hora, id_medicion = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(fecha_hora), int(id_medicion)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+
+def construir_consulta(desde=None, hasta=None, columnas=None, despues_de=None, estacion=None):
+    """
+    Construye la consulta SQL (y sus parámetros) para leer mediciones en
+    orden (fecha_hora, id), filtradas por estación, por rango de tiempo
+    [desde, hasta) y a partir de la posición 'despues_de'.
+
+    Sin 'columnas' se proyectan todas las de COLUMNAS_MEDICIONES, en ese
+    orden; en otro caso 'id' y 'fecha_hora' siempre se incluyen porque son la clave de
+    paginación.
+    """
+    if columnas is None:
+        proyeccion = ", ".join(COLUMNAS_MEDICIONES)
+    else:
+        invalidas = [c for c in columnas if c not in COLUMNAS_MEDICIONES]
+        if invalidas:
+            raise ValueError(f"Columnas no válidas: {', '.join(invalidas)}")
+        columnas = ["id", "fecha_hora"] + [c for c in columnas if c not in ("id", "fecha_hora")]
+        proyeccion = ", ".join(columnas)
+
+    condiciones = []
+    parametros = []
+    if estacion is not None:
+        # Con la estación fija se usa el índice (estacion_id, fecha_hora, id)
+        condiciones.append("estacion_id = %s")
+        parametros.append(estacion)
+    if desde is not None:
+        condiciones.append("fecha_hora >= %s")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("fecha_hora < %s")
+        parametros.append(hasta)
+    if despues_de is not None:
+        # Comparación de filas: aprovecha el índice (fecha_hora, id)
+        condiciones.append("(fecha_hora, id) > (%s, %s)")
+        parametros.extend(despues_de)
+
+    consulta = f"SELECT {proyeccion} FROM mediciones"
+    if condiciones:
+        consulta += " WHERE " + " AND ".join(condiciones)
+    consulta += " ORDER BY fecha_hora, id"
+    return consulta, parametros
+
+
+def construir_consulta_pagina(desde=None, hasta=None, columnas=None, limite=LIMITE_POR_DEFECTO,
+                              cursor=None, estacion=None):
+    """
+    Construye la consulta de una página de mediciones a partir del cursor
+    de la página anterior. Se pide una fila extra para saber si existe
+    una página siguiente (ver armar_pagina).
+    """
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise ValueError(f"El límite debe estar entre 1 y {LIMITE_MAXIMO}")
+    despues_de = decodificar_cursor(cursor) if cursor else None
+    consulta, parametros = construir_consulta(desde, hasta, columnas, despues_de, estacion)
+    consulta += " LIMIT %s"
+    parametros.append(limite + 1)
+    return consulta, parametros
+
+
+def obtener_mediciones(desde=None, hasta=None, columnas=None, limite=LIMITE_POR_DEFECTO, cursor=None,
+                       estacion=None, formato=FORMATO_POR_DEFECTO):
+    """
+    Obtiene una página de mediciones de la tabla 'mediciones'.
+
+    Usa paginación por clave (fecha_hora, id), por lo que el costo de
+    cada página no depende del tamaño total de la tabla.
+
+    Returns:
+        Diccionario con las columnas, las filas (como diccionarios, o
+        agrupadas por columna con formato='columnas', ver armar_pagina) y
+        el cursor de la siguiente página (None si no hay más filas).
+    """
+    consulta, parametros = construir_consulta_pagina(desde, hasta, columnas, limite, cursor, estacion)
+
+    try:
+        # Tomar una conexión del pool; se devuelve al salir del bloque
+        with conexion() as conn, conn.cursor() as cur:
+            cur.execute(consulta, parametros)
+            columnas = [descripcion[0] for descripcion in cur.description]
+            filas = cur.fetchall()
+    except psycopg2.Error as e:
+        # Capturar y mostrar errores específicos de PostgreSQL
+        logger.error("Error al obtener las mediciones: %s", e)
+        raise
+
+    return armar_pagina(columnas, filas, limite, formato)
+
+
+def armar_pagina(columnas, filas, limite, formato=FORMATO_POR_DEFECTO):
     """
-    Obtiene todas las mediciones de la tabla 'mediciones'
+    Arma la página a partir de las filas leídas con 'limite' + 1 filas
+    como máximo: la fila extra solo indica que hay una página siguiente.
+
+    Con formato='filas' cada fila es un diccionario; con 'columnas' las
+    filas se agrupan en un diccionario columna -> valores (ver
+    app.serializacion.a_columnas).
     """
-    # Obtener la conexión a la base de datos
-    conn = get_connection()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(ultima[columnas.index("fecha_hora")], ultima[columnas.index("id")])
+    if formato == "columnas":
+        filas = a_columnas(columnas, filas)
+    else:
+        filas = [dict(zip(columnas, fila)) for fila in filas]
+
+    return {
+        "columnas": columnas,
+        "filas": filas,
+        "siguiente": siguiente,
+    }
+
+
+def iterar_mediciones(desde=None, hasta=None, columnas=None, itersize=2000, estacion=None):
+    """
+    Recorre las mediciones del rango [desde, hasta) en orden (fecha_hora, id)
+    con un cursor del lado del servidor, trayendo 'itersize' filas por viaje.
+
+    El primer elemento generado es la lista de nombres de columna; los
+    siguientes son las filas como tuplas. La memoria usada no depende del
+    tamaño del resultado.
+    """
+    consulta, parametros = construir_consulta(desde, hasta, columnas, estacion=estacion)
     try:
-        # Crear un cursor para ejecutar consultas
-        with conn.cursor() as cursor:
-            # Ejecutar la consulta para obtener todas las mediciones
-            cursor.execute("SELECT * FROM mediciones")
-            # Obtener los resultados de la consulta
-            mediciones = cursor.fetchall()
-            # Devolver los resultados
-            return mediciones
+        # Un cursor con nombre vive en el servidor y solo existe dentro
+        # de la transacción, que se cierra al terminar el bloque
+        with conexion() as conn, conn.cursor(name="exportar_mediciones") as cur:
+            cur.itersize = itersize
+            cur.execute(consulta, parametros)
+            filas = iter(cur)
+            primera = next(filas, None)
+            yield [descripcion[0] for descripcion in cur.description]
+            if primera is None:
+                return
+            yield primera
+            yield from filas
     except psycopg2.Error as e:
         # Capturar y mostrar errores específicos de PostgreSQL
-        print(f"Error al obtener las mediciones: {e}")
+        logger.error("Error al exportar las mediciones: %s", e)
+        raise
+
+
+def obtener_ultimo_id():
+    """
+    Devuelve el mayor id de la tabla 'mediciones' (0 si está vacía).
+    """
+    try:
+        with conexion() as conn, conn.cursor() as cur:
+            cur.execute("SELECT coalesce(max(id), 0) FROM mediciones")
+            return cur.fetchone()[0]
+    except psycopg2.Error as e:
+        logger.error("Error al obtener el último id: %s", e)
+        raise
+
+
+def obtener_mediciones_desde_id(ultimo_id, limite=LIMITE_POR_DEFECTO, estacion=None, excluir=None):
+    """
+    Obtiene hasta 'limite' mediciones con id mayor a 'ultimo_id', en orden
+    de id, como diccionarios. Con 'estacion' solo las de esa estación, y
+    con 'excluir' (ids) sin esas filas.
+    """
+    consulta = f"{SQL_SELECCIONAR} WHERE id > %s"
+    parametros = [ultimo_id]
+    if estacion is not None:
+        consulta += " AND estacion_id = %s"
+        parametros.append(estacion)
+    if excluir:
+        consulta += " AND id <> ALL(%s)"
+        parametros.append(list(excluir))
+    consulta += " ORDER BY id LIMIT %s"
+    parametros.append(limite)
+    try:
+        with conexion() as conn, conn.cursor() as cur:
+            cur.execute(consulta, parametros)
+            columnas = [descripcion[0] for descripcion in cur.description]
+            return [dict(zip(columnas, fila)) for fila in cur.fetchall()]
+    except psycopg2.Error as e:
+        logger.error("Error al obtener las mediciones nuevas: %s", e)
         raise
-    finally:
-        # Cerrar la conexión a la base de datos
-        conn.close()
 
+
+# Contador de cambios de 'mediciones' y momento del último, mantenidos
+# por el disparador 'mediciones_version' (database/crear_tabla_mediciones.py)
+SQL_VERSION = "SELECT sum(version)::bigint, max(modificada) FROM version_mediciones"
+
+
+def obtener_version():
+    """
+    Devuelve (version, modificada) de la tabla 'mediciones': un contador
+    que cambia con cada INSERT, UPDATE o DELETE confirmado y el momento
+    del último cambio. Es una lectura de una tabla de 16 filas, por lo
+    que sirve como validador barato.
+    """
+    try:
+        with conexion() as conn, conn.cursor() as cur:
+            cur.execute(SQL_VERSION)
+            return cur.fetchone()
+    except psycopg2.Error as e:
+        logger.error("Error al obtener la versión de las mediciones: %s", e)
+        raise
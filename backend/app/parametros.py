@@ -0,0 +1,63 @@
+"""
+Lectura y validación de los parámetros de consulta comunes a los
+endpoints de mediciones (app.api y app.api_async).
+"""
+from datetime import datetime
+
+from .serializacion import FORMATO_POR_DEFECTO, FORMATOS
+
+
+def parsear_fecha(valor, nombre):
+    """
+    Convierte un parámetro ISO 8601 de la consulta en datetime.
+
+    Lanza ValueError si el formato no es válido.
+    """
+    if valor is None:
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError as e:
+        raise ValueError(f"Parámetro '{nombre}' no es una fecha ISO 8601 válida: {valor}") from e
+
+
+def parsear_estacion(valor):
+    """
+    Convierte el parámetro 'estacion' (id de estación) en entero.
+
+    Lanza ValueError si no es un entero.
+    """
+    if valor is None:
+        return None
+    try:
+        return int(valor)
+    except ValueError as e:
+        raise ValueError(f"Parámetro 'estacion' no es un id de estación válido: {valor}") from e
+
+
+def parsear_formato(valor):
+    """
+    Valida el parámetro 'formato' de la respuesta: 'filas' (un objeto
+    por fila, por defecto) o 'columnas' (ver app.serializacion).
+
+    Lanza ValueError si no es uno de esos valores.
+    """
+    if valor is None:
+        return FORMATO_POR_DEFECTO
+    if valor not in FORMATOS:
+        raise ValueError(f"Parámetro 'formato' debe ser uno de {', '.join(FORMATOS)}: {valor}")
+    return valor
+
+
+def parsear_filtros(args):
+    """
+    Obtiene los filtros comunes de las consultas de mediciones:
+    estación, rango de tiempo [desde, hasta) y proyección de columnas.
+    """
+    columnas = args.get('columnas')
+    return {
+        'estacion': parsear_estacion(args.get('estacion')),
+        'desde': parsear_fecha(args.get('desde'), 'desde'),
+        'hasta': parsear_fecha(args.get('hasta'), 'hasta'),
+        'columnas': columnas.split(',') if columnas else None,
+    }
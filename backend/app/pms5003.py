@@ -0,0 +1,330 @@
+"""
+Decodificador de las tramas serie del sensor de partículas PMS5003.
+
+En modo activo el sensor envía, alrededor de una vez por segundo, una
+trama de 32 bytes (9600 baudios, 8N1):
+
+    0x42 0x4D | largo (28) | 13 palabras de 16 bits | suma de verificación
+
+Las palabras son PM1.0, PM2.5 y PM10 con calibración de fábrica (CF=1),
+las mismas tres en condiciones atmosféricas (μg/m³), seis conteos de
+partículas por 0,1 L de aire y una reservada; todas big-endian. La suma
+de verificación es la suma de los 30 bytes anteriores.
+
+El puerto se lee directamente dentro de un bytearray reutilizable
+(readinto sobre un memoryview) y las tramas se decodifican en el lugar
+con struct.unpack_from, sin copiar cada trama a un objeto bytes. Una
+trama con largo o suma de verificación incorrectos se descarta y la
+búsqueda de la cabecera sigue desde el byte siguiente. Las últimas
+'tramas_por_promedio' tramas válidas se guardan en una ventana circular
+y cada lectura devuelve su promedio.
+
+DispositivoReproducido reproduce una grabación del puerto serie (por
+ejemplo, tomada con 'python -m app.pms5003 grabar'), para probar y medir
+el decodificador sin el sensor:
+
+    python -m app.pms5003 grabar /dev/ttyUSB0 pms5003.bin --segundos 60
+    python -m app.pms5003 leer pms5003.bin
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+CABECERA = b"BM"
+LARGO_TRAMA = 32
+# Valor del campo 'largo': 13 palabras de datos más la suma de verificación
+LARGO_DATOS = LARGO_TRAMA - 4
+BAUDIOS = 9600
+
+# Cabecera (se salta), largo, 13 palabras y suma de verificación
+_TRAMA = struct.Struct(">2xH13HH")
+
+# Campos de la lectura y su posición en la tupla de _TRAMA. Se usan los
+# valores atmosféricos, los que corresponden a aire ambiente
+CAMPOS = (
+    ("pm1_ugm3", 4),
+    ("pm25_ugm3", 5),
+    ("pm10_ugm3", 6),
+    ("particulas_0_3um", 7),
+    ("particulas_0_5um", 8),
+    ("particulas_1_0um", 9),
+    ("particulas_2_5um", 10),
+    ("particulas_5_0um", 11),
+    ("particulas_10um", 12),
+)
+
+TRAMAS_POR_PROMEDIO = 5
+
+
+def armar_trama(pm1, pm25, pm10, conteos=(0, 0, 0, 0, 0, 0), cf1=None):
+    """
+    Arma una trama válida con los valores dados (enteros). 'cf1' son los
+    tres valores con calibración de fábrica; por defecto, los
+    atmosféricos.
+    """
+    palabras = (*(cf1 or (pm1, pm25, pm10)), pm1, pm25, pm10, *conteos, 0)
+    trama = bytearray(CABECERA + struct.pack(">H13H", LARGO_DATOS, *palabras))
+    return bytes(trama + struct.pack(">H", sum(trama)))
+
+
+class DecodificadorPMS5003:
+    """
+    Decodifica el flujo de bytes del sensor.
+
+    Los bytes se escriben en un bytearray de 'capacidad' bytes, ya sea
+    con leer_de(dispositivo), que lee del puerto directamente en el
+    buffer, o con alimentar(datos). Los bytes de una trama incompleta se
+    mueven al principio del buffer antes de la siguiente lectura.
+    """
+
+    __slots__ = ("tramas_por_promedio", "tramas_validas", "tramas_invalidas", "bytes_descartados",
+                 "_buffer", "_vista", "_inicio", "_fin", "_ventana", "_siguiente", "_en_ventana")
+
+    def __init__(self, tramas_por_promedio=TRAMAS_POR_PROMEDIO, capacidad=4096):
+        if capacidad < LARGO_TRAMA:
+            raise ValueError(f"La capacidad debe ser de al menos {LARGO_TRAMA} bytes")
+        self.tramas_por_promedio = tramas_por_promedio
+        self.tramas_validas = 0
+        self.tramas_invalidas = 0
+        self.bytes_descartados = 0
+        self._buffer = bytearray(capacidad)
+        self._vista = memoryview(self._buffer)
+        self._inicio = 0
+        self._fin = 0
+        # Ventana circular con las últimas tramas válidas (tuplas de _TRAMA)
+        self._ventana = [None] * tramas_por_promedio
+        self._siguiente = 0
+        self._en_ventana = 0
+
+    def espacio(self):
+        """
+        Parte libre del buffer (memoryview) donde escribir los próximos
+        bytes; después de escribir se llama a confirmar().
+        """
+        if self._inicio:
+            self._compactar()
+        return self._vista[self._fin:]
+
+    def _compactar(self):
+        # Como mucho 31 bytes de una trama incompleta
+        pendientes = self._fin - self._inicio
+        self._vista[:pendientes] = self._vista[self._inicio:self._fin]
+        self._inicio, self._fin = 0, pendientes
+
+    def confirmar(self, cantidad):
+        """
+        Procesa 'cantidad' bytes escritos en espacio().
+
+        Returns:
+            Cantidad de tramas válidas nuevas.
+        """
+        self._fin += cantidad
+        return self._procesar()
+
+    def alimentar(self, datos):
+        """
+        Procesa los bytes de 'datos'.
+
+        Returns:
+            Cantidad de tramas válidas nuevas.
+        """
+        datos = memoryview(datos)
+        nuevas = 0
+        while datos:
+            libre = self.espacio()
+            cantidad = min(len(libre), len(datos))
+            libre[:cantidad] = datos[:cantidad]
+            datos = datos[cantidad:]
+            nuevas += self.confirmar(cantidad)
+        return nuevas
+
+    def leer_de(self, dispositivo):
+        """
+        Lee del puerto (un objeto con readinto e in_waiting, como
+        serial.Serial) lo que tenga disponible, o al menos una trama,
+        directamente en el buffer.
+
+        Returns:
+            (bytes leídos, tramas válidas nuevas).
+        """
+        if self._inicio:
+            self._compactar()
+        fin = self._fin
+        pedidos = max(dispositivo.in_waiting, LARGO_TRAMA)
+        leidos = dispositivo.readinto(self._vista[fin:fin + pedidos]) or 0
+        self._fin = fin + leidos
+        return leidos, self._procesar()
+
+    def _procesar(self):
+        buffer = self._buffer
+        vista = self._vista
+        ventana = self._ventana
+        i, fin = self._inicio, self._fin
+        nuevas = 0
+        while fin - i >= LARGO_TRAMA:
+            if buffer[i] != 0x42 or buffer[i + 1] != 0x4D:
+                siguiente = buffer.find(CABECERA, i + 1, fin)
+                if siguiente < 0:
+                    # El último byte puede ser el comienzo de una cabecera
+                    siguiente = fin - 1 if buffer[fin - 1] == 0x42 else fin
+                self.bytes_descartados += siguiente - i
+                i = siguiente
+                continue
+            trama = _TRAMA.unpack_from(buffer, i)
+            if trama[0] != LARGO_DATOS or trama[14] != sum(vista[i:i + LARGO_TRAMA - 2]):
+                # Trama corrupta o cabecera falsa: buscar desde el byte siguiente
+                self.tramas_invalidas += 1
+                self.bytes_descartados += 1
+                i += 1
+                continue
+            ventana[self._siguiente] = trama
+            self._siguiente = (self._siguiente + 1) % self.tramas_por_promedio
+            nuevas += 1
+            i += LARGO_TRAMA
+        self._inicio = i
+        if i == fin:
+            self._inicio = self._fin = 0
+        if nuevas:
+            self.tramas_validas += nuevas
+            self._en_ventana = min(self._en_ventana + nuevas, self.tramas_por_promedio)
+        return nuevas
+
+    def promedio(self):
+        """
+        Promedio de las últimas 'tramas_por_promedio' tramas válidas (o de
+        las que haya) como diccionario campo -> valor, o None si todavía
+        no llegó ninguna.
+        """
+        if not self._en_ventana:
+            return None
+        tramas = [trama for trama in self._ventana if trama is not None]
+        cantidad = len(tramas)
+        return {nombre: round(sum(trama[posicion] for trama in tramas) / cantidad, 2)
+                for nombre, posicion in CAMPOS}
+
+
+class DispositivoReproducido:
+    """
+    Puerto serie falso que entrega los bytes de una grabación ('datos'
+    como bytes o ruta de un archivo), con la interfaz de serial.Serial
+    que usa el decodificador (readinto, read, in_waiting).
+
+    'tamano_bloque' limita los bytes por lectura, para reproducir un
+    puerto que entrega las tramas en fragmentos. Al terminar la grabación
+    las lecturas devuelven 0 bytes, como un puerto sin datos al vencer su
+    timeout, salvo con 'bucle', que vuelve a empezar.
+    """
+
+    def __init__(self, datos, tamano_bloque=None, bucle=False):
+        if isinstance(datos, (str, os.PathLike)):
+            with open(datos, "rb") as archivo:
+                datos = archivo.read()
+        self._datos = memoryview(bytes(datos))
+        self.tamano_bloque = tamano_bloque
+        self.bucle = bucle
+        self.posicion = 0
+
+    @property
+    def in_waiting(self):
+        restantes = len(self._datos) - self.posicion
+        return min(restantes, self.tamano_bloque) if self.tamano_bloque else restantes
+
+    def readinto(self, destino):
+        if self.posicion == len(self._datos) and self.bucle:
+            self.posicion = 0
+        cantidad = min(len(destino), len(self._datos) - self.posicion)
+        if self.tamano_bloque:
+            cantidad = min(cantidad, self.tamano_bloque)
+        destino[:cantidad] = self._datos[self.posicion:self.posicion + cantidad]
+        self.posicion += cantidad
+        return cantidad
+
+    def read(self, cantidad=1):
+        destino = bytearray(cantidad)
+        return bytes(destino[:self.readinto(destino)])
+
+    def close(self):
+        pass
+
+
+def abrir_puerto(puerto, timeout=1.0):
+    """
+    Abre el puerto serie del sensor (requiere pyserial).
+    """
+    if serial is None:
+        raise RuntimeError("pyserial no está instalado; se requiere para leer el PMS5003 real")
+    return serial.Serial(puerto, BAUDIOS, timeout=timeout)
+
+
+def leer_promedio(decodificador, dispositivo, plazo):
+    """
+    Lee del dispositivo hasta vaciar lo que tenga disponible, esperando
+    como mucho 'plazo' segundos a que llegue al menos una trama válida.
+
+    Returns:
+        El promedio de la ventana (ver DecodificadorPMS5003.promedio), o
+        None si no llegó ninguna trama válida nueva.
+    """
+    limite = time.monotonic() + plazo
+    nuevas = 0
+    while True:
+        leidos, cantidad = decodificador.leer_de(dispositivo)
+        nuevas += cantidad
+        if not leidos or time.monotonic() >= limite:
+            break
+        if nuevas and not dispositivo.in_waiting:
+            break
+    return decodificador.promedio() if nuevas else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Graba o decodifica tramas del PMS5003")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    grabar = subcomandos.add_parser("grabar", help="guarda los bytes del puerto en un archivo")
+    grabar.add_argument("puerto")
+    grabar.add_argument("archivo")
+    grabar.add_argument("--segundos", type=float, default=60.0)
+    leer = subcomandos.add_parser("leer", help="decodifica una grabación o un puerto")
+    leer.add_argument("origen", help="archivo grabado o puerto serie")
+    leer.add_argument("--tramas", type=int, default=TRAMAS_POR_PROMEDIO, help="tramas por promedio")
+    args = parser.parse_args()
+
+    if args.comando == "grabar":
+        puerto = abrir_puerto(args.puerto)
+        limite = time.monotonic() + args.segundos
+        with open(args.archivo, "wb") as archivo:
+            while time.monotonic() < limite:
+                archivo.write(puerto.read(LARGO_TRAMA))
+        puerto.close()
+        return
+
+    if os.path.isfile(args.origen):
+        dispositivo = DispositivoReproducido(args.origen)
+    else:
+        dispositivo = abrir_puerto(args.origen)
+    decodificador = DecodificadorPMS5003(args.tramas)
+    promedios = 0
+    try:
+        while True:
+            leidos, _ = decodificador.leer_de(dispositivo)
+            if not leidos and isinstance(dispositivo, DispositivoReproducido):
+                break
+            # Un promedio cada 'tramas' tramas válidas
+            if decodificador.tramas_validas // args.tramas > promedios:
+                promedios = decodificador.tramas_validas // args.tramas
+                print(decodificador.promedio())
+    except KeyboardInterrupt:
+        pass
+    print(f"Tramas válidas: {decodificador.tramas_validas}, inválidas: {decodificador.tramas_invalidas}, "
+          f"bytes descartados: {decodificador.bytes_descartados}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
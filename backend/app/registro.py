@@ -0,0 +1,58 @@
+"""
+Configuración de los registros (logging) de los procesos del sistema.
+
+Los módulos registran con logging.getLogger(__name__); los puntos de
+entrada (API, simulador, comandos) llaman a configurar_registro() una
+vez al iniciar. Con formato 'json' cada registro es una línea JSON con
+fecha, nivel, módulo y mensaje, lista para un recolector de logs.
+"""
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+from . import config
+
+FORMATO_TEXTO = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+class FormatoJSON(logging.Formatter):
+    """
+    Formatea cada registro como un objeto JSON en una sola línea.
+    """
+
+    def format(self, record):
+        datos = {
+            "fecha_hora": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "modulo": record.name,
+            "mensaje": record.getMessage(),
+            "proceso": record.process,
+            "hilo": record.threadName,
+        }
+        if record.exc_info:
+            datos["excepcion"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False)
+
+
+def configurar_registro(nivel=None, formato=None):
+    """
+    Configura el registro raíz del proceso hacia stderr.
+
+    Args:
+        nivel: nivel mínimo ('DEBUG', 'INFO', ...); por defecto config.LOG_NIVEL.
+        formato: 'texto' o 'json'; por defecto config.LOG_FORMATO.
+    """
+    nivel = (nivel or config.LOG_NIVEL).upper()
+    formato = (formato or config.LOG_FORMATO).lower()
+    if formato not in ("texto", "json"):
+        raise ValueError(f"Formato de registro no válido: {formato}")
+
+    manejador = logging.StreamHandler(sys.stderr)
+    manejador.setFormatter(FormatoJSON() if formato == "json" else logging.Formatter(FORMATO_TEXTO))
+    raiz = logging.getLogger()
+    # Reemplazar los manejadores previos para no duplicar líneas
+    for anterior in list(raiz.handlers):
+        raiz.removeHandler(anterior)
+    raiz.addHandler(manejador)
+    raiz.setLevel(nivel)
@@ -1,21 +1,43 @@
- """
+"""
 Clases para manejar los sensores del sistema de monitoreo ambiental
+
+El módulo solo depende de la biblioteca estándar y de módulos livianos
+del paquete: psycopg2 y la conexión a la base de datos se cargan recién
+al guardar la primera medición sin escritor.
 """
+import logging
 import random
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Tuple
-from .db import get_connection
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TimeoutFuturo
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from . import config
+from .calibracion import COEFICIENTES_POR_DEFECTO, calibrar_lecturas, mv_desde_ozono, mv_desde_uv
+from .esquema import NOMBRES_METRICAS, SQL_INSERTAR, fila_desde_lecturas
+from .estaciones import ESTACION_POR_DEFECTO
+from .metricas import MEDICIONES_FALLIDAS_TOTAL, MEDICIONES_INGRESADAS_TOTAL, SENSOR_ERRORES_TOTAL, \
+    SENSOR_LECTURA_SEGUNDOS
+from .pms5003 import DecodificadorPMS5003, abrir_puerto, leer_promedio
+
+logger = logging.getLogger(__name__)
 
 
 class Sensor(ABC):
     """
     Clase abstracta base para todos los sensores
+
+    'plazo_segundos' es el tiempo máximo que la estación espera una
+    lectura y 'periodo_muestreo' el tiempo mínimo entre dos lecturas
+    reales del dispositivo (mientras no se cumple se reutiliza la última).
     """
     
-    def __init__(self, nombre: str, descripcion: str):
+    def __init__(self, nombre: str, descripcion: str,
+                 plazo_segundos: float = 1.0, periodo_muestreo: float = 0.0):
         self.nombre = nombre
         self.descripcion = descripcion
+        self.plazo_segundos = plazo_segundos
+        self.periodo_muestreo = periodo_muestreo
         self.ultima_lectura = None
         self.estado = "inactivo"
     
@@ -49,9 +71,14 @@ class PMS5003(Sensor):
     """
     Sensor de partículas PM2.5 (PMS5003)
     Mide la concentración de partículas en el aire
+
+    Con un 'dispositivo' (un puerto serie abierto o un
+    app.pms5003.DispositivoReproducido) cada lectura decodifica las
+    tramas recibidas y devuelve el promedio de las últimas
+    'tramas_por_promedio'; sin él, las lecturas se simulan.
     """
     
-    def __init__(self):
+    def __init__(self, dispositivo=None, tramas_por_promedio: int = 5):
         super().__init__(
             nombre="PMS5003",
             descripcion="Sensor de partículas PM2.5"
@@ -59,18 +86,25 @@ class PMS5003(Sensor):
         self.unidad = "μg/m³"
         self.rango_min = 0
         self.rango_max = 1000
+        self.dispositivo = dispositivo
+        self.decodificador = DecodificadorPMS5003(tramas_por_promedio) if dispositivo is not None else None
     
     def leer(self) -> Dict[str, Any]:
         """
-        Lee la concentración de PM2.5
-        En una implementación real, aquí se conectaría al sensor físico
+        Lee la concentración de PM2.5 y PM10
         """
         try:
-            # Simulación de lectura del sensor
-            pm25 = round(random.uniform(10, 50), 2)
+            if self.dispositivo is None:
+                # Simulación de lectura del sensor
+                pm25 = round(random.uniform(10, 50), 2)
+                lectura = {"pm25_ugm3": pm25, "pm10_ugm3": round(pm25 * random.uniform(1.1, 1.6), 2)}
+            else:
+                lectura = leer_promedio(self.decodificador, self.dispositivo, self.plazo_segundos)
+                if lectura is None:
+                    raise IOError("no se recibieron tramas válidas")
             
             self.ultima_lectura = {
-                "pm25_ugm3": pm25,
+                **lectura,
                 "timestamp": time.time(),
                 "unidad": self.unidad
             }
@@ -93,6 +127,9 @@ class MQ131(Sensor):
     """
     Sensor de ozono (MQ131)
     Mide la concentración de ozono en el aire
+
+    Entrega la tensión de salida del módulo (mV); la concentración la
+    calcula la estación con los coeficientes de app.calibracion
     """
     
     def __init__(self):
@@ -106,17 +143,17 @@ class MQ131(Sensor):
     
     def leer(self) -> Dict[str, Any]:
         """
-        Lee la concentración de ozono
-        En una implementación real, aquí se conectaría al sensor físico
+        Lee la tensión de salida del sensor de ozono
+        En una implementación real, aquí se leería el ADC
         """
         try:
-            # Simulación de lectura del sensor
-            ozono = round(random.uniform(20, 40), 2)
+            # Simulación: la tensión que corresponde a 20-40 ppb en condiciones de referencia
+            ozono_mv = mv_desde_ozono(random.uniform(20, 40), COEFICIENTES_POR_DEFECTO["ozono"])
             
             self.ultima_lectura = {
-                "ozono_ppb": ozono,
+                "ozono_mv": round(ozono_mv, 1),
                 "timestamp": time.time(),
-                "unidad": self.unidad
+                "unidad": "mV"
             }
             self.estado = "activo"
             
@@ -142,7 +179,10 @@ class DHT22(Sensor):
     def __init__(self):
         super().__init__(
             nombre="DHT22",
-            descripcion="Sensor de temperatura y humedad"
+            descripcion="Sensor de temperatura y humedad",
+            plazo_segundos=3.0,
+            # El DHT22 necesita unos 2 s entre lecturas
+            periodo_muestreo=2.0
         )
         self.temperatura_unidad = "°C"
         self.humedad_unidad = "%"
@@ -183,6 +223,9 @@ class GUVAS12SD(Sensor):
     """
     Sensor de radiación UV (GUVAS12SD)
     Mide la intensidad de radiación ultravioleta
+
+    Entrega la tensión de salida del módulo (mV); la intensidad la
+    calcula la estación con los coeficientes de app.calibracion
     """
     
     def __init__(self):
@@ -196,17 +239,17 @@ class GUVAS12SD(Sensor):
     
     def leer(self) -> Dict[str, Any]:
         """
-        Lee la intensidad de radiación UV
-        En una implementación real, aquí se conectaría al sensor físico
+        Lee la tensión de salida del sensor UV
+        En una implementación real, aquí se leería el ADC
         """
         try:
-            # Simulación de lectura del sensor
-            intensidad_uv = round(random.uniform(0.5, 1.5), 2)
+            # Simulación: la tensión que corresponde a 0,5-1,5 mW/cm²
+            uv_mv = mv_desde_uv(random.uniform(0.5, 1.5), COEFICIENTES_POR_DEFECTO["uv"])
             
             self.ultima_lectura = {
-                "intensidad_uv": intensidad_uv,
+                "uv_mv": round(uv_mv, 1),
                 "timestamp": time.time(),
-                "unidad": self.unidad
+                "unidad": "mV"
             }
             self.estado = "activo"
             
@@ -223,79 +266,224 @@ class GUVAS12SD(Sensor):
         return self.leer()
 
 
+class Medicion:
+    """
+    Registro inmutable de un ciclo de la estación: una sola lectura de
+    todos los sensores que se usa para guardar, mostrar y consultar el
+    estado, de modo que todos vean exactamente los mismos valores.
+
+    'valores' son las métricas en el orden de app.esquema.METRICAS; cada
+    una se lee también como atributo (medicion.pm25_ugm3). 'obsoletos'
+    contiene los nombres de los sensores que no respondieron dentro de su
+    plazo y aportaron su última lectura.
+    """
+    
+    __slots__ = ("fecha_hora", "_valores", "obsoletos")
+    
+    def __init__(self, fecha_hora, valores, obsoletos=()):
+        asignar = object.__setattr__
+        asignar(self, "fecha_hora", fecha_hora)
+        asignar(self, "_valores", tuple(valores))
+        asignar(self, "obsoletos", tuple(obsoletos))
+    
+    def __setattr__(self, nombre, valor):
+        raise AttributeError("Medicion es inmutable")
+    
+    def __delattr__(self, nombre):
+        raise AttributeError("Medicion es inmutable")
+    
+    def valores(self) -> Tuple[Optional[float], ...]:
+        """
+        Retorna los valores en el orden de la base de datos
+        (app.esquema.NOMBRES_METRICAS)
+        """
+        return self._valores
+    
+    def como_dict(self) -> Dict[str, Any]:
+        """
+        Retorna la medición como diccionario (para JSON o el estado)
+        """
+        return {"fecha_hora": self.fecha_hora, **dict(zip(NOMBRES_METRICAS, self._valores)),
+                "obsoletos": self.obsoletos}
+    
+    def __repr__(self):
+        valores = ", ".join(f"{nombre}={valor}" for nombre, valor in zip(NOMBRES_METRICAS, self._valores))
+        return f"Medicion({self.fecha_hora.isoformat()}, {valores}, obsoletos={self.obsoletos})"
+
+
+# Un atributo de solo lectura por cada métrica del registro
+for _indice, _nombre in enumerate(NOMBRES_METRICAS):
+    setattr(Medicion, _nombre, property(lambda self, i=_indice: self._valores[i], doc=f"Valor de {_nombre}"))
+del _indice, _nombre
+
+
 class EstacionMeteorologica:
     """
     Clase principal que coordina todos los sensores
+
+    Si se indica un 'escritor' (EscritorMediciones), las mediciones se
+    encolan para escribirse por lotes en lugar de insertarse una a una;
+    en ese caso la estación de las filas es la del escritor.
+
+    Los sensores se leen en paralelo en un pool de hilos, por lo que un
+    ciclo dura lo que el sensor más lento y no la suma de todos.
+
+    Los valores crudos del ozono y la radiación UV se convierten con
+    'coeficientes' (ver app.calibracion.obtener_coeficientes); sin ellos
+    se usan los de fábrica.
     """
     
-    def __init__(self):
+    def __init__(self, escritor=None, estacion_id=ESTACION_POR_DEFECTO, coeficientes=None):
+        self.escritor = escritor
+        self.estacion_id = estacion_id
+        self.coeficientes = coeficientes or COEFICIENTES_POR_DEFECTO
+        # Con PMS5003_PUERTO se lee el sensor de partículas real
+        puerto = config.PMS5003_PUERTO
         self.sensores = {
-            "pm25": PMS5003(),
+            "pm25": PMS5003(abrir_puerto(puerto) if puerto else None, config.PMS5003_TRAMAS),
             "ozono": MQ131(),
             "clima": DHT22(),
             "uv": GUVAS12SD()
         }
         self.estado = "inicializado"
+        self.ultima_medicion = None
+        self._ejecutor = ThreadPoolExecutor(
+            max_workers=len(self.sensores), thread_name_prefix="sensor"
+        )
+        # Lecturas en curso (un sensor colgado no se vuelve a lanzar)
+        self._pendientes = {}
+        # Momento (monotónico) y resultado de la última lectura correcta de
+        # cada sensor, que se reutiliza durante su periodo de muestreo
+        self._leido_en = {}
+        self._lecturas = {}
     
     def leer_todos_sensores(self) -> Dict[str, Any]:
         """
-        Lee todos los sensores y retorna un diccionario con todas las mediciones
+        Lee todos los sensores en paralelo y retorna un diccionario con
+        todas las mediciones.
+
+        Cada sensor tiene su propio plazo: si no responde a tiempo se
+        devuelve su última lectura marcada con "obsoleta": True. Los
+        sensores cuyo periodo de muestreo no se cumplió devuelven la
+        última lectura sin volver a consultar el dispositivo.
         """
         mediciones = {}
+        inicio = time.monotonic()
         
         for nombre, sensor in self.sensores.items():
+            if nombre in self._pendientes:
+                continue
+            leido_en = self._leido_en.get(nombre)
+            if leido_en is not None and inicio - leido_en < sensor.periodo_muestreo:
+                mediciones[nombre] = self._lecturas[nombre]
+                continue
+            self._pendientes[nombre] = self._ejecutor.submit(self._leer_sensor, sensor)
+        
+        for nombre, futuro in list(self._pendientes.items()):
+            sensor = self.sensores[nombre]
             try:
-                lectura = sensor.leer()
+                restante = max(0.0, inicio + sensor.plazo_segundos - time.monotonic())
+                lectura = futuro.result(timeout=restante)
                 mediciones[nombre] = lectura
+                # Tras un error se vuelve a consultar el sensor en el próximo ciclo
+                if "error" not in lectura:
+                    self._lecturas[nombre] = lectura
+                    self._leido_en[nombre] = time.monotonic()
+            except TimeoutFuturo:
+                # Se sigue esperando en el próximo ciclo sin relanzar la lectura
+                mediciones[nombre] = {**(sensor.ultima_lectura or {}), "obsoleta": True}
+                continue
             except Exception as e:
                 mediciones[nombre] = {"error": f"Error en sensor {nombre}: {str(e)}"}
+            del self._pendientes[nombre]
         
-        return mediciones
+        # Mantener el orden de los sensores de la estación
+        return {nombre: mediciones[nombre] for nombre in self.sensores}
     
-    def obtener_medicion_completa(self) -> Tuple[float, float, float, float, float]:
+    @staticmethod
+    def _leer_sensor(sensor: Sensor) -> Dict[str, Any]:
         """
-        Retorna una tupla con todas las mediciones en el orden de la base de datos:
-        (pm25_ugm3, ozono_ppb, intensidad_uv, temperatura, humedad_relativa)
+        Lee un sensor registrando la duración y los errores por clase de sensor
         """
-        lecturas = self.leer_todos_sensores()
-        
-        pm25 = lecturas.get("pm25", {}).get("pm25_ugm3", 0)
-        ozono = lecturas.get("ozono", {}).get("ozono_ppb", 0)
-        uv = lecturas.get("uv", {}).get("intensidad_uv", 0)
-        temp = lecturas.get("clima", {}).get("temperatura", 0)
-        humedad = lecturas.get("clima", {}).get("humedad_relativa", 0)
+        clase = type(sensor).__name__
+        inicio = time.perf_counter()
+        try:
+            lectura = sensor.leer()
+        except Exception:
+            SENSOR_ERRORES_TOTAL.incrementar(sensor=clase)
+            raise
+        finally:
+            SENSOR_LECTURA_SEGUNDOS.observar(time.perf_counter() - inicio, sensor=clase)
+        if "error" in lectura:
+            SENSOR_ERRORES_TOTAL.incrementar(sensor=clase)
+        return lectura
+    
+    def tomar_medicion(self) -> Medicion:
+        """
+        Lee todos los sensores una sola vez y retorna la Medicion del ciclo
+        """
+        lecturas = calibrar_lecturas(self.leer_todos_sensores(), self.coeficientes)
         
-        return (pm25, ozono, uv, temp, humedad)
+        # Los valores que un sensor no entregó (por ejemplo, por un error) quedan en None
+        medicion = Medicion(
+            datetime.now(),
+            fila_desde_lecturas(lecturas),
+            [nombre for nombre, lectura in lecturas.items() if lectura.get("obsoleta")]
+        )
+        self.ultima_medicion = medicion
+        return medicion
+    
+    def obtener_medicion_completa(self) -> Tuple[Optional[float], ...]:
+        """
+        Retorna una tupla con todas las mediciones en el orden de la base de datos
+        (app.esquema.NOMBRES_METRICAS)
+        """
+        return self.tomar_medicion().valores()
     
-    def guardar_mediciones(self) -> bool:
+    def guardar_mediciones(self, medicion: Medicion = None) -> bool:
         """
-        Guarda las mediciones en la base de datos
+        Guarda una medición en la base de datos. Sin 'medicion' se toma
+        una nueva; para mostrar lo mismo que se guarda, tomarla antes con
+        tomar_medicion() y pasarla aquí.
         """
         try:
-            conn = get_connection()
-            mediciones = self.obtener_medicion_completa()
+            if medicion is None:
+                medicion = self.tomar_medicion()
+            
+            if self.escritor is not None:
+                self.escritor.agregar(medicion.valores(), fecha_hora=medicion.fecha_hora)
+                return True
             
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO mediciones 
-                    (pm25_ugm3, ozono_ppb, intensidad_uv, temperatura, humedad_relativa)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, mediciones)
-                conn.commit()
+            # La conexión viene del pool y se confirma al salir del bloque
+            from .db import conexion
+            from .ingesta import SQL_NOTIFICAR
+            with conexion() as conn, conn.cursor() as cursor:
+                cursor.execute(SQL_INSERTAR, (self.estacion_id, medicion.fecha_hora, *medicion.valores()))
+                cursor.execute(SQL_NOTIFICAR)
             
-            conn.close()
+            MEDICIONES_INGRESADAS_TOTAL.incrementar(origen="directo")
             return True
             
         except Exception as e:
-            print(f"Error al guardar mediciones: {e}")
+            if self.escritor is None:
+                MEDICIONES_FALLIDAS_TOTAL.incrementar(origen="directo")
+            logger.error("Error al guardar mediciones: %s", e)
             return False
     
+    def cerrar(self):
+        """
+        Libera el pool de hilos de lectura de sensores
+        """
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+    
     def obtener_estado_estacion(self) -> Dict[str, Any]:
         """
         Retorna el estado de toda la estación meteorológica
         """
         return {
+            "estacion_id": self.estacion_id,
             "estado": self.estado,
+            "ultima_medicion": self.ultima_medicion.como_dict() if self.ultima_medicion else None,
             "sensores": {nombre: sensor.obtener_estado() 
                         for nombre, sensor in self.sensores.items()}
         }
\ No newline at end of file
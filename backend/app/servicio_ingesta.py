@@ -0,0 +1,128 @@
+"""
+Servicio de ingesta de una red de estaciones repartida en un pool de
+procesos.
+
+Cada proceso es dueño de un fragmento de estaciones (las de id % procesos
+igual a su índice), genera sus mediciones con el simulador vectorizado y
+las escribe por lotes con COPY binario usando su propio pool de
+conexiones. Los procesos no comparten estado, por lo que el rendimiento
+crece con la cantidad de núcleos hasta que la base de datos se satura.
+
+Uso desde la línea de comandos (desde backend/):
+    python -m app.servicio_ingesta --estaciones 1000 --procesos 4 --dias 7
+    python -m app.servicio_ingesta --estaciones 1000 --procesos 4 --tiempo-real --puerto-metricas 9101
+
+Con --puerto-metricas (o METRICAS_PUERTO) se exponen en /metrics las
+métricas de todos los procesos sumadas (ver app.metricas).
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from . import config
+from .metricas import guardar_instantanea, iniciar_instantaneas, servir_metricas
+from .registro import configurar_registro
+from .simulacion import (SimuladorVectorizado, generar_masivo, registrar_simuladas,
+                         reproducir_tiempo_real)
+
+
+def repartir_estaciones(estaciones, n_fragmentos):
+    """
+    Reparte los ids de estación en 'n_fragmentos' fragmentos según
+    id % n_fragmentos, de modo que una estación siempre queda en el mismo
+    fragmento aunque cambie el orden de la lista. Se omiten los vacíos.
+    """
+    fragmentos = [[] for _ in range(n_fragmentos)]
+    for estacion in estaciones:
+        fragmentos[estacion % n_fragmentos].append(estacion)
+    return [fragmento for fragmento in fragmentos if fragmento]
+
+
+def _ejecutar_fragmento(estaciones, paso_segundos, n_pasos, inicio, semilla, ruido,
+                        tiempo_real, velocidad):
+    # Se ejecuta en el proceso hijo: el pool de conexiones se crea aquí
+    iniciar_instantaneas()
+    simulador = SimuladorVectorizado(len(estaciones), paso_segundos, inicio, semilla, ruido)
+    try:
+        if tiempo_real:
+            return reproducir_tiempo_real(simulador, n_pasos, velocidad, estaciones)
+        return generar_masivo(simulador, n_pasos, estaciones=estaciones)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        # Los hijos del pool terminan sin ejecutar atexit
+        guardar_instantanea()
+
+
+class ServicioIngesta:
+    """
+    Ejecuta la ingesta de muchas estaciones en 'procesos' procesos (por
+    defecto, uno por núcleo), un fragmento de estaciones por proceso.
+    """
+
+    def __init__(self, procesos=None, paso_segundos=30, semilla=None, ruido=1.0):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.paso_segundos = paso_segundos
+        self.semilla = semilla
+        self.ruido = ruido
+
+    def ejecutar(self, estaciones, n_pasos=None, inicio=None, tiempo_real=False, velocidad=1.0):
+        """
+        Genera y escribe 'n_pasos' pasos de todas las 'estaciones' (ids ya
+        registrados). En tiempo real, sin 'n_pasos' se ejecuta hasta
+        interrumpirse.
+
+        Returns:
+            Cantidad de filas insertadas.
+        """
+        fragmentos = repartir_estaciones(estaciones, self.procesos)
+        with ProcessPoolExecutor(max_workers=len(fragmentos)) as ejecutor:
+            futuros = [
+                ejecutor.submit(
+                    _ejecutar_fragmento, fragmento, self.paso_segundos, n_pasos, inicio,
+                    None if self.semilla is None else self.semilla + i, self.ruido,
+                    tiempo_real, velocidad,
+                )
+                for i, fragmento in enumerate(fragmentos)
+            ]
+            return sum(futuro.result() for futuro in futuros)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio de ingesta de una red de estaciones")
+    parser.add_argument("--estaciones", type=int, default=1000)
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por núcleo")
+    parser.add_argument("--dias", type=float, default=1.0, help="días de histórico en modo masivo")
+    parser.add_argument("--paso", type=int, default=30, help="segundos entre mediciones")
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--tiempo-real", action="store_true", help="ingerir al ritmo del reloj")
+    parser.add_argument("--velocidad", type=float, default=1.0)
+    parser.add_argument("--puerto-metricas", type=int, default=config.METRICAS_PUERTO,
+                        help="exponer /metrics en este puerto")
+    args = parser.parse_args()
+
+    configurar_registro()
+    if args.puerto_metricas:
+        servir_metricas(args.puerto_metricas)
+    estaciones = registrar_simuladas(args.estaciones)
+    servicio = ServicioIngesta(args.procesos, args.paso, args.semilla)
+    print(f"[INFO] {len(estaciones)} estaciones en {servicio.procesos} procesos")
+    if args.tiempo_real:
+        try:
+            servicio.ejecutar(estaciones, tiempo_real=True, velocidad=args.velocidad)
+        except KeyboardInterrupt:
+            print("Servicio de ingesta detenido por el usuario.")
+        return
+
+    n_pasos = int(args.dias * 86400 / args.paso)
+    inicio = datetime.now().replace(microsecond=0) - timedelta(days=args.dias)
+    comienzo = time.perf_counter()
+    filas = servicio.ejecutar(estaciones, n_pasos, inicio)
+    duracion = time.perf_counter() - comienzo
+    print(f"[OK] {filas} filas insertadas en {duracion:.1f} s ({filas / duracion:.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Simulador vectorizado de muchas estaciones para pruebas de carga.
+
+Genera N estaciones × T pasos de tiempo como arreglos de NumPy en una
+sola pasada: ciclos diarios de temperatura, humedad y radiación UV,
+PM2.5 y ozono autocorrelacionados (procesos AR(1)) y ruido configurable.
+
+Uso desde la línea de comandos (desde backend/):
+    python -m app.simulacion --estaciones 200 --dias 30 --semilla 1
+    python -m app.simulacion --estaciones 10 --tiempo-real
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .db import conexion, obtener_pool
+from .estaciones import registrar_estaciones
+from .ingesta import copiar_binario
+from .metricas import MEDICIONES_INGRESADAS_TOTAL
+from .registro import configurar_registro
+
+# Métricas simuladas, en el orden de cada bloque generado (las demás del
+# registro de app.esquema quedan en NULL)
+METRICAS = ("pm25_ugm3", "ozono_ppb", "intensidad_uv", "temperatura", "humedad_relativa")
+
+# Procesos AR(1) por métrica: (constante de tiempo en segundos, desviación estándar)
+PROCESOS_AR = {
+    "pm25": (3 * 3600, 0.35),        # En escala logarítmica
+    "ozono": (2 * 3600, 4.0),        # ppb
+    "temperatura": (3600, 0.8),      # °C
+    "humedad": (2 * 3600, 4.0),      # %
+}
+
+# Pasos por bloque en el cálculo de los procesos AR(1)
+_BLOQUE_AR = 256
+
+
+def _matriz_ar(phi, bloque):
+    # L[i, j] = phi^(i - j) para j <= i: aplica la recursión AR(1) a un
+    # bloque completo de innovaciones con un solo producto de matrices
+    k = np.arange(bloque)
+    diferencia = k[:, None] - k[None, :]
+    return np.where(diferencia >= 0, phi ** np.maximum(diferencia, 0), 0.0)
+
+
+class SimuladorVectorizado:
+    """
+    Generador de series sintéticas para 'n_estaciones' estaciones con un
+    paso de 'paso_segundos'. Cada llamada a generar() continúa la serie
+    donde terminó la anterior, por lo que se puede producir el histórico
+    en bloques de memoria acotada.
+
+    'ruido' escala la variabilidad de los procesos AR(1) y del ruido de
+    medición; con la misma 'semilla' la salida es reproducible.
+    """
+
+    def __init__(self, n_estaciones, paso_segundos=30, inicio=None, semilla=None, ruido=1.0):
+        self.n_estaciones = n_estaciones
+        self.paso_segundos = paso_segundos
+        self.ruido = ruido
+        self.rng = np.random.default_rng(semilla)
+        inicio = inicio or datetime.now().replace(microsecond=0)
+        self.instante = np.datetime64(inicio, "us")
+
+        # Parámetros fijos de cada estación
+        rng = self.rng
+        self._temperatura_media = rng.uniform(16, 26, n_estaciones)
+        self._temperatura_amplitud = rng.uniform(3, 7, n_estaciones)
+        self._uv_pico = rng.uniform(0.8, 1.5, n_estaciones)
+        self._pm25_base = rng.uniform(12, 35, n_estaciones)
+        self._ozono_base = rng.uniform(15, 30, n_estaciones)
+
+        # Estado de los procesos AR(1) y matrices de cada proceso
+        self._estado = {}
+        self._procesos = {}
+        for nombre, (tau, sigma) in PROCESOS_AR.items():
+            phi = np.exp(-paso_segundos / tau)
+            sigma = sigma * ruido
+            self._procesos[nombre] = (phi, sigma, _matriz_ar(phi, _BLOQUE_AR), phi ** np.arange(1, _BLOQUE_AR + 1))
+            self._estado[nombre] = rng.standard_normal(n_estaciones) * sigma
+
+    def _ar1(self, nombre, n_pasos):
+        phi, sigma, matriz, potencias = self._procesos[nombre]
+        # Innovaciones escaladas para que la varianza estacionaria sea sigma²
+        innovaciones = self.rng.standard_normal((n_pasos, self.n_estaciones)) * (sigma * np.sqrt(1 - phi ** 2))
+        serie = np.empty_like(innovaciones)
+        previo = self._estado[nombre]
+        for inicio in range(0, n_pasos, _BLOQUE_AR):
+            bloque = innovaciones[inicio:inicio + _BLOQUE_AR]
+            m = len(bloque)
+            serie[inicio:inicio + m] = matriz[:m, :m] @ bloque + np.outer(potencias[:m], previo)
+            previo = serie[inicio + m - 1]
+        self._estado[nombre] = previo
+        return serie
+
+    def generar(self, n_pasos):
+        """
+        Genera los siguientes 'n_pasos' pasos de todas las estaciones.
+
+        Returns:
+            Tupla (fecha_hora, valores): arreglo datetime64 de n_pasos
+            instantes y matriz float32 (n_pasos, n_estaciones, 5) con las
+            métricas en el orden de METRICAS.
+        """
+        paso = np.timedelta64(self.paso_segundos, "s")
+        fecha_hora = self.instante + paso * np.arange(n_pasos)
+        self.instante = fecha_hora[-1] + paso
+
+        segundos_del_dia = (fecha_hora.astype("datetime64[s]").astype(np.int64) % 86400)
+        hora = (segundos_del_dia / 3600.0)[:, None]
+
+        # Temperatura: máximo a las 15 h y mínimo a las 3 h
+        temperatura = (
+            self._temperatura_media
+            + self._temperatura_amplitud * np.cos(2 * np.pi * (hora - 15) / 24)
+            + self._ar1("temperatura", n_pasos)
+        )
+        # Humedad: inversa a la temperatura
+        humedad = np.clip(
+            60 - 2.0 * (temperatura - self._temperatura_media) + self._ar1("humedad", n_pasos), 5, 100
+        )
+        # UV: campana entre las 6 h y las 18 h, cero de noche
+        sol = np.clip(np.sin(np.pi * (hora - 6) / 12), 0, None)
+        uv = sol * self._uv_pico
+        # PM2.5: log-normal con picos de tráfico a las 8 h y 19 h
+        trafico = 1 + 0.4 * np.exp(-((hora - 8) ** 2) / 2) + 0.5 * np.exp(-((hora - 19) ** 2) / 3)
+        pm25 = self._pm25_base * trafico * np.exp(self._ar1("pm25", n_pasos))
+        # Ozono: fotoquímico, sube con la radiación UV
+        ozono = np.clip(self._ozono_base * (0.6 + 0.8 * sol) + self._ar1("ozono", n_pasos), 0, None)
+
+        valores = np.stack([pm25, ozono, uv, temperatura, humedad], axis=-1).astype(np.float32)
+        # Ruido de medición blanco, proporcional a cada valor
+        valores *= 1 + np.float32(0.02 * self.ruido) * self.rng.standard_normal(valores.shape, dtype=np.float32)
+        np.clip(valores, 0, None, out=valores)
+        return fecha_hora, valores
+
+
+def generar_masivo(simulador, n_pasos, pasos_por_bloque=2000, estaciones=None, pool=None):
+    """
+    Genera 'n_pasos' pasos lo más rápido posible y los escribe en la base
+    de datos con COPY binario, un bloque por transacción.
+
+    'estaciones' es la lista de ids de estación de cada columna del
+    simulador; sin ella todas las filas son de la estación por defecto.
+
+    Returns:
+        Cantidad de filas insertadas.
+    """
+    pool = pool or obtener_pool()
+    filas = 0
+    for inicio in range(0, n_pasos, pasos_por_bloque):
+        pasos = min(pasos_por_bloque, n_pasos - inicio)
+        fecha_hora, valores = simulador.generar(pasos)
+        with pool.conexion() as conn:
+            _copiar_pasos(conn, fecha_hora, valores, estaciones)
+        filas += pasos * simulador.n_estaciones
+        MEDICIONES_INGRESADAS_TOTAL.incrementar(pasos * simulador.n_estaciones, origen="simulacion")
+    return filas
+
+
+def _copiar_pasos(conn, fecha_hora, valores, estaciones):
+    # Una fila por estación y paso, en orden de tiempo
+    n_pasos, n_estaciones = valores.shape[:2]
+    fecha_hora = np.repeat(fecha_hora, n_estaciones)
+    valores = valores.reshape(-1, len(METRICAS))
+    if estaciones is None:
+        copiar_binario(conn, fecha_hora, valores, METRICAS)
+    else:
+        copiar_binario(conn, fecha_hora, valores, METRICAS, estacion_id=np.tile(
+            np.asarray(estaciones, dtype=np.int32), n_pasos))
+
+
+def reproducir_tiempo_real(simulador, n_pasos=None, velocidad=1.0, estaciones=None,
+                           edad_maxima=1.0, pool=None):
+    """
+    Reproduce la simulación al ritmo del reloj: cada paso se genera
+    cuando llega su instante (acelerado por 'velocidad'). Los pasos se
+    acumulan y se escriben juntos con un COPY binario cuando el más
+    antiguo supera 'edad_maxima' segundos. Sin 'n_pasos' se ejecuta
+    hasta interrumpirse.
+
+    Returns:
+        Cantidad de filas insertadas.
+    """
+    pool = pool or obtener_pool()
+    simulador.instante = np.datetime64(datetime.now().replace(microsecond=0), "us")
+    pausa = simulador.paso_segundos / velocidad
+    proximo = time.monotonic()
+    pendientes = []
+    limite = None
+    filas = 0
+    paso = 0
+    try:
+        while n_pasos is None or paso < n_pasos:
+            pendientes.append(simulador.generar(1))
+            if limite is None:
+                limite = time.monotonic() + edad_maxima
+            paso += 1
+            proximo += pausa
+            # Escribir si el próximo paso llegaría después del límite
+            if max(proximo, time.monotonic()) >= limite:
+                filas += _escribir_pendientes(pool, pendientes, estaciones)
+                pendientes, limite = [], None
+            time.sleep(max(0.0, proximo - time.monotonic()))
+    finally:
+        filas += _escribir_pendientes(pool, pendientes, estaciones)
+    return filas
+
+
+def _escribir_pendientes(pool, pendientes, estaciones):
+    if not pendientes:
+        return 0
+    fecha_hora = np.concatenate([f for f, _ in pendientes])
+    valores = np.concatenate([v for _, v in pendientes])
+    with pool.conexion() as conn:
+        _copiar_pasos(conn, fecha_hora, valores, estaciones)
+    MEDICIONES_INGRESADAS_TOTAL.incrementar(valores.shape[0] * valores.shape[1], origen="simulacion")
+    return valores.shape[0] * valores.shape[1]
+
+
+def registrar_simuladas(n_estaciones, prefijo="sim"):
+    """
+    Registra las estaciones simuladas '<prefijo>-0000', '<prefijo>-0001',
+    ... y devuelve sus ids en ese orden.
+    """
+    codigos = [f"{prefijo}-{i:04d}" for i in range(n_estaciones)]
+    with conexion() as conn, conn.cursor() as cursor:
+        ids = registrar_estaciones(cursor, codigos)
+    return [ids[codigo] for codigo in codigos]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador vectorizado de estaciones")
+    parser.add_argument("--estaciones", type=int, default=100)
+    parser.add_argument("--dias", type=float, default=1.0, help="días de histórico en modo masivo")
+    parser.add_argument("--paso", type=int, default=30, help="segundos entre mediciones")
+    parser.add_argument("--semilla", type=int, default=None)
+    parser.add_argument("--ruido", type=float, default=1.0)
+    parser.add_argument("--tiempo-real", action="store_true", help="reproducir al ritmo del reloj")
+    parser.add_argument("--velocidad", type=float, default=1.0)
+    args = parser.parse_args()
+
+    configurar_registro()
+    estaciones = registrar_simuladas(args.estaciones)
+    if args.tiempo_real:
+        simulador = SimuladorVectorizado(args.estaciones, args.paso, semilla=args.semilla, ruido=args.ruido)
+        try:
+            reproducir_tiempo_real(simulador, velocidad=args.velocidad, estaciones=estaciones)
+        except KeyboardInterrupt:
+            print("Simulador detenido por el usuario.")
+        return
+
+    n_pasos = int(args.dias * 86400 / args.paso)
+    inicio = datetime.now().replace(microsecond=0) - timedelta(days=args.dias)
+    simulador = SimuladorVectorizado(args.estaciones, args.paso, inicio, args.semilla, args.ruido)
+    comienzo = time.perf_counter()
+    filas = generar_masivo(simulador, n_pasos, estaciones=estaciones)
+    duracion = time.perf_counter() - comienzo
+    print(f"[OK] {filas} filas insertadas en {duracion:.1f} s ({filas / duracion:.0f} filas/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,68 +1,131 @@
+import logging
 import random
 import time
-from .db import get_connection
+from datetime import datetime
+
+import psycopg2
+
+from . import config
+from .db import conexion
+from .alertas import crear_callback_alertas
+from .buffer_local import BufferLocal, CargadorBuffer
+from .calibracion import crear_tabla_calibraciones, obtener_coeficientes
+from .esquema import SQL_INSERTAR, fila_desde_valores, verificar_esquema
+from .estaciones import ESTACION_POR_DEFECTO
+from .ingesta import EscritorMediciones
+from .metricas import servir_metricas
+from .registro import configurar_registro
 from .sensores import EstacionMeteorologica
 
+logger = logging.getLogger(__name__)
+
 def generar_dato_sintetico():
     """
-    Genera un conjunto de valores simulados con menor varianza.
+    Genera un conjunto de valores simulados con menor varianza, en el
+    orden de app.esquema.METRICAS (las métricas no simuladas quedan en None).
     """
-    pm25_ugm3 = round(random.uniform(10, 50), 2)          # μg/m3
-    ozono_ppb = round(random.uniform(20, 40), 2)          # ppb
-    intensidad_uv = round(random.uniform(0.5, 1.5), 2)    # mW/cm2
-    temperatura = round(random.uniform(20, 30), 2)        # °C
-    humedad_relativa = round(random.uniform(40, 70), 2)   # %
-    return (pm25_ugm3, ozono_ppb, intensidad_uv, temperatura, humedad_relativa)
+    return fila_desde_valores({
+        "pm25_ugm3": round(random.uniform(10, 50), 2),          # μg/m3
+        "ozono_ppb": round(random.uniform(20, 40), 2),          # ppb
+        "intensidad_uv": round(random.uniform(0.5, 1.5), 2),    # mW/cm2
+        "temperatura": round(random.uniform(20, 30), 2),        # °C
+        "humedad_relativa": round(random.uniform(40, 70), 2),   # %
+    })
+
+# Los módulos de las tablas derivadas se importan en la primera escritura
+# (app.indices carga NumPy), así la primera muestra no los espera
+def _refrescar_agregados(lote):
+    from .agregados import refrescar_agregados
+    refrescar_agregados()
+
+def _refrescar_indices(lote):
+    from .indices import refrescar_indices
+    refrescar_indices()
 
 def insertar_dato(conn, datos):
     """
     Inserta el registro generado en la tabla.
     """
     with conn.cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO mediciones 
-            (pm25_ugm3, ozono_ppb, intensidad_uv, temperatura, humedad_relativa)
-            VALUES (%s, %s, %s, %s, %s)
-        """, datos)
+        cursor.execute(SQL_INSERTAR, (ESTACION_POR_DEFECTO, datetime.now(), *datos))
         conn.commit()
 
-def run_simulador(intervalo_segundos=30):
+def run_simulador(intervalo_segundos=30, ruta_buffer=None):
     """
     Corre el bucle de simulación periódica usando la nueva estructura de clases
+
+    Con 'ruta_buffer' las mediciones se guardan primero en un buffer local
+    SQLite y se suben en segundo plano, por lo que el muestreo continúa
+    aunque la base de datos no esté disponible.
     """
-    estacion = EstacionMeteorologica()
-    print(f"[INFO] Estación meteorológica inicializada: {estacion.obtener_estado_estacion()}")
+    # Detener el arranque si la tabla no tiene las columnas del registro.
+    # Sin conexión (buffer local) se calibra con los coeficientes de
+    # fábrica; los valores crudos se guardan y se pueden recalibrar después
+    coeficientes = None
+    if ruta_buffer is None:
+        verificar_esquema()
+        crear_tabla_calibraciones()
+        coeficientes = obtener_coeficientes(ESTACION_POR_DEFECTO)
+    # Tras cada lote escrito se actualizan los agregados de forma
+    # incremental junto con los índices AQI y UV, y se buscan umbrales
+    # superados y anomalías
+    al_escribir = [_refrescar_agregados, _refrescar_indices, crear_callback_alertas()]
+    if ruta_buffer is not None:
+        escritor = BufferLocal(ruta_buffer)
+        cargador = CargadorBuffer(escritor, al_subir=al_escribir)
+    else:
+        escritor = EscritorMediciones(al_vaciar=al_escribir)
+        cargador = None
+    estacion = EstacionMeteorologica(escritor=escritor, coeficientes=coeficientes)
+    logger.info("Estación meteorológica inicializada: %s", estacion.obtener_estado_estacion())
     
     try:
         while True:
-            # Usar la nueva estructura de clases
-            if estacion.guardar_mediciones():
-                mediciones = estacion.obtener_medicion_completa()
-                print(f"[OK] Mediciones guardadas: PM2.5={mediciones[0]}, O3={mediciones[1]}, UV={mediciones[2]}, T={mediciones[3]}°C, H={mediciones[4]}%")
+            # Los coeficientes guardados desde otro proceso se aplican al
+            # vencer la caché de app.calibracion
+            if ruta_buffer is None:
+                try:
+                    estacion.coeficientes = obtener_coeficientes(ESTACION_POR_DEFECTO)
+                except psycopg2.Error:
+                    # Ya registrado; se siguen usando los coeficientes anteriores
+                    pass
+            # Una sola lectura por ciclo: lo que se muestra es lo que se guarda
+            medicion = estacion.tomar_medicion()
+            if estacion.guardar_mediciones(medicion):
+                logger.info("Mediciones guardadas: PM2.5=%s, O3=%s, UV=%s, T=%s°C, H=%s%%",
+                            medicion.pm25_ugm3, medicion.ozono_ppb, medicion.intensidad_uv,
+                            medicion.temperatura, medicion.humedad_relativa)
             else:
-                print("[ERROR] No se pudieron guardar las mediciones")
+                logger.error("No se pudieron guardar las mediciones")
             
             time.sleep(intervalo_segundos)
     except KeyboardInterrupt:
-        print("Simulador detenido por el usuario.")
+        logger.info("Simulador detenido por el usuario.")
     except Exception as e:
-        print(f"Error en el simulador: {e}")
+        logger.exception("Error en el simulador: %s", e)
+    finally:
+        # Escribir las mediciones que queden en el buffer
+        if cargador is not None:
+            cargador.cerrar()
+        escritor.cerrar()
+        estacion.cerrar()
 
 def run_simulador_legacy(intervalo_segundos=30):
     """
     Versión legacy del simulador (método anterior)
     """
-    conn = get_connection()
     try:
         while True:
             datos = generar_dato_sintetico()
-            insertar_dato(conn, datos)
-            print(f"[OK] Insertado: {datos}")
+            with conexion() as conn:
+                insertar_dato(conn, datos)
+            logger.info("Insertado: %s", datos)
             time.sleep(intervalo_segundos)
     except KeyboardInterrupt:
-        print("Simulador detenido por el usuario.")
-    finally:
-        conn.close()
+        logger.info("Simulador detenido por el usuario.")
 
 if __name__ == "__main__":
+    configurar_registro()
+    if config.METRICAS_PUERTO:
+        servir_metricas(config.METRICAS_PUERTO)
     run_simulador()
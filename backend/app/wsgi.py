@@ -0,0 +1,13 @@
+"""
+Punto de entrada WSGI de la API para servidores de producción.
+
+Desde backend/:
+    gunicorn -c gunicorn.conf.py app.wsgi:app
+"""
+from .api import app
+from .esquema import verificar_esquema
+from .registro import configurar_registro
+
+configurar_registro()
+# Falla al cargar la aplicación si la tabla no coincide con app.esquema
+verificar_esquema()
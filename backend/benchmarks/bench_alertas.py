@@ -0,0 +1,40 @@
+"""
+Mide el costo por muestra de DetectorAnomalias con miles de series
+simultáneas (no requiere base de datos):
+
+    python -m benchmarks.bench_alertas --series 5000 --muestras 200
+"""
+import argparse
+import random
+import time
+from datetime import datetime
+
+from app.alertas import DetectorAnomalias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--series", type=int, default=5000)
+    parser.add_argument("--muestras", type=int, default=200, help="muestras por serie")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    detector = DetectorAnomalias()
+    fecha_hora = datetime.now()
+    series = [f"estacion-{i}" for i in range(args.series)]
+    valores = [rng.gauss(30, 5) for _ in range(1000)]
+
+    eventos = []
+    inicio = time.perf_counter()
+    for paso in range(args.muestras):
+        valor = valores[paso % len(valores)]
+        for serie in series:
+            detector.procesar(serie, "pm25_ugm3", valor, fecha_hora, eventos)
+    duracion = time.perf_counter() - inicio
+    total = args.series * args.muestras
+    print(f"{total} muestras de {args.series} series: {duracion / total * 1e6:.2f} µs/muestra "
+          f"({total / duracion:,.0f} muestras/s, {len(eventos)} eventos)")
+
+
+if __name__ == "__main__":
+    main()
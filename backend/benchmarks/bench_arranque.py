@@ -0,0 +1,108 @@
+"""
+Mide el arranque de los puntos de entrada en procesos nuevos: el tiempo
+de importación de cada módulo según python -X importtime (y cuánto de
+él se va en psycopg2, NumPy y Flask) y el tiempo desde que arranca el
+intérprete hasta la primera muestra de la estación o la primera
+respuesta de la API (no requiere base de datos):
+
+    python -m benchmarks.bench_arranque --repeticiones 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Directorio backend/, desde donde se importa el paquete app
+DIRECTORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos de entrada de los procesos del sistema
+ENTRADAS = ("app.sensores", "app.esquema", "app.simulador", "app.api", "app.api_async")
+
+# Dependencias pesadas cuyo costo de importación se informa aparte
+PESADAS = ("psycopg2", "numpy", "flask", "werkzeug")
+
+PRIMERA_MUESTRA = """
+from app.sensores import EstacionMeteorologica
+estacion = EstacionMeteorologica()
+estacion.tomar_medicion()
+estacion.cerrar()
+"""
+
+PRIMERA_PETICION = """
+from app.api import app
+respuesta = app.test_client().get({ruta!r})
+assert respuesta.status_code == 200, respuesta.status_code
+"""
+
+
+def tiempos_importacion(modulo):
+    """
+    Importa 'modulo' en un intérprete nuevo con -X importtime.
+
+    Returns:
+        Diccionario módulo -> tiempo acumulado de su importación en µs,
+        con todos los módulos que cargó (incluido 'modulo').
+    """
+    proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+                             cwd=DIRECTORIO, capture_output=True, text=True, check=True)
+    tiempos = {}
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        _, acumulado, paquete = linea[len("import time:"):].split("|")
+        tiempos[paquete.strip()] = int(acumulado)
+    return tiempos
+
+
+def segundos_proceso(codigo):
+    """
+    Segundos de pared de un intérprete nuevo que ejecuta 'codigo'.
+    """
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, "-c", codigo], cwd=DIRECTORIO, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - inicio
+
+
+def medir(repeticiones, ruta="/metrics"):
+    """
+    Returns:
+        (importaciones, procesos): importaciones es modulo -> (ms de la
+        importación, {dependencia pesada cargada: ms}) y procesos
+        nombre -> ms, con la mediana de 'repeticiones' ejecuciones.
+    """
+    importaciones = {}
+    for modulo in ENTRADAS:
+        corridas = [tiempos_importacion(modulo) for _ in range(repeticiones)]
+        total = statistics.median(tiempos[modulo] for tiempos in corridas) / 1000
+        pesadas = {paquete: statistics.median(tiempos[paquete] for tiempos in corridas) / 1000
+                   for paquete in PESADAS if paquete in corridas[0]}
+        importaciones[modulo] = (total, pesadas)
+    codigos = {
+        "interprete": "pass",
+        "primera_muestra": PRIMERA_MUESTRA,
+        "primera_peticion": PRIMERA_PETICION.format(ruta=ruta),
+    }
+    procesos = {nombre: statistics.median(segundos_proceso(codigo) for _ in range(repeticiones)) * 1000
+                for nombre, codigo in codigos.items()}
+    return importaciones, procesos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--ruta", default="/metrics", help="ruta de la primera petición a la API")
+    args = parser.parse_args()
+
+    importaciones, procesos = medir(args.repeticiones, args.ruta)
+    for modulo, (total, pesadas) in importaciones.items():
+        detalle = ", ".join(f"{paquete} {ms:.0f} ms" for paquete, ms in pesadas.items()) or "-"
+        print(f"import {modulo:<16} {total:7.1f} ms  ({detalle})")
+    for nombre, ms in procesos.items():
+        print(f"{nombre:<23} {ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
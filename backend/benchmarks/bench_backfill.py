@@ -0,0 +1,81 @@
+"""
+Mide la carga masiva de app.backfill sobre un CSV sintético de una
+estación (una medición cada 30 s, con una fracción de líneas inválidas y
+repetidas) y la vuelve a ejecutar sobre el mismo archivo para medir el
+caso idempotente, en que no se inserta nada.
+
+Requiere un PostgreSQL local configurado según app.db.DB_CONFIG. Las
+filas y la estación 'bench-backfill' se borran al terminar:
+
+    python -m benchmarks.bench_backfill --filas 1000000 --procesos 2
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.backfill import backfill
+from app.db import conexion
+
+ESTACION = "bench-backfill"
+
+# Inicio de la serie, fuera de los rangos de los demás benchmarks
+INICIO = datetime(1973, 1, 1)
+
+
+def csv_sintetico(ruta, filas, invalidas=0.001, repetidas=0.001, semilla=0):
+    """
+    Escribe 'filas' líneas con fecha_hora y cinco métricas; una fracción
+    'invalidas' tiene un valor no numérico y una fracción 'repetidas'
+    repite la fecha_hora de la línea anterior.
+    """
+    rng = np.random.default_rng(semilla)
+    fecha_hora = np.datetime64(INICIO, "s") + np.arange(filas) * 30
+    repetir = np.flatnonzero(rng.random(filas) < repetidas)
+    fecha_hora[repetir[repetir > 0]] = fecha_hora[repetir[repetir > 0] - 1]
+    columnas = [np.datetime_as_string(fecha_hora)]
+    for bajo, alto in ((5, 80), (10, 60), (0, 1.2), (15, 30), (30, 90)):
+        columnas.append(np.char.mod("%.2f", rng.uniform(bajo, alto, filas)))
+    columnas[1][rng.random(filas) < invalidas] = "error"
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write("fecha_hora,pm25_ugm3,ozono_ppb,intensidad_uv,temperatura,humedad_relativa\n")
+        for inicio in range(0, filas, 100000):
+            bloque = [",".join(campos) for campos in zip(*(c[inicio:inicio + 100000] for c in columnas))]
+            archivo.write("\n".join(bloque) + "\n")
+
+
+def limpiar():
+    with conexion() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM mediciones WHERE estacion_id = (SELECT id FROM estaciones WHERE codigo = %s)",
+                       (ESTACION,))
+        cursor.execute("DELETE FROM estaciones WHERE codigo = %s", (ESTACION,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filas", type=int, default=1000000)
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por núcleo")
+    parser.add_argument("--filas-por-bloque", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "registro.csv")
+        csv_sintetico(ruta, args.filas)
+        try:
+            for nombre, reiniciar in (("primera carga", False), ("repetida", True)):
+                inicio = time.perf_counter()
+                progreso = backfill(ruta, ESTACION, args.procesos, args.filas_por_bloque,
+                                    reiniciar=reiniciar)
+                duracion = time.perf_counter() - inicio
+                print(f"{nombre:<14} {progreso.leidas / duracion:10.0f} filas/s "
+                      f"({progreso.insertadas} insertadas, {progreso.rechazadas} rechazadas, "
+                      f"{duracion:.1f} s)")
+        finally:
+            limpiar()
+
+
+if __name__ == "__main__":
+    main()
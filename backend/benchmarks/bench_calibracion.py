@@ -0,0 +1,54 @@
+"""
+Compara el costo de calibrar un año de muestras crudas (una cada 30 s)
+fila por fila con calibrar_lecturas y en bloque con calibrar_arreglos
+(no requiere base de datos):
+
+    python -m benchmarks.bench_calibracion --muestras 1051200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.calibracion import COEFICIENTES_POR_DEFECTO, calibrar_arreglos, calibrar_lecturas
+
+# Muestras de un año con una medición cada 30 s
+MUESTRAS_ANIO = 365 * 24 * 120
+
+
+def muestras_sinteticas(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return (rng.uniform(3000, 4000, n), rng.uniform(0, 1500, n),
+            rng.uniform(15, 30, n), rng.uniform(30, 80, n))
+
+
+def por_fila(ozono_mv, uv_mv, temperatura, humedad):
+    for o, u, t, h in zip(ozono_mv.tolist(), uv_mv.tolist(), temperatura.tolist(), humedad.tolist()):
+        calibrar_lecturas({"ozono": {"ozono_mv": o}, "uv": {"uv_mv": u},
+                           "clima": {"temperatura": t, "humedad_relativa": h}}, COEFICIENTES_POR_DEFECTO)
+
+
+def en_bloque(ozono_mv, uv_mv, temperatura, humedad):
+    calibrar_arreglos(ozono_mv, uv_mv, temperatura, humedad, COEFICIENTES_POR_DEFECTO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--muestras", type=int, default=MUESTRAS_ANIO)
+    parser.add_argument("--muestras-por-fila", type=int, default=100000,
+                        help="muestras medidas fila por fila (el resultado se escala)")
+    args = parser.parse_args()
+
+    datos = muestras_sinteticas(args.muestras)
+    inicio = time.perf_counter()
+    por_fila(*(arreglo[:args.muestras_por_fila] for arreglo in datos))
+    fila = (time.perf_counter() - inicio) * args.muestras / min(args.muestras_por_fila, args.muestras)
+    inicio = time.perf_counter()
+    en_bloque(*datos)
+    bloque = time.perf_counter() - inicio
+    print(f"{args.muestras} muestras: fila por fila {fila:.2f} s (estimado), "
+          f"en bloque {bloque:.3f} s (x{fila / bloque:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Prueba de carga de la API: levanta el servidor de producción con 1 y N
+procesos y reporta peticiones por segundo y percentiles de latencia.
+
+Requiere un PostgreSQL local configurado según app.db.DB_CONFIG, gunicorn
+(servidor WSGI, app.wsgi) y uvicorn (servidor ASGI, app.api_async):
+
+    python -m benchmarks.bench_carga --servidor wsgi --trabajadores 1 4 --duracion 10
+    python -m benchmarks.bench_carga --servidor asgi --ruta "/mediciones?limite=100" --variar
+"""
+import argparse
+import http.client
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+# Puerto local en el que se levanta el servidor del benchmark
+PUERTO_BENCHMARK = 5099
+
+
+def comando_servidor(servidor, trabajadores):
+    if servidor == "wsgi":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--log-level", "warning",
+                "app.wsgi:app"]
+    return [sys.executable, "-m", "uvicorn", "app.api_async:app", "--host", "127.0.0.1",
+            "--port", str(PUERTO_BENCHMARK), "--workers", str(trabajadores),
+            "--log-level", "warning"]
+
+
+def esperar_puerto(proceso, puerto, timeout=30.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite and proceso.poll() is None:
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en el puerto {puerto}")
+
+
+def cliente(ruta, variar, hasta, latencias, errores, contador):
+    # Una conexión keep-alive por cliente, como un navegador
+    conexion = http.client.HTTPConnection("127.0.0.1", PUERTO_BENCHMARK, timeout=30)
+    separador = "&" if "?" in ruta else "?"
+    while time.monotonic() < hasta:
+        # Con 'variar' cada petición tiene otra clave y no la resuelve la caché
+        destino = f"{ruta}{separador}_n={next(contador)}" if variar else ruta
+        inicio = time.perf_counter()
+        try:
+            conexion.request("GET", destino)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 400:
+                errores.append(respuesta.status)
+        except (OSError, http.client.HTTPException):
+            errores.append(None)
+            conexion.close()
+            continue
+        latencias.append(time.perf_counter() - inicio)
+    conexion.close()
+
+
+def medir(servidor, trabajadores, ruta, concurrencia, duracion, variar):
+    entorno = {**os.environ, "API_TRABAJADORES": str(trabajadores), "API_HOST": "127.0.0.1",
+               "API_PUERTO": str(PUERTO_BENCHMARK), "API_HILOS": str(max(1, concurrencia))}
+    proceso = subprocess.Popen(comando_servidor(servidor, trabajadores), env=entorno,
+                               stdout=subprocess.DEVNULL)
+    try:
+        esperar_puerto(proceso, PUERTO_BENCHMARK)
+        # Calentamiento: abre los pools de conexiones de los procesos
+        cliente(ruta, variar, time.monotonic() + 1.0, [], [], itertools.count())
+
+        latencias, errores = [], []
+        contador = itertools.count()
+        hasta = time.monotonic() + duracion
+        hilos = [threading.Thread(target=cliente, args=(ruta, variar, hasta, latencias, errores, contador))
+                 for _ in range(concurrencia)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        total = time.perf_counter() - inicio
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+    p50, p95, p99 = (np.percentile(latencias, [50, 95, 99]) * 1000) if latencias else (0, 0, 0)
+    print(f"{servidor} {trabajadores:>2} procesos {len(latencias) / total:9.0f} pet/s  "
+          f"p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  errores {len(errores)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--servidor", choices=("wsgi", "asgi"), default="wsgi")
+    parser.add_argument("--trabajadores", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--ruta", default="/mediciones?limite=100")
+    parser.add_argument("--concurrencia", type=int, default=16, help="clientes simultáneos")
+    parser.add_argument("--duracion", type=float, default=10.0, help="segundos por medición")
+    parser.add_argument("--variar", action="store_true", help="evitar la caché de respuestas")
+    args = parser.parse_args()
+
+    for trabajadores in args.trabajadores:
+        medir(args.servidor, trabajadores, args.ruta, args.concurrencia, args.duracion, args.variar)
+
+
+if __name__ == "__main__":
+    main()
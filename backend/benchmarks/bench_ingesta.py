@@ -0,0 +1,61 @@
+"""
+Compara filas por segundo entre el camino actual (un INSERT y un commit
+por muestra) y EscritorMediciones (lotes con COPY).
+
+Requiere un PostgreSQL local configurado según app.db.DB_CONFIG. Las
+filas insertadas se borran al terminar:
+
+    python -m benchmarks.bench_ingesta --filas 20000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from app.db import conexion
+from app.esquema import SQL_INSERTAR
+from app.estaciones import ESTACION_POR_DEFECTO
+from app.ingesta import EscritorMediciones
+from app.simulador import generar_dato_sintetico
+
+# Marca de tiempo de las filas del benchmark, para poder borrarlas
+FECHA_BENCHMARK = datetime(1970, 1, 1)
+
+
+def por_fila(filas):
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            for _ in range(filas):
+                cursor.execute(SQL_INSERTAR, (ESTACION_POR_DEFECTO, FECHA_BENCHMARK,
+                                              *generar_dato_sintetico()))
+                conn.commit()
+
+
+def por_lotes(filas, tamano_lote):
+    with EscritorMediciones(tamano_lote=tamano_lote) as escritor:
+        for _ in range(filas):
+            escritor.agregar(generar_dato_sintetico(), fecha_hora=FECHA_BENCHMARK)
+
+
+def medir(nombre, funcion, filas, *args):
+    inicio = time.perf_counter()
+    funcion(filas, *args)
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<22} {filas / duracion:10.0f} filas/s ({duracion:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filas", type=int, default=10000)
+    parser.add_argument("--tamano-lote", type=int, default=1000)
+    args = parser.parse_args()
+
+    try:
+        medir("INSERT por fila", por_fila, args.filas)
+        medir("COPY por lotes", por_lotes, args.filas, args.tamano_lote)
+    finally:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM mediciones WHERE fecha_hora = %s", (FECHA_BENCHMARK,))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Mide el decodificador de tramas del PMS5003 sobre una grabación
+sintética reproducida con DispositivoReproducido, frente a un
+decodificador que copia cada trama a un objeto bytes (no requiere el
+sensor ni base de datos):
+
+    python -m benchmarks.bench_pms5003 --tramas 100000 --corruptas 0.01
+"""
+import argparse
+import random
+import struct
+import time
+
+from app.pms5003 import (CABECERA, LARGO_DATOS, LARGO_TRAMA, DecodificadorPMS5003,
+                         DispositivoReproducido, armar_trama)
+
+
+def grabacion_sintetica(tramas, corruptas=0.01, semilla=0):
+    """
+    Bytes de 'tramas' tramas con valores aleatorios; una fracción
+    'corruptas' tiene un byte alterado y va precedida de bytes sueltos,
+    como tras una reconexión del puerto.
+    """
+    rng = random.Random(semilla)
+    partes = []
+    for _ in range(tramas):
+        pm25 = rng.randint(5, 80)
+        trama = armar_trama(pm25 * 2 // 3, pm25, pm25 * 3 // 2,
+                            [rng.randint(0, 3000) for _ in range(6)])
+        if rng.random() < corruptas:
+            partes.append(bytes(rng.randrange(256) for _ in range(rng.randint(1, 8))))
+            alterada = bytearray(trama)
+            alterada[rng.randint(4, LARGO_TRAMA - 1)] ^= 0x5A
+            trama = bytes(alterada)
+        partes.append(trama)
+    return b"".join(partes)
+
+
+def decodificar_copiando(datos, tamano_bloque):
+    """
+    Referencia: lee el puerto con read(), acumula los bytes en un objeto
+    bytes y copia cada trama.
+    """
+    trama_struct = struct.Struct(">2xH13HH")
+    dispositivo = DispositivoReproducido(datos, tamano_bloque=tamano_bloque)
+    pendiente = b""
+    validas = 0
+    while True:
+        leidos = dispositivo.read(tamano_bloque)
+        if not leidos:
+            return validas
+        pendiente += leidos
+        while len(pendiente) >= LARGO_TRAMA:
+            posicion = pendiente.find(CABECERA)
+            if posicion < 0:
+                pendiente = pendiente[-1:]
+                break
+            pendiente = pendiente[posicion:]
+            if len(pendiente) < LARGO_TRAMA:
+                break
+            trama = pendiente[:LARGO_TRAMA]
+            valores = trama_struct.unpack(trama)
+            if valores[0] == LARGO_DATOS and valores[14] == sum(trama[:-2]):
+                validas += 1
+                pendiente = pendiente[LARGO_TRAMA:]
+            else:
+                pendiente = pendiente[1:]
+
+
+def decodificar_en_el_lugar(datos, tamano_bloque):
+    decodificador = DecodificadorPMS5003()
+    dispositivo = DispositivoReproducido(datos, tamano_bloque=tamano_bloque)
+    while decodificador.leer_de(dispositivo)[0]:
+        pass
+    return decodificador.tramas_validas
+
+
+def medir(funcion, datos, tamano_bloque):
+    inicio = time.process_time()
+    validas = funcion(datos, tamano_bloque)
+    return time.process_time() - inicio, validas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tramas", type=int, default=100000)
+    parser.add_argument("--corruptas", type=float, default=0.01, help="fracción de tramas corruptas")
+    parser.add_argument("--bloque", type=int, default=4096, help="bytes por lectura del puerto")
+    args = parser.parse_args()
+
+    datos = grabacion_sintetica(args.tramas, args.corruptas)
+    for nombre, funcion in (("copiando tramas", decodificar_copiando),
+                            ("en el lugar", decodificar_en_el_lugar)):
+        segundos, validas = medir(funcion, datos, args.bloque)
+        print(f"{nombre:<16} {segundos / args.tramas * 1e6:6.2f} µs/trama "
+              f"({args.tramas / segundos:,.0f} tramas/s, {validas} válidas)")
+
+
+if __name__ == "__main__":
+    main()
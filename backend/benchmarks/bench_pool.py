@@ -0,0 +1,59 @@
+"""
+Compara peticiones por segundo entre abrir una conexión nueva por
+consulta (get_connection) y usar el pool de conexiones del proceso.
+
+Requiere un PostgreSQL local configurado según app.db.DB_CONFIG:
+
+    python -m benchmarks.bench_pool --peticiones 2000 --hilos 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.db import PoolConexiones, get_connection
+
+CONSULTA = "SELECT * FROM mediciones ORDER BY fecha_hora DESC, id DESC LIMIT 10"
+
+
+def consulta_conexion_nueva(_):
+    conn = get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(CONSULTA)
+            cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def crear_consulta_pool(pool):
+    def consulta(_):
+        with pool.conexion() as conn, conn.cursor() as cursor:
+            cursor.execute(CONSULTA)
+            cursor.fetchall()
+    return consulta
+
+
+def medir(nombre, funcion, peticiones, hilos):
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        list(ejecutor.map(funcion, range(peticiones)))
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:<20} {peticiones / duracion:10.1f} peticiones/s ({duracion:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--peticiones", type=int, default=1000)
+    parser.add_argument("--hilos", type=int, default=4)
+    args = parser.parse_args()
+
+    medir("conexión por consulta", consulta_conexion_nueva, args.peticiones, args.hilos)
+    pool = PoolConexiones(minimo=args.hilos, maximo=args.hilos)
+    try:
+        medir("pool", crear_consulta_pool(pool), args.peticiones, args.hilos)
+    finally:
+        pool.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compara bytes y tiempo de CPU por cada 100.000 filas al serializar una
+página de /mediciones: jsonify de Flask, el formato 'filas' de
+app.serializacion y el formato 'columnas' (no requiere base de datos).
+
+    python -m benchmarks.bench_serializacion --filas 100000
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+
+from app import serializacion
+from app.api import app
+from app.models import COLUMNAS_MEDICIONES
+from app.simulacion import SimuladorVectorizado
+
+# Inicio de la serie sintética
+INICIO_BENCHMARK = datetime(1971, 1, 1)
+
+
+def filas_sinteticas(n):
+    """
+    'n' filas como las devuelve psycopg2 para la consulta de /mediciones
+    (tuplas en el orden de COLUMNAS_MEDICIONES), generadas con el
+    simulador y semilla fija.
+    """
+    simulador = SimuladorVectorizado(1, inicio=INICIO_BENCHMARK, semilla=0)
+    fecha_hora, valores = simulador.generar(n)
+    valores = valores.reshape(n, -1).astype(float).round(2).tolist()
+    filas = []
+    for i, (instante, (pm25, ozono, uv, temperatura, humedad)) in enumerate(
+            zip(fecha_hora.astype(datetime).tolist(), valores)):
+        fila = {"id": i + 1, "estacion_id": 1, "fecha_hora": instante, "pm25_ugm3": pm25,
+                "pm10_ugm3": None, "ozono_ppb": ozono, "intensidad_uv": uv, "temperatura": temperatura, "humedad_relativa": humedad}
+        filas.append(tuple(fila.get(columna) for columna in COLUMNAS_MEDICIONES))
+    return list(COLUMNAS_MEDICIONES), filas
+
+
+def respuesta(columnas, datos):
+    return {'success': True, 'columns': columnas, 'data': datos, 'next': None,
+            'message': 'Mediciones obtenidas exitosamente'}
+
+
+def variantes(columnas, filas):
+    """
+    Funciones que serializan la página completa, incluida la conversión
+    desde las tuplas de la base de datos.
+    """
+    def jsonify():
+        with app.app_context():
+            return app.json.response(respuesta(columnas, [dict(zip(columnas, f)) for f in filas])).get_data()
+
+    def formato_filas():
+        return serializacion.serializar(respuesta(columnas, [dict(zip(columnas, f)) for f in filas]))
+
+    def formato_columnas():
+        return serializacion.serializar(respuesta(columnas, serializacion.a_columnas(columnas, filas)))
+
+    def formato_columnas_json():
+        # Mismo formato sin orjson, como queda si no está instalado
+        datos = respuesta(columnas, serializacion.a_columnas(columnas, filas))
+        return json.dumps(datos, sort_keys=True, separators=(",", ":")).encode()
+
+    return {
+        "jsonify": jsonify,
+        "filas": formato_filas,
+        "columnas": formato_columnas,
+        "columnas (json)": formato_columnas_json,
+    }
+
+
+def medir(funcion, repeticiones):
+    """
+    Mediana del tiempo de CPU en segundos y tamaño en bytes.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.process_time()
+        cuerpo = funcion()
+        tiempos.append(time.process_time() - inicio)
+    return statistics.median(tiempos), len(cuerpo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--filas", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    columnas, filas = filas_sinteticas(args.filas)
+    escala = 100000 / args.filas
+    print(f"orjson: {'sí' if serializacion.orjson is not None else 'no'}")
+    base = None
+    for nombre, funcion in variantes(columnas, filas).items():
+        segundos, tamano = medir(funcion, args.repeticiones)
+        base = base or segundos
+        print(f"{nombre:<16} {segundos * 1000 * escala:9.1f} ms CPU  {tamano * escala / 1e6:7.2f} MB "
+              f"por 100k filas (x{base / segundos:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Mide filas por segundo del servicio de ingesta con distinta cantidad de
+procesos, para comprobar que escala con los núcleos disponibles.
+
+Requiere un PostgreSQL local configurado según app.db.DB_CONFIG. Las
+filas insertadas se borran al terminar:
+
+    python -m benchmarks.bench_servicio_ingesta --estaciones 200 --pasos 2000 --procesos 1 2 4
+"""
+import argparse
+import time
+from datetime import datetime
+
+from app.db import conexion
+from app.servicio_ingesta import ServicioIngesta
+from app.simulacion import registrar_simuladas
+
+# Inicio de las series del benchmark, para poder borrarlas
+INICIO_BENCHMARK = datetime(1971, 1, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--estaciones", type=int, default=200)
+    parser.add_argument("--pasos", type=int, default=2000)
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    estaciones = registrar_simuladas(args.estaciones, prefijo="bench")
+    try:
+        base = None
+        for procesos in args.procesos:
+            servicio = ServicioIngesta(procesos, semilla=0)
+            inicio = time.perf_counter()
+            filas = servicio.ejecutar(estaciones, args.pasos, INICIO_BENCHMARK)
+            duracion = time.perf_counter() - inicio
+            base = base or filas / duracion
+            print(f"{procesos:>2} procesos {filas / duracion:12.0f} filas/s "
+                  f"(x{filas / duracion / base:.2f}, {duracion:.2f} s)")
+            with conexion() as conn, conn.cursor() as cursor:
+                cursor.execute("DELETE FROM mediciones WHERE fecha_hora < '1972-01-01'")
+    finally:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM mediciones WHERE fecha_hora < '1972-01-01'")
+            cursor.execute("DELETE FROM estaciones WHERE codigo LIKE 'bench-%'")
+
+
+if __name__ == "__main__":
+    main()
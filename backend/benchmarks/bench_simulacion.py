@@ -0,0 +1,47 @@
+"""
+Mide filas por segundo del simulador vectorizado: solo generación en
+memoria y, con --base-de-datos, generación más COPY binario a un
+PostgreSQL local (las filas insertadas se borran al terminar).
+
+    python -m benchmarks.bench_simulacion --estaciones 500 --pasos 20000
+"""
+import argparse
+import time
+from datetime import datetime
+
+from app.db import conexion
+from app.simulacion import SimuladorVectorizado, generar_masivo
+
+# Inicio de las series del benchmark, para poder borrarlas
+INICIO_BENCHMARK = datetime(1971, 1, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--estaciones", type=int, default=500)
+    parser.add_argument("--pasos", type=int, default=20000)
+    parser.add_argument("--base-de-datos", action="store_true")
+    args = parser.parse_args()
+
+    simulador = SimuladorVectorizado(args.estaciones, inicio=INICIO_BENCHMARK, semilla=0)
+    inicio = time.perf_counter()
+    for _ in range(0, args.pasos, 2000):
+        simulador.generar(2000)
+    duracion = time.perf_counter() - inicio
+    filas = args.estaciones * args.pasos
+    print(f"{'generación':<22} {filas / duracion * 60 / 1e6:8.1f} M filas/min ({duracion:.2f} s)")
+
+    if args.base_de_datos:
+        simulador = SimuladorVectorizado(args.estaciones, inicio=INICIO_BENCHMARK, semilla=0)
+        try:
+            inicio = time.perf_counter()
+            filas = generar_masivo(simulador, args.pasos)
+            duracion = time.perf_counter() - inicio
+            print(f"{'generación + COPY':<22} {filas / duracion * 60 / 1e6:8.1f} M filas/min ({duracion:.2f} s)")
+        finally:
+            with conexion() as conn, conn.cursor() as cursor:
+                cursor.execute("DELETE FROM mediciones WHERE fecha_hora < '1972-01-01'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+Suite de benchmarks reproducible: mide lectura de sensores, ingesta,
+latencia de /mediciones con distintos tamaños de serie, serialización
+JSON (ver benchmarks.bench_serializacion), decodificación de tramas del
+PMS5003 (ver benchmarks.bench_pms5003) y arranque de los puntos de
+entrada (ver benchmarks.bench_arranque), y guarda los resultados en JSON
+para compararlos entre commits.
+
+Los casos 'ingesta' y 'consulta' requieren un PostgreSQL configurado
+según app.db.DB_CONFIG (o MEDICIONES_DSN), pero no escriben en su base
+de datos: crean en el mismo servidor la base '--base' (mediciones_bench
+por defecto) con el esquema completo y la eliminan al terminar. Con
+--conservar se mantiene, junto con las series de 'consulta', que así no
+se vuelven a sembrar en la próxima ejecución. Las series se generan con
+el simulador vectorizado y semilla fija en estaciones
+'bench-consulta-<filas>'. La suite se niega a usar la base de datos
+principal.
+
+    python -m benchmarks.run --salida resultados.json
+    python -m benchmarks.run --casos sensores serializacion --tamanos 10000 1000000
+    python -m benchmarks.run --salida nuevo.json --comparar base.json --tolerancia 0.2 \\
+        --umbral consulta.1000000.primera_pagina_p95_ms=0.5
+
+Con --comparar el proceso termina con código 1 si alguna métrica empeora
+más que su tolerancia relativa respecto del archivo base.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Formato del archivo de resultados; cambiarlo si cambia su estructura
+VERSION_RESULTADOS = 1
+
+# Inicio de las series de 'consulta'; un paso por segundo, de modo que
+# 10 millones de filas quedan dentro de 1971
+INICIO_CONSULTAS = datetime(1971, 1, 1)
+PREFIJO_CONSULTAS = "bench-consulta"
+
+CASOS = ("sensores", "ingesta", "consulta", "serializacion", "pms5003", "arranque")
+# Casos que escriben en PostgreSQL
+CASOS_CON_BASE = ("ingesta", "consulta")
+
+BASE_BENCHMARKS = "mediciones_bench"
+BASE_PRINCIPAL = "mediciones_ambientales"
+
+# Scripts de esquema (database/ en la raíz del repositorio)
+DIRECTORIO_DATABASE = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "database"))
+
+
+def resultado(nombre, valor, unidad, mejor):
+    """
+    Una métrica del resultado. 'mejor' es "mayor" (rendimiento) o "menor"
+    (latencias, tamaños) y define en qué sentido hay una regresión.
+    """
+    return nombre, {"valor": float(valor), "unidad": unidad, "mejor": mejor}
+
+
+def mediana_de(repeticiones, funcion):
+    return statistics.median(funcion() for _ in range(repeticiones))
+
+
+def por_segundo(funcion, duracion):
+    """
+    Llamadas por segundo a 'funcion' durante al menos 'duracion' segundos.
+    """
+    llamadas = 0
+    inicio = time.perf_counter()
+    limite = inicio + duracion
+    while True:
+        funcion()
+        llamadas += 1
+        ahora = time.perf_counter()
+        if ahora >= limite:
+            return llamadas / (ahora - inicio)
+
+
+def caso_sensores(args):
+    from app.sensores import EstacionMeteorologica
+
+    estacion = EstacionMeteorologica()
+    try:
+        lecturas = mediana_de(args.repeticiones,
+                              lambda: por_segundo(estacion.leer_todos_sensores, args.duracion))
+        completas = mediana_de(args.repeticiones,
+                               lambda: por_segundo(estacion.obtener_medicion_completa, args.duracion))
+    finally:
+        estacion.cerrar()
+    return [
+        resultado("sensores.leer_todos_por_s", lecturas, "1/s", "mayor"),
+        resultado("sensores.medicion_completa_por_s", completas, "1/s", "mayor"),
+    ]
+
+
+def caso_ingesta(args):
+    from app.db import conexion
+    from benchmarks.bench_ingesta import FECHA_BENCHMARK, por_fila, por_lotes
+
+    def filas_por_segundo(funcion, filas, *extra):
+        inicio = time.perf_counter()
+        funcion(filas, *extra)
+        return filas / (time.perf_counter() - inicio)
+
+    try:
+        # Una fila y un commit por medición frente a lotes con COPY
+        individual = mediana_de(args.repeticiones,
+                                lambda: filas_por_segundo(por_fila, args.filas_ingesta // 10))
+        lotes = mediana_de(args.repeticiones,
+                           lambda: filas_por_segundo(por_lotes, args.filas_ingesta, 1000))
+    finally:
+        with conexion() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM mediciones WHERE fecha_hora = %s", (FECHA_BENCHMARK,))
+    return [
+        resultado("ingesta.insert_por_fila_filas_por_s", individual, "filas/s", "mayor"),
+        resultado("ingesta.copy_por_lotes_filas_por_s", lotes, "filas/s", "mayor"),
+    ]
+
+
+def sembrar_serie(filas):
+    """
+    Deja en la base de datos una serie de 'filas' mediciones de la
+    estación 'bench-consulta-<filas>', generada siempre igual. Si ya
+    existe completa (de una ejecución con --conservar) no se vuelve a
+    generar.
+
+    Returns:
+        Id de la estación.
+    """
+    from app.db import conexion
+    from app.estaciones import registrar_estaciones
+    from app.simulacion import SimuladorVectorizado, generar_masivo
+
+    codigo = f"{PREFIJO_CONSULTAS}-{filas}"
+    with conexion() as conn, conn.cursor() as cursor:
+        estacion = registrar_estaciones(cursor, [codigo])[codigo]
+        cursor.execute("SELECT count(*) FROM mediciones WHERE estacion_id = %s", (estacion,))
+        existentes = cursor.fetchone()[0]
+    if existentes == filas:
+        return estacion
+
+    with conexion() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM mediciones WHERE estacion_id = %s", (estacion,))
+    simulador = SimuladorVectorizado(1, paso_segundos=1, inicio=INICIO_CONSULTAS, semilla=0)
+    inicio = time.perf_counter()
+    generar_masivo(simulador, filas, pasos_por_bloque=100000, estaciones=[estacion])
+    with conexion() as conn, conn.cursor() as cursor:
+        cursor.execute("ANALYZE mediciones")
+    print(f"[INFO] {filas} filas sembradas en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    return estacion
+
+
+def latencias_ms(cliente, ruta, peticiones):
+    from app.api import cache_mediciones
+
+    latencias = []
+    for _ in range(peticiones):
+        # Sin caché: se mide la consulta y la serialización completas
+        cache_mediciones.invalidar()
+        inicio = time.perf_counter()
+        respuesta = cliente.get(ruta)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"{ruta} respondió {respuesta.status_code}")
+    return np.percentile(latencias, [50, 95])
+
+
+def caso_consulta(args):
+    from app.api import app
+
+    cliente = app.test_client()
+    resultados = []
+    for filas in args.tamanos:
+        estacion = sembrar_serie(filas)
+        mitad = (INICIO_CONSULTAS + timedelta(seconds=filas // 2)).isoformat()
+        rutas = {
+            "primera_pagina": f"/mediciones?estacion={estacion}",
+            "pagina_intermedia": f"/mediciones?estacion={estacion}&desde={mitad}",
+        }
+        for nombre, ruta in rutas.items():
+            # Calentamiento: planes de consulta y páginas del índice en memoria
+            latencias_ms(cliente, ruta, 3)
+            p50, p95 = latencias_ms(cliente, ruta, args.peticiones)
+            resultados.append(resultado(f"consulta.{filas}.{nombre}_p50_ms", p50, "ms", "menor"))
+            resultados.append(resultado(f"consulta.{filas}.{nombre}_p95_ms", p95, "ms", "menor"))
+    return resultados
+
+
+def _conectar_servidor():
+    # Conexión a la base 'postgres' del servidor de app.db.DB_CONFIG, para
+    # crear y eliminar bases de datos (fuera de una transacción)
+    import psycopg2
+    from app.db import DB_CONFIG
+
+    conn = psycopg2.connect(**{**DB_CONFIG, "database": "postgres"})
+    conn.autocommit = True
+    return conn
+
+
+def preparar_base(nombre):
+    """
+    Hace que app.db (y los procesos hijos, por MEDICIONES_DSN) usen la
+    base de datos 'nombre', creándola con el esquema completo si no
+    existe. Debe llamarse antes de importar app.db.
+    """
+    from psycopg2.extensions import make_dsn, parse_dsn
+
+    dsn = os.environ.get("MEDICIONES_DSN", "")
+    principal = parse_dsn(dsn).get("dbname", BASE_PRINCIPAL) if dsn else BASE_PRINCIPAL
+    if nombre in (principal, BASE_PRINCIPAL):
+        raise SystemExit(f"[!] Los benchmarks no se ejecutan sobre la base de datos principal '{nombre}'")
+    os.environ["MEDICIONES_DSN"] = make_dsn(dsn, dbname=nombre)
+
+    conn = _conectar_servidor()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (nombre,))
+            if cursor.fetchone() is not None:
+                return
+            cursor.execute(f"CREATE DATABASE \"{nombre}\" ENCODING 'UTF8' TEMPLATE template0")
+    finally:
+        conn.close()
+    try:
+        _crear_esquema()
+    except BaseException:
+        # Una base a medio crear no se reutiliza en la próxima ejecución
+        eliminar_base(nombre)
+        raise
+    print(f"[INFO] Base de datos '{nombre}' creada", file=sys.stderr)
+
+
+def _crear_esquema():
+    from app.agregados import crear_tablas_agregadas
+    from app.calibracion import crear_tabla_calibraciones
+    from app.esquema import verificar_esquema
+    from app.indices import crear_tablas_indices
+
+    # El script informa los errores sin terminar con error: verificar_esquema
+    # detiene la suite si la tabla no quedó creada
+    subprocess.run([sys.executable, "crear_tabla_mediciones.py"], cwd=DIRECTORIO_DATABASE,
+                   check=True, stdout=subprocess.DEVNULL)
+    verificar_esquema()
+    crear_tablas_agregadas()
+    crear_tablas_indices()
+    crear_tabla_calibraciones()
+
+
+def eliminar_base(nombre):
+    from app.db import obtener_pool
+
+    obtener_pool().cerrar()
+    conn = _conectar_servidor()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{nombre}" WITH (FORCE)')
+    finally:
+        conn.close()
+
+
+def caso_serializacion(args):
+    from benchmarks.bench_serializacion import filas_sinteticas, medir, variantes
+
+    columnas, filas = filas_sinteticas(args.filas_serializacion)
+    por_cada = 100000 / len(filas)
+    resultados = []
+    # jsonify de Flask como referencia, y los formatos de app.serializacion
+    for nombre, funcion in variantes(columnas, filas).items():
+        if nombre not in ("jsonify", "filas", "columnas"):
+            continue
+        cpu, tamano = medir(funcion, args.repeticiones)
+        resultados.append(resultado(f"serializacion.{nombre}_ms_por_100k_filas",
+                                    cpu * 1000 * por_cada, "ms", "menor"))
+        resultados.append(resultado(f"serializacion.{nombre}_bytes_por_100k_filas",
+                                    tamano * por_cada, "bytes", "menor"))
+    return resultados
+
+
+def caso_pms5003(args):
+    from benchmarks.bench_pms5003 import decodificar_en_el_lugar, grabacion_sintetica, medir
+
+    datos = grabacion_sintetica(args.tramas_pms5003)
+    resultados = []
+    # Lecturas grandes (un puerto con tramas acumuladas) y de una trama
+    for bloque in (4096, 32):
+        segundos = mediana_de(args.repeticiones,
+                              lambda: medir(decodificar_en_el_lugar, datos, bloque)[0])
+        resultados.append(resultado(f"pms5003.bloque_{bloque}_tramas_por_s",
+                                    args.tramas_pms5003 / segundos, "tramas/s", "mayor"))
+    return resultados
+
+
+def caso_arranque(args):
+    from benchmarks.bench_arranque import medir
+
+    importaciones, procesos = medir(args.repeticiones)
+    resultados = [resultado(f"arranque.import_{modulo.split('.')[-1]}_ms", total, "ms", "menor")
+                  for modulo, (total, _) in importaciones.items()]
+    resultados += [resultado(f"arranque.{nombre}_ms", ms, "ms", "menor")
+                   for nombre, ms in procesos.items() if nombre != "interprete"]
+    return resultados
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actuales, base, tolerancia, umbrales):
+    """
+    Compara las métricas presentes en ambos resultados.
+
+    Returns:
+        Lista de (nombre, valor base, valor actual, cambio relativo,
+        es_regresion). El cambio relativo es positivo cuando la métrica
+        empeora.
+    """
+    filas = []
+    for nombre, actual in actuales.items():
+        anterior = base.get(nombre)
+        if anterior is None or anterior["valor"] == 0:
+            continue
+        cambio = (actual["valor"] - anterior["valor"]) / anterior["valor"]
+        if actual["mejor"] == "mayor":
+            cambio = -cambio
+        filas.append((nombre, anterior["valor"], actual["valor"], cambio,
+                      cambio > umbrales.get(nombre, tolerancia)))
+    return filas
+
+
+def parsear_umbral(texto):
+    nombre, separador, valor = texto.partition("=")
+    if not separador:
+        raise argparse.ArgumentTypeError(f"Umbral no válido (se espera nombre=valor): {texto}")
+    return nombre, float(valor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--casos", nargs="+", choices=CASOS, default=list(CASOS))
+    parser.add_argument("--salida", help="archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="resultados base (JSON) con los que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="empeoramiento relativo permitido por métrica")
+    parser.add_argument("--umbral", type=parsear_umbral, action="append", default=[],
+                        help="tolerancia de una métrica concreta, como nombre=valor")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--duracion", type=float, default=1.0, help="segundos por medición de sensores")
+    parser.add_argument("--filas-ingesta", type=int, default=20000)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10000, 1000000, 10000000],
+                        help="filas de las series de 'consulta'")
+    parser.add_argument("--peticiones", type=int, default=50, help="peticiones por ruta en 'consulta'")
+    parser.add_argument("--filas-serializacion", type=int, default=10000)
+    parser.add_argument("--tramas-pms5003", type=int, default=50000)
+    parser.add_argument("--base", default=BASE_BENCHMARKS,
+                        help="base de datos de los casos 'ingesta' y 'consulta'")
+    parser.add_argument("--conservar", action="store_true",
+                        help="no eliminar la base de datos (ni las series de 'consulta') al terminar")
+    args = parser.parse_args()
+
+    con_base = any(caso in CASOS_CON_BASE for caso in args.casos)
+    if con_base:
+        preparar_base(args.base)
+
+    funciones = {"sensores": caso_sensores, "ingesta": caso_ingesta,
+                 "consulta": caso_consulta, "serializacion": caso_serializacion,
+                 "pms5003": caso_pms5003, "arranque": caso_arranque}
+    metricas = {}
+    try:
+        for caso in args.casos:
+            inicio = time.perf_counter()
+            metricas.update(funciones[caso](args))
+            print(f"[INFO] {caso}: {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    finally:
+        if con_base and not args.conservar:
+            eliminar_base(args.base)
+
+    resultados = {
+        "version": VERSION_RESULTADOS,
+        "commit": commit_actual(),
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "parametros": {clave: valor for clave, valor in vars(args).items()
+                       if clave not in ("salida", "comparar", "umbral", "base")},
+        "metricas": metricas,
+    }
+    for nombre, metrica in metricas.items():
+        print(f"{nombre:<55} {metrica['valor']:14.2f} {metrica['unidad']}")
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as archivo:
+            base = json.load(archivo)
+        comparacion = comparar(metricas, base["metricas"], args.tolerancia, dict(args.umbral))
+        print(f"\nComparación con {base.get('commit') or args.comparar} (cambio positivo = peor):")
+        for nombre, anterior, actual, cambio, es_regresion in comparacion:
+            marca = "REGRESIÓN" if es_regresion else "ok"
+            print(f"{nombre:<55} {anterior:12.2f} -> {actual:12.2f} ({cambio:+.1%}) {marca}")
+        if any(fila[4] for fila in comparacion):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
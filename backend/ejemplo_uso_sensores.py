@@ -1,12 +1,9 @@
 """
-Ejemplo de uso de las clases de sensores
+Ejemplo de uso de las clases de sensores (desde backend/):
+
+    python ejemplo_uso_sensores.py
 """
 import time
-import sys
-import os
-
-# Agregar el directorio app al path para poder importar los módulos
-sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
 
 from app.sensores import EstacionMeteorologica, PMS5003, MQ131, DHT22, GUVAS12SD
 
@@ -91,22 +88,16 @@ def ejemplo_simulacion_continua():
     for i in range(5):
         print(f"\n--- Lectura {i+1} ---")
         
-        # Leer y mostrar mediciones
-        mediciones = estacion.leer_todos_sensores()
-        for nombre, lectura in mediciones.items():
-            if 'error' not in lectura:
-                if nombre == 'pm25':
-                    print(f"   PM2.5: {lectura.get('pm25_ugm3', 'N/A')} μg/m³")
-                elif nombre == 'ozono':
-                    print(f"   Ozono: {lectura.get('ozono_ppb', 'N/A')} ppb")
-                elif nombre == 'clima':
-                    print(f"   Temperatura: {lectura.get('temperatura', 'N/A')}°C")
-                    print(f"   Humedad: {lectura.get('humedad_relativa', 'N/A')}%")
-                elif nombre == 'uv':
-                    print(f"   UV: {lectura.get('intensidad_uv', 'N/A')} mW/cm²")
+        # Leer una vez y mostrar lo mismo que se guarda
+        medicion = estacion.tomar_medicion()
+        print(f"   PM2.5: {medicion.pm25_ugm3} μg/m³")
+        print(f"   Ozono: {medicion.ozono_ppb} ppb")
+        print(f"   Temperatura: {medicion.temperatura}°C")
+        print(f"   Humedad: {medicion.humedad_relativa}%")
+        print(f"   UV: {medicion.intensidad_uv} mW/cm²")
         
         # Guardar en BD
-        if estacion.guardar_mediciones():
+        if estacion.guardar_mediciones(medicion):
             print("   ✓ Guardado en BD")
         else:
             print("   ✗ Error al guardar")
@@ -0,0 +1,50 @@
+"""
+Configuración de gunicorn para servir la API en producción:
+
+    gunicorn -c gunicorn.conf.py app.wsgi:app
+
+Los valores se toman de app.config (variables de entorno API_*).
+"""
+import os
+import tempfile
+
+# Directorio en el que cada trabajador deja sus métricas, para que
+# /metrics devuelva la suma de todos (ver app.metricas). Se fija antes de
+# importar la aplicación para que los trabajadores lo hereden
+os.environ.setdefault("METRICAS_DIR", tempfile.mkdtemp(prefix="metricas-gunicorn-"))
+
+# gunicorn lee como ajuste cada nombre del módulo ('config' es uno de
+# ellos), por lo que se importan solo los valores
+from app.config import HILOS, HOST, PUERTO, TRABAJADORES
+from app.metricas import iniciar_instantaneas, limpiar_directorio
+
+bind = f"{HOST}:{PUERTO}"
+
+# Cada proceso abre su propio pool de conexiones (app.db) y su propio
+# oyente de notificaciones (app.difusion) en el primer uso, por lo que
+# la aplicación no se precarga en el proceso maestro. El total de
+# conexiones a PostgreSQL es trabajadores × POOL_CONFIG['maximo'].
+workers = TRABAJADORES
+preload_app = False
+
+# Trabajadores con hilos: las consultas bloquean en psycopg2 y las
+# conexiones de /mediciones/stream quedan abiertas, una por hilo. La API
+# acepta hasta API_MAXIMO_FLUJOS flujos por trabajador (la mitad de los
+# hilos por defecto) y responde 503 a los siguientes, para que los
+# flujos no dejen al trabajador sin hilos para las demás rutas
+worker_class = "gthread"
+threads = HILOS
+
+# Segundos sin señal del trabajador antes de reiniciarlo, y de espera
+# de una petición en una conexión keep-alive
+timeout = 60
+keepalive = 5
+
+
+def on_starting(server):
+    # Las métricas de una ejecución anterior no se suman a las de esta
+    limpiar_directorio()
+
+
+def post_worker_init(worker):
+    iniciar_instantaneas()
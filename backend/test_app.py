@@ -1,8 +1,212 @@
-from app.models import obtener_mediciones
+import os
+import subprocess
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.db import get_connection
+from app.models import obtener_mediciones, codificar_cursor, decodificar_cursor
+from app.backfill import deduplicar, parsear_csv, parsear_ndjson
+from app.buffer_local import BufferInconsistente, BufferLocal, subir_lote
+from app.calibracion import COEFICIENTES_POR_DEFECTO, calibrar_arreglos, calibrar_lecturas
+from app.esquema import NOMBRES_METRICAS, diferencias, fila_desde_lecturas
+from app.indices import aqi_pm25, media_movil
+from app.metricas import Histograma
+from app.pms5003 import DispositivoReproducido, armar_trama
+from app.serializacion import a_columnas
+from app.sensores import PMS5003, EstacionMeteorologica
+from app.servicio_ingesta import repartir_estaciones
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "database"))
+from mantenimiento_particiones import archivar_particion  # noqa: E402
 
 def test_obtener_mediciones():
     mediciones = obtener_mediciones()
     print(mediciones)
 
+def test_cursor_ida_y_vuelta():
+    fecha_hora = datetime(2025, 1, 15, 10, 30, 0)
+    cursor = codificar_cursor(fecha_hora, 42)
+    assert decodificar_cursor(cursor) == (fecha_hora, 42)
+
+def test_aqi_pm25_puntos_de_corte():
+    assert list(aqi_pm25([0.0, 9.0, 9.05, 9.1, 35.4, 35.5, 400.0])) == [0, 50, 50, 51, 100, 101, 500]
+
+def test_media_movil_ignora_nan():
+    promedios = media_movil([0, 1000, 2000, 3000], [1.0, float("nan"), 3.0, 5.0], 2000)
+    assert list(promedios) == [1.0, 1.0, 3.0, 4.0]
+
+def test_media_movil_por_estacion():
+    promedios = media_movil([0, 1000, 0, 1000], [1.0, 3.0, 10.0, 20.0], 5000, grupos=[1, 1, 2, 2])
+    assert list(promedios) == [1.0, 2.0, 10.0, 15.0]
+
+def test_repartir_estaciones():
+    assert repartir_estaciones([1, 2, 3, 4, 5], 2) == [[2, 4], [1, 3, 5]]
+
+def test_histograma_suma_hilos():
+    histograma = Histograma("prueba_segundos", "Prueba", ("ruta",), limites=(0.1, 1.0))
+    hilos = [threading.Thread(target=histograma.observar, args=(0.5,), kwargs={"ruta": "/x"})
+             for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+        hilo.join()
+    histograma.etiquetar(ruta="/x").observar(2.0)
+    assert histograma.exponer() == [
+        'prueba_segundos_bucket{ruta="/x",le="0.1"} 0',
+        'prueba_segundos_bucket{ruta="/x",le="1.0"} 3',
+        'prueba_segundos_bucket{ruta="/x",le="+Inf"} 4',
+        'prueba_segundos_sum{ruta="/x"} 3.5',
+        'prueba_segundos_count{ruta="/x"} 4',
+    ]
+
+def test_formato_columnas():
+    filas = [(1, datetime(1970, 1, 1, 0, 0, 1), 12.5), (2, None, None)]
+    assert a_columnas(["id", "fecha_hora", "pm25_ugm3"], filas) == {
+        "id": [1, 2], "fecha_hora": [1000, None], "pm25_ugm3": [12.5, None]
+    }
+
+def test_esquema_filas_y_diferencias():
+    lecturas = {"pm25": {"pm25_ugm3": 12.5}, "ozono": {"error": "sin respuesta"},
+                "uv": {"intensidad_uv": 0.8}, "clima": {"temperatura": 21.0, "humedad_relativa": 55.0}}
+    assert fila_desde_lecturas(lecturas) == (12.5, None, None, 0.8, 21.0, 55.0, None, None)
+    tabla = {"id": "integer", "estacion_id": "integer", "fecha_hora": "timestamp without time zone",
+             "pm25_ugm3": "real", "pm10_ugm3": "double precision", "ozono_ppb": "real",
+             "temperatura": "real", "humedad_relativa": "real", "indice_uv": "real",
+             "ozono_mv": "real", "uv_mv": "real"}
+    assert diferencias(tabla) == ["la columna 'pm10_ugm3' es double precision y se esperaba REAL",
+                                  "falta la columna 'intensidad_uv' (REAL)"]
+
+def test_pms5003_resincroniza_y_promedia():
+    tramas = [armar_trama(8, 10 + i, 15 + i) for i in range(4)]
+    corrupta = bytearray(tramas[1])
+    corrupta[12] ^= 0xFF
+    grabacion = b"\x42\x00" + tramas[0] + bytes(corrupta) + tramas[2][:9] + tramas[3]
+    sensor = PMS5003(DispositivoReproducido(grabacion, tamano_bloque=7), tramas_por_promedio=2)
+    lectura = sensor.leer()
+    assert (lectura["pm25_ugm3"], lectura["pm10_ugm3"]) == (11.5, 16.5)
+    assert (sensor.decodificador.tramas_validas, sensor.decodificador.tramas_invalidas) == (2, 2)
+
+def test_calibracion_escalar_y_vectorizada():
+    lecturas = {"ozono": {"ozono_mv": 3500.0}, "uv": {"uv_mv": 800.0},
+                "clima": {"temperatura": 28.0, "humedad_relativa": 40.0}}
+    calibradas = calibrar_lecturas(lecturas, COEFICIENTES_POR_DEFECTO)
+    assert calibradas["uv"]["intensidad_uv"] == 0.8
+    ppb, intensidad = calibrar_arreglos([3500.0, float("nan"), 6000.0], [800.0, 100.0, float("nan")],
+                                        [28.0, 20.0, 20.0], [40.0, 65.0, 65.0], COEFICIENTES_POR_DEFECTO)
+    assert abs(ppb[0] - calibradas["ozono"]["ozono_ppb"]) < 0.01
+    assert list(np.isnan(ppb)) == [False, True, True]
+    assert list(np.isnan(intensidad)) == [False, False, True]
+
+def test_sensores_sin_dependencias_pesadas():
+    codigo = ("import sys, app.sensores; "
+              "print(' '.join(m for m in ('psycopg2', 'numpy', 'flask') if m in sys.modules))")
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+    assert salida.stdout.strip() == ""
+
+def test_backfill_parsea_y_deduplica():
+    columnas = ["fecha_hora", "pm25_ugm3", "temperatura"]
+    datos = (b"2024-03-01T10:00:30,12.5,\n2024-03-01T10:00:00,x,20\nsin fecha,1,2\n"
+             b"2024-03-01T10:00:00,8,21.5\n2024-03-01T10:01:00,9\n")
+    codigos, fecha_hora, valores, rechazadas = parsear_csv(datos, columnas)
+    assert (codigos, len(fecha_hora), rechazadas) == (None, 2, 3)
+    assert np.isnan(valores[0, 4]) and valores[1, 0] == 8.0
+    _, fecha_hora, valores = deduplicar(np.array([1, 1, 1], dtype=np.int32),
+                                        np.array(["2024-03-01T10:00", "2024-03-01T09:00", "2024-03-01T10:00"],
+                                                 dtype="datetime64[us]"), np.array([[1.0], [2.0], [3.0]]))
+    assert valores[:, 0].tolist() == [2.0, 3.0]
+    codigos, _, valores, rechazadas = parsear_ndjson(
+        b'{"fecha_hora": "2024-03-01T10:00:00", "estacion": "e1", "ozono_ppb": 30}\nroto\n')
+    assert (codigos, valores[0, 2], rechazadas) == (["e1"], 30.0, 1)
+    _, fecha_hora, _, rechazadas = parsear_ndjson(
+        b'{"fecha_hora": 1709287200000}\n{"fecha_hora": "2024-03-01T10:00:00Z"}\n'
+        b'{"fecha_hora": "2024-03-01T10:00:00-03:00"}\n{"fecha_hora": "2024-03-01 10:00:00"}\n')
+    assert (fecha_hora.tolist(), rechazadas) == ([datetime(2024, 3, 1, 10, 0)], 3)
+
+def test_estacion_no_reutiliza_lectura_con_error():
+    estacion = EstacionMeteorologica()
+    try:
+        for sensor in estacion.sensores.values():
+            sensor.periodo_muestreo = 60.0
+        estacion.sensores["clima"].leer = lambda: {"error": "sin respuesta"}
+        assert estacion.tomar_medicion().temperatura is None
+        medicion = estacion.tomar_medicion()
+        assert medicion.temperatura is None and medicion.pm25_ugm3 is not None
+    finally:
+        estacion.cerrar()
+
+def test_archivar_particion():
+    conexion = get_connection()
+    try:
+        with conexion.cursor() as cursor:
+            # Una tabla temporal con la estructura de 'mediciones' hace de partición;
+            # todo se deshace con el rollback
+            cursor.execute("CREATE TEMP TABLE particion_prueba (LIKE mediciones INCLUDING DEFAULTS)")
+            cursor.execute("""
+                INSERT INTO particion_prueba (estacion_id, fecha_hora, pm25_ugm3, intensidad_uv)
+                VALUES (1, '2001-01-01 10:05', 10, 1), (1, '2001-01-01 10:35', 20, 3),
+                       (2, '2001-01-01 10:10', 40, 4), (1, '2001-01-01 11:00', 5, 2)
+            """)
+            archivar_particion(cursor, "particion_prueba")
+            cursor.execute("""
+                SELECT estacion_id, hora, filas, pm25_ugm3, intensidad_uv FROM mediciones_archivo
+                WHERE hora >= '2001-01-01' AND hora < '2001-01-02' ORDER BY hora, estacion_id
+            """)
+            assert cursor.fetchall() == [
+                (1, datetime(2001, 1, 1, 10), 2, 15.0, 2.0),
+                (2, datetime(2001, 1, 1, 10), 1, 40.0, 4.0),
+                (1, datetime(2001, 1, 1, 11), 1, 5.0, 2.0),
+            ]
+    finally:
+        conexion.rollback()
+        conexion.close()
+
+def test_buffer_local_conserva_epoca(tmp_path):
+    ruta = str(tmp_path / "buffer.db")
+    buffer = BufferLocal(ruta, "estacion-prueba")
+    epoca = buffer.epoca
+    buffer.cerrar()
+    buffer = BufferLocal(ruta, "estacion-prueba")
+    assert buffer.epoca == epoca
+    buffer.cerrar()
+    otro = BufferLocal(str(tmp_path / "recreado.db"), "estacion-prueba")
+    assert otro.epoca != epoca
+    otro.cerrar()
+
+def test_subir_lote_reenvio_y_cambio_de_epoca():
+    conexion = get_connection()
+    estacion = "prueba-subir-lote"
+    metricas = [1.0] + [None] * (len(NOMBRES_METRICAS) - 1)
+
+    def lote(*secuencias):
+        return [(secuencia, datetime(2001, 1, 1, 0, secuencia), *metricas) for secuencia in secuencias]
+
+    def filas_subidas():
+        with conexion.cursor() as cursor:
+            cursor.execute("""
+                SELECT count(*) FROM mediciones m JOIN estaciones e ON e.id = m.estacion_id
+                WHERE e.codigo = %s
+            """, (estacion,))
+            return cursor.fetchone()[0]
+
+    try:
+        # Todo se deshace con el rollback
+        assert subir_lote(conexion, estacion, lote(1, 2, 3), "a") == 3
+        assert filas_subidas() == 3
+        # El reenvío de un lote ya confirmado solo sube las secuencias nuevas
+        assert subir_lote(conexion, estacion, lote(2, 3, 4), "a") == 4
+        assert filas_subidas() == 4
+        # Con la misma época, un lote que termina antes de la confirmada no se acepta
+        with pytest.raises(BufferInconsistente):
+            subir_lote(conexion, estacion, lote(1, 2), "a")
+        # Un buffer recreado (otra época) vuelve a empezar desde la secuencia 1
+        assert subir_lote(conexion, estacion, lote(1, 2), "b") == 2
+        assert filas_subidas() == 6
+    finally:
+        conexion.rollback()
+        conexion.close()
+
 if __name__ == "__main__":
-    test_obtener_mediciones()
\ No newline at end of file
+    test_obtener_mediciones()
@@ -1,4 +1,9 @@
+import os
+
 import psycopg2
+import psycopg2.extensions
+
+from mantenimiento_particiones import crear_particion, crear_particiones, repartir_default
 
 # Configuración de la conexión a la base de datos PostgreSQL
 DB_CONFIG = {
@@ -9,6 +14,91 @@ DB_CONFIG = {
     'password': 'postgres'        # Contraseña del usuario
 }
 
+# Con MEDICIONES_DSN ("dbname=... host=..." o una URI postgresql://...)
+# se reemplazan los valores anteriores que indique, por ejemplo para
+# usar otra base de datos en pruebas y benchmarks
+if os.environ.get("MEDICIONES_DSN"):
+    DB_CONFIG.update(psycopg2.extensions.parse_dsn(os.environ["MEDICIONES_DSN"]))
+    if 'dbname' in DB_CONFIG:
+        DB_CONFIG['database'] = DB_CONFIG.pop('dbname')
+
+# Nombre con el que se aparta una tabla 'mediciones' creada antes de
+# particionar, mientras sus filas se copian a la tabla particionada
+TABLA_SIN_PARTICIONAR = "mediciones_sin_particionar"
+
+
+def apartar_tabla_sin_particionar(cursor):
+    """
+    Si 'mediciones' es una tabla común (creada antes de particionar), le
+    agrega las columnas que falten y la renombra, junto con sus índices,
+    para crear en su lugar la tabla particionada (ver
+    copiar_tabla_sin_particionar).
+
+    Returns:
+        True si la tabla se apartó.
+    """
+    cursor.execute("""
+        SELECT relkind FROM pg_class
+        WHERE oid = to_regclass('mediciones')
+    """)
+    fila = cursor.fetchone()
+    if fila is None or fila[0] != 'r':
+        return False
+    print("[INFO] 'mediciones' no está particionada: se migra a la tabla particionada")
+    cursor.execute("""
+        ALTER TABLE mediciones
+            ADD COLUMN IF NOT EXISTS estacion_id INTEGER NOT NULL DEFAULT 1,
+            ADD COLUMN IF NOT EXISTS pm10_ugm3 REAL,
+            ADD COLUMN IF NOT EXISTS intensidad_uv REAL,
+            ADD COLUMN IF NOT EXISTS ozono_mv REAL,
+            ADD COLUMN IF NOT EXISTS uv_mv REAL;
+    """)
+    cursor.execute(f"ALTER TABLE mediciones RENAME TO {TABLA_SIN_PARTICIONAR};")
+    # Los índices conservan su nombre al renombrar la tabla: se renombran
+    # para que no ocupen los de la tabla particionada (CREATE INDEX IF NOT
+    # EXISTS omitiría los nuevos)
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (TABLA_SIN_PARTICIONAR,))
+    for (indice,) in cursor.fetchall():
+        cursor.execute(f'ALTER INDEX "{indice}" RENAME TO "{indice[:40]}_sin_particionar";')
+    return True
+
+
+def copiar_tabla_sin_particionar(cursor):
+    """
+    Copia las filas de la tabla apartada por apartar_tabla_sin_particionar
+    a la tabla particionada, conservando los ids, y la elimina. Las
+    particiones de los meses con filas se crean antes de copiar, para
+    que las filas no pasen por la partición por defecto.
+    """
+    cursor.execute(f"""
+        SELECT DISTINCT date_trunc('month', fecha_hora)::date
+        FROM {TABLA_SIN_PARTICIONAR} ORDER BY 1
+    """)
+    for (mes,) in cursor.fetchall():
+        crear_particion(cursor, mes)
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'mediciones'
+        ORDER BY ordinal_position
+    """)
+    columnas = ", ".join(columna for (columna,) in cursor.fetchall())
+    cursor.execute(f"""
+        INSERT INTO mediciones ({columnas})
+        SELECT {columnas} FROM {TABLA_SIN_PARTICIONAR};
+    """)
+    filas = cursor.rowcount
+    # Las filas nuevas continúan la numeración de las copiadas
+    cursor.execute(f"""
+        SELECT setval(pg_get_serial_sequence('mediciones', 'id'),
+                      (SELECT max(id) FROM {TABLA_SIN_PARTICIONAR}))
+        WHERE EXISTS (SELECT 1 FROM {TABLA_SIN_PARTICIONAR});
+    """)
+    cursor.execute(f"DROP TABLE {TABLA_SIN_PARTICIONAR};")
+    print(f"[+] {filas} filas copiadas a la tabla particionada 'mediciones'")
+    print("[INFO] Ejecute 'python -m app.agregados crear' y 'python -m app.indices crear' "
+          "para volver a crear sus disparadores, y luego 'python -m app.agregados reconstruir'")
+
+
 def crear_tabla_mediciones():
     """
     Función para crear la tabla de mediciones ambientales en la base de datos
@@ -20,22 +110,196 @@ def crear_tabla_mediciones():
         # Crear un cursor para ejecutar comandos SQL
         cursor = conexion.cursor()
         
-        # Query SQL para crear la tabla de mediciones ambientales
+        # Registro de estaciones de la red; la primera ('principal') es la
+        # de las filas escritas sin indicar estación
+        crear_tabla_estaciones_sql = """
+        CREATE TABLE IF NOT EXISTS estaciones (
+            id SERIAL PRIMARY KEY,                    -- Identificador único autoincremental
+            codigo TEXT NOT NULL UNIQUE,              -- Código de la estación (buffer local, secuencias)
+            nombre TEXT,                              -- Nombre descriptivo
+            latitud REAL,                             -- Ubicación en grados decimales
+            longitud REAL,
+            creada TIMESTAMP NOT NULL DEFAULT NOW()   -- Fecha y hora de registro
+        );
+        INSERT INTO estaciones (codigo, nombre) VALUES ('principal', 'Estación principal')
+        ON CONFLICT (codigo) DO NOTHING;
+        """
+        
+        # Query SQL para crear la tabla de mediciones ambientales,
+        # particionada por mes según fecha_hora. 'estacion_id' no tiene
+        # clave foránea a 'estaciones': la verificación por fila encarece
+        # la ingesta masiva, y las estaciones se registran antes de escribir.
+        # Las métricas deben coincidir con el registro de backend/app/esquema.py,
+        # que los servicios verifican al iniciar
         crear_tabla_sql = """
         CREATE TABLE IF NOT EXISTS mediciones (
-            id SERIAL PRIMARY KEY,                    -- Identificador único autoincremental
-            fecha_hora TIMESTAMP DEFAULT NOW(),       -- Fecha y hora de la medición (actual por defecto)
+            id SERIAL,                                -- Identificador único autoincremental
+            estacion_id INTEGER NOT NULL DEFAULT 1,   -- Estación que tomó la medición
+            fecha_hora TIMESTAMP NOT NULL DEFAULT NOW(), -- Fecha y hora de la medición (actual por defecto)
             pm25_ugm3 REAL,                           -- Concentración de PM 2.5 en μg/m3
             pm10_ugm3 REAL,                           -- Concentración de PM 10 en μg/m3
             ozono_ppb REAL,                           -- Concentración de ozono en partes por billón
-            indice_uv REAL,                           -- Indice UV (Derivado de la intensidad UV en mW/cm2)
+            intensidad_uv REAL,                       -- Intensidad de la radiación UV en mW/cm2
             temperatura REAL,                         -- Temperatura en grados Celsius
-            humedad_relativa REAL                     -- Humedad relativa en porcentaje
+            humedad_relativa REAL,                    -- Humedad relativa en porcentaje
+            ozono_mv REAL,                            -- Tensión de salida del MQ131 (crudo del ozono)
+            uv_mv REAL,                               -- Tensión de salida del GUVA-S12SD (crudo de UV)
+            PRIMARY KEY (id, fecha_hora)              -- La clave de partición debe formar parte de la clave primaria
+        ) PARTITION BY RANGE (fecha_hora);
+        ALTER TABLE mediciones
+            ADD COLUMN IF NOT EXISTS estacion_id INTEGER NOT NULL DEFAULT 1,
+            ADD COLUMN IF NOT EXISTS pm10_ugm3 REAL,
+            ADD COLUMN IF NOT EXISTS intensidad_uv REAL,
+            ADD COLUMN IF NOT EXISTS ozono_mv REAL,
+            ADD COLUMN IF NOT EXISTS uv_mv REAL;
+        """
+        
+        # Partición para filas fuera de las particiones mensuales creadas
+        crear_particion_default_sql = """
+        CREATE TABLE IF NOT EXISTS mediciones_default
+            PARTITION OF mediciones DEFAULT;
+        """
+        
+        # Crea (si no existe) la partición mensual de un mes. Un CREATE
+        # TABLE ... PARTITION OF falla si la partición por defecto ya tiene
+        # filas de ese mes, por lo que la partición se crea como tabla
+        # suelta, se le mueven esas filas y luego se adjunta; la
+        # restricción CHECK temporal evita que ATTACH PARTITION vuelva a
+        # recorrer la tabla. La usan mantenimiento_particiones y la carga
+        # masiva (app.backfill), que puede crear particiones desde varios
+        # procesos a la vez: un advisory lock los serializa.
+        # Devuelve las filas movidas, o NULL si la partición ya existía
+        crear_funcion_particion_sql = """
+        CREATE OR REPLACE FUNCTION crear_particion_mediciones(mes DATE) RETURNS BIGINT AS $$
+        DECLARE
+            inicio DATE := date_trunc('month', mes)::date;
+            fin DATE := (date_trunc('month', mes) + interval '1 month')::date;
+            nombre TEXT := 'mediciones_' || to_char(mes, 'YYYY_MM');
+            movidas BIGINT;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(x'70617274'::int);
+            IF to_regclass(nombre) IS NOT NULL THEN
+                RETURN NULL;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE mediciones INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                           nombre);
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I CHECK (fecha_hora >= %L AND fecha_hora < %L)',
+                           nombre, nombre || '_rango', inicio, fin);
+            EXECUTE format('WITH movidas AS (DELETE FROM mediciones_default '
+                           'WHERE fecha_hora >= %L AND fecha_hora < %L RETURNING *) '
+                           'INSERT INTO %I SELECT * FROM movidas', inicio, fin, nombre);
+            GET DIAGNOSTICS movidas = ROW_COUNT;
+            EXECUTE format('ALTER TABLE mediciones ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           nombre, inicio, fin);
+            EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', nombre, nombre || '_rango');
+            RETURN movidas;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+        
+        # Índices (se crean en cada partición): B-tree para las consultas
+        # por rango y la paginación por clave (fecha_hora, id) del endpoint
+        # /mediciones, y BRIN sobre el tiempo, que ocupa muy poco porque
+        # las filas llegan en orden de fecha_hora. El índice compuesto por
+        # estación resuelve las consultas de una estación (incluida la
+        # paginación) sin leer las filas de las demás
+        crear_indice_sql = """
+        CREATE INDEX IF NOT EXISTS idx_mediciones_fecha_hora_id
+            ON mediciones (fecha_hora, id);
+        CREATE INDEX IF NOT EXISTS idx_mediciones_estacion_fecha_hora
+            ON mediciones (estacion_id, fecha_hora, id);
+        CREATE INDEX IF NOT EXISTS idx_mediciones_fecha_hora_brin
+            ON mediciones USING BRIN (fecha_hora);
+        """
+        
+        # Última secuencia subida por cada estación desde su buffer local,
+        # para que un lote reenviado no se inserte dos veces. La época
+        # identifica el archivo del buffer: si cambia, la secuencia
+        # local volvió a empezar
+        crear_tabla_secuencias_sql = """
+        CREATE TABLE IF NOT EXISTS secuencias_estacion (
+            estacion TEXT PRIMARY KEY,                -- Identificador de la estación
+            ultima_secuencia BIGINT NOT NULL,         -- Última secuencia confirmada
+            epoca TEXT                                -- Época del buffer local que la subió
         );
+        ALTER TABLE secuencias_estacion ADD COLUMN IF NOT EXISTS epoca TEXT;
+        """
+        
+        # Contador de cambios de 'mediciones', validador de la caché HTTP
+        # de la API (app.models.obtener_version). Un disparador por
+        # sentencia lo incrementa en cada INSERT, UPDATE, DELETE o
+        # TRUNCATE sobre la tabla particionada, en la misma transacción
+        # que el cambio, por lo que se ve junto con las filas. Eliminar
+        # una partición no pasa por el disparador: mantenimiento_particiones
+        # lo incrementa aparte.
+        # La versión es la suma de 16 ranuras: cada transacción incrementa
+        # una que ninguna otra tenga bloqueada (SKIP LOCKED), así dos
+        # escritores concurrentes no esperan uno la confirmación del otro
+        crear_tabla_version_sql = """
+        CREATE TABLE IF NOT EXISTS version_mediciones (
+            ranura SMALLINT PRIMARY KEY,              -- Ranura del contador
+            version BIGINT NOT NULL,                  -- Cambios confirmados en la ranura
+            modificada TIMESTAMPTZ NOT NULL           -- Momento del último cambio en la ranura
+        );
+        INSERT INTO version_mediciones (ranura, version, modificada)
+        SELECT ranura, 0, NOW() FROM generate_series(0, 15) AS ranura
+        ON CONFLICT (ranura) DO NOTHING;
+        CREATE OR REPLACE FUNCTION incrementar_version_mediciones() RETURNS void AS $$
+        BEGIN
+            UPDATE version_mediciones SET version = version + 1, modificada = clock_timestamp()
+            WHERE ranura = (SELECT ranura FROM version_mediciones ORDER BY ranura
+                            FOR UPDATE SKIP LOCKED LIMIT 1);
+            IF NOT FOUND THEN
+                -- Todas las ranuras ocupadas: se espera por la primera
+                UPDATE version_mediciones SET version = version + 1, modificada = clock_timestamp()
+                WHERE ranura = 0;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        CREATE OR REPLACE FUNCTION marcar_cambio_mediciones() RETURNS trigger AS $$
+        BEGIN
+            PERFORM incrementar_version_mediciones();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        CREATE OR REPLACE TRIGGER mediciones_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON mediciones
+            FOR EACH STATEMENT EXECUTE FUNCTION marcar_cambio_mediciones();
+        """
+        
+        # Eventos del detector de umbrales y anomalías (app.alertas)
+        crear_tabla_alertas_sql = """
+        CREATE TABLE IF NOT EXISTS eventos_alerta (
+            id SERIAL PRIMARY KEY,                    -- Identificador único autoincremental
+            fecha_hora TIMESTAMP NOT NULL,            -- Fecha y hora de la medición que generó el evento
+            serie TEXT NOT NULL,                      -- Estación de la serie
+            metrica TEXT NOT NULL,                    -- Columna de la medición
+            tipo TEXT NOT NULL,                       -- umbral, pico, atascado o deriva
+            valor REAL,                               -- Valor de la medición
+            detalle TEXT                              -- Descripción del evento
+        );
+        CREATE INDEX IF NOT EXISTS idx_eventos_alerta_fecha_hora
+            ON eventos_alerta (fecha_hora);
         """
         
         # Ejecutar el comando SQL para crear la tabla
+        cursor.execute(crear_tabla_estaciones_sql)
+        sin_particionar = apartar_tabla_sin_particionar(cursor)
         cursor.execute(crear_tabla_sql)
+        cursor.execute(crear_particion_default_sql)
+        cursor.execute(crear_funcion_particion_sql)
+        if sin_particionar:
+            copiar_tabla_sin_particionar(cursor)
+        cursor.execute(crear_indice_sql)
+        cursor.execute(crear_tabla_secuencias_sql)
+        cursor.execute(crear_tabla_version_sql)
+        cursor.execute(crear_tabla_alertas_sql)
+        
+        # Crear las particiones del mes actual y los próximos, y las de
+        # los meses con filas en la partición por defecto (por ejemplo,
+        # las de una importación anterior a la partición de su mes)
+        crear_particiones(cursor)
+        repartir_default(cursor)
         
         # Confirmar los cambios en la base de datos
         conexion.commit()
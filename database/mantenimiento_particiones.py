@@ -0,0 +1,226 @@
+"""
+Mantenimiento de las particiones mensuales de la tabla 'mediciones':
+crea por adelantado las particiones futuras, mueve a particiones
+mensuales las filas que cayeron en la partición por defecto (datos
+históricos o importados) y elimina las que superan la retención,
+opcionalmente resumiéndolas antes por estación y hora en la tabla
+'mediciones_archivo'.
+
+Uso:
+    python mantenimiento_particiones.py --meses-futuros 3 --retencion-meses 12 --archivar
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import date
+
+import psycopg2
+import psycopg2.extensions
+
+# El registro de columnas vive en el backend (app/esquema.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.esquema import NOMBRES_AGREGABLES  # noqa: E402
+
+# Configuración de la conexión a la base de datos PostgreSQL
+DB_CONFIG = {
+    'host': 'localhost',          # Dirección del servidor de la base de datos
+    'port': 5432,                 # Puerto estándar de PostgreSQL
+    'database': 'mediciones_ambientales',  # Nombre de la base de datos
+    'user': 'postgres',           # Usuario de la base de datos
+    'password': 'postgres'        # Contraseña del usuario
+}
+
+# Con MEDICIONES_DSN ("dbname=... host=..." o una URI postgresql://...)
+# se reemplazan los valores anteriores que indique, por ejemplo para
+# usar otra base de datos en pruebas y benchmarks
+if os.environ.get("MEDICIONES_DSN"):
+    DB_CONFIG.update(psycopg2.extensions.parse_dsn(os.environ["MEDICIONES_DSN"]))
+    if 'dbname' in DB_CONFIG:
+        DB_CONFIG['database'] = DB_CONFIG.pop('dbname')
+
+# Columnas que se resumen en 'mediciones_archivo': las mismas que las
+# tablas de agregados (sin los valores crudos de los sensores)
+COLUMNAS_ARCHIVO = NOMBRES_AGREGABLES
+
+# Eliminar una partición no dispara el contador de cambios de
+# 'mediciones' (ver crear_tabla_mediciones.py), por lo que se incrementa aquí
+SQL_MARCAR_CAMBIO = "SELECT incrementar_version_mediciones();"
+
+# Nombre de las particiones mensuales: mediciones_AAAA_MM
+PATRON_PARTICION = re.compile(r"^mediciones_(\d{4})_(\d{2})$")
+
+
+def sumar_meses(fecha, meses):
+    """
+    Devuelve el primer día del mes que está 'meses' meses después de 'fecha'
+    """
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def crear_particion(cursor, mes):
+    """
+    Crea (si no existe) la partición del mes de 'mes', moviéndole las
+    filas de ese mes que estén en la partición por defecto (ver la
+    función crear_particion_mediciones en crear_tabla_mediciones.py).
+
+    Returns:
+        Filas movidas desde la partición por defecto, o None si la
+        partición ya existía.
+    """
+    cursor.execute("SELECT crear_particion_mediciones(%s)", (sumar_meses(mes, 0),))
+    return cursor.fetchone()[0]
+
+
+def crear_particiones(cursor, meses_futuros=3, desde=None):
+    """
+    Crea (si no existen) las particiones mensuales desde el mes de 'desde'
+    (el actual por defecto) hasta 'meses_futuros' meses después.
+    """
+    inicio = sumar_meses(desde or date.today(), 0)
+    for i in range(meses_futuros + 1):
+        mes = sumar_meses(inicio, i)
+        movidas = crear_particion(cursor, mes)
+        detalle = f" ({movidas} filas movidas desde mediciones_default)" if movidas else ""
+        print(f"[+] Partición mediciones_{mes:%Y_%m} lista{detalle}")
+
+
+def repartir_default(cursor):
+    """
+    Crea la partición de cada mes que tenga filas en la partición por
+    defecto y las mueve a ella, de modo que la partición por defecto
+    quede vacía y esos meses puedan archivarse y purgarse como los demás.
+
+    Returns:
+        Cantidad de filas movidas.
+    """
+    cursor.execute("""
+        SELECT DISTINCT date_trunc('month', fecha_hora)::date
+        FROM mediciones_default
+        ORDER BY 1
+    """)
+    total = 0
+    for (mes,) in cursor.fetchall():
+        movidas = crear_particion(cursor, mes) or 0
+        total += movidas
+        print(f"[+] Partición mediciones_{mes:%Y_%m} creada con {movidas} filas de mediciones_default")
+    return total
+
+
+def listar_particiones(cursor):
+    """
+    Devuelve [(nombre, primer día del mes)] de las particiones mensuales
+    de 'mediciones', ordenadas por mes.
+    """
+    cursor.execute("""
+        SELECT hija.relname
+        FROM pg_inherits
+        JOIN pg_class padre ON padre.oid = pg_inherits.inhparent
+        JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+        WHERE padre.relname = 'mediciones'
+    """)
+    particiones = []
+    for (nombre,) in cursor.fetchall():
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            particiones.append((nombre, date(int(coincidencia[1]), int(coincidencia[2]), 1)))
+    return sorted(particiones, key=lambda particion: particion[1])
+
+
+def archivar_particion(cursor, nombre):
+    """
+    Resume por estación y hora las filas de la partición en
+    'mediciones_archivo', un resumen de almacenamiento en frío: ningún
+    servicio lo consulta (el detalle y los agregados de los meses
+    eliminados quedan en el archivo columnar de app.archivo), y se
+    conserva para consultas manuales.
+
+    Las filas archivadas antes de separar por estación resumen toda la
+    red y quedan con estacion_id 0.
+    """
+    columnas = ", ".join(COLUMNAS_ARCHIVO)
+    definiciones = ",\n".join(f"            {columna} REAL" for columna in COLUMNAS_ARCHIVO)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS mediciones_archivo (
+            estacion_id INTEGER NOT NULL,             -- Estación resumida (0: toda la red)
+            hora TIMESTAMP NOT NULL,                  -- Inicio de la hora resumida
+            filas INTEGER NOT NULL,                   -- Mediciones en la hora
+{definiciones},
+            PRIMARY KEY (estacion_id, hora)
+        );
+    """)
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'mediciones_archivo'
+          AND column_name = 'estacion_id'
+    """)
+    if cursor.fetchone() is None:
+        # Tabla creada con la clave (hora): sus filas resumen toda la red
+        cursor.execute("""
+            ALTER TABLE mediciones_archivo ADD COLUMN estacion_id INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE mediciones_archivo ALTER COLUMN estacion_id DROP DEFAULT;
+            ALTER TABLE mediciones_archivo DROP CONSTRAINT mediciones_archivo_pkey;
+            ALTER TABLE mediciones_archivo ADD PRIMARY KEY (estacion_id, hora);
+        """)
+    # Una tabla creada con un registro de columnas anterior recibe las que falten
+    for columna in COLUMNAS_ARCHIVO:
+        cursor.execute(f"ALTER TABLE mediciones_archivo ADD COLUMN IF NOT EXISTS {columna} REAL;")
+    promedios = ", ".join(f"avg({columna})" for columna in COLUMNAS_ARCHIVO)
+    actualizaciones = ", ".join(f"{c} = EXCLUDED.{c}" for c in ("filas",) + COLUMNAS_ARCHIVO)
+    cursor.execute(f"""
+        INSERT INTO mediciones_archivo (estacion_id, hora, filas, {columnas})
+        SELECT estacion_id, date_trunc('hour', fecha_hora), count(*), {promedios}
+        FROM {nombre}
+        GROUP BY 1, 2
+        ON CONFLICT (estacion_id, hora) DO UPDATE SET {actualizaciones};
+    """)
+
+
+def purgar_particiones(cursor, retencion_meses=12, archivar=False):
+    """
+    Separa y elimina las particiones cuyos meses terminaron hace más de
+    'retencion_meses' meses. Eliminar una partición es una operación de
+    catálogo: no hay DELETE fila por fila ni VACUUM posterior.
+
+    Antes se reparten las filas de la partición por defecto, para que
+    las antiguas también se archiven y eliminen.
+    """
+    repartir_default(cursor)
+    limite = sumar_meses(date.today(), -retencion_meses)
+    for nombre, mes in listar_particiones(cursor):
+        if sumar_meses(mes, 1) > limite:
+            break
+        if archivar:
+            archivar_particion(cursor, nombre)
+        cursor.execute(f"ALTER TABLE mediciones DETACH PARTITION {nombre};")
+        cursor.execute(f"DROP TABLE {nombre};")
+        cursor.execute(SQL_MARCAR_CAMBIO)
+        print(f"[+] Partición {nombre} eliminada{' (archivada)' if archivar else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de 'mediciones'")
+    parser.add_argument("--meses-futuros", type=int, default=3,
+                        help="meses por adelantado con partición creada")
+    parser.add_argument("--retencion-meses", type=int, default=None,
+                        help="meses que se conservan; sin este valor no se elimina nada")
+    parser.add_argument("--archivar", action="store_true",
+                        help="resumir por estación y hora en 'mediciones_archivo' antes de eliminar")
+    args = parser.parse_args()
+
+    try:
+        conexion = psycopg2.connect(**DB_CONFIG)
+        with conexion, conexion.cursor() as cursor:
+            crear_particiones(cursor, args.meses_futuros)
+            repartir_default(cursor)
+            if args.retencion_meses is not None:
+                purgar_particiones(cursor, args.retencion_meses, args.archivar)
+        conexion.close()
+    except psycopg2.Error as error:
+        # Capturar y mostrar errores específicos de PostgreSQL
+        print(f"[!] Error en el mantenimiento de particiones: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,92 @@
 import { useEffect, useState } from "react";
 import axios from "axios";
 
+type Medicion = {
+  id: number;
+  estacion_id: number;
+  fecha_hora: string;
+  pm25_ugm3: number | null;
+  ozono_ppb: number | null;
+  intensidad_uv?: number | null;
+  indice_uv?: number | null;
+  temperatura: number | null;
+  humedad_relativa: number | null;
+};
+
+const API = "http://127.0.0.1:5000";
+
+// Ventana de mediciones recientes que se muestra
+const VENTANA_MS = 60 * 60 * 1000;
+
+// Filas que se conservan como máximo, aunque sean de la ventana
+const MAXIMO_FILAS = 2000;
+
+// Las estaciones guardan fecha_hora en hora local sin zona horaria
+function fechaLocalIso(fecha: Date): string {
+  const desfase = fecha.getTimezoneOffset() * 60 * 1000;
+  return new Date(fecha.getTime() - desfase).toISOString().slice(0, 23);
+}
+
+// Descarta las filas más antiguas (al principio) fuera de la ventana o del máximo
+function recortar(mediciones: Medicion[]): Medicion[] {
+  const limite = Date.now() - VENTANA_MS;
+  let inicio = Math.max(0, mediciones.length - MAXIMO_FILAS);
+  while (inicio < mediciones.length && new Date(mediciones[inicio].fecha_hora).getTime() < limite) {
+    inicio++;
+  }
+  return inicio > 0 ? mediciones.slice(inicio) : mediciones;
+}
+
 export default function MedicionesTable() {
-  const [mediciones, setMediciones] = useState([]);
+  const [mediciones, setMediciones] = useState<Medicion[]>([]);
 
   useEffect(() => {
-    axios.get("http://127.0.0.1:5000/mediciones")
-      .then(response => {
-        if (response.data.success) {
-          setMediciones(response.data.data);
+    let fuente: EventSource | null = null;
+    let cancelado = false;
+
+    async function cargar() {
+      // Sin 'desde' la API devuelve la primera página de toda la historia
+      const params: Record<string, string> = {
+        desde: fechaLocalIso(new Date(Date.now() - VENTANA_MS)),
+      };
+      const recientes: Medicion[] = [];
+      try {
+        for (;;) {
+          const response = await axios.get(`${API}/mediciones`, { params });
+          if (cancelado) return;
+          if (!response.data.success) break;
+          recientes.push(...response.data.data);
+          if (!response.data.next) break;
+          params.cursor = response.data.next;
         }
-      })
-      .catch(error => console.error("Error al obtener mediciones:", error));
+      } catch (error) {
+        console.error("Error al obtener mediciones:", error);
+      }
+      if (cancelado) return;
+      setMediciones(recortar(recientes));
+
+      // Recibir solo las mediciones nuevas, a partir de la última cargada
+      const ultimoId = recientes.reduce((maximo, m) => Math.max(maximo, m.id), 0);
+      const url = ultimoId > 0
+        ? `${API}/mediciones/stream?ultimo_id=${ultimoId}`
+        : `${API}/mediciones/stream`;
+      fuente = new EventSource(url);
+      fuente.addEventListener("medicion", (evento) => {
+        const medicion: Medicion = JSON.parse((evento as MessageEvent).data);
+        // La reanudación puede repetir mediciones ya recibidas
+        setMediciones(previas =>
+          previas.some(m => m.id === medicion.id) ? previas : recortar([...previas, medicion])
+        );
+      });
+      fuente.onerror = error => console.error("Error en el flujo de mediciones:", error);
+    }
+
+    cargar();
+
+    return () => {
+      cancelado = true;
+      fuente?.close();
+    };
   }, []);
 
   return (
@@ -31,14 +106,14 @@ export default function MedicionesTable() {
         </thead>
         <tbody>
           {mediciones.map((m) => (
-            <tr key={m[0]}>
-              <td>{m[0]}</td>
-              <td>{m[1]}</td>
-              <td>{m[2]}</td>
-              <td>{m[3]}</td>
-              <td>{m[4]}</td>
-              <td>{m[5]}</td>
-              <td>{m[6]}</td>
+            <tr key={m.id}>
+              <td>{m.id}</td>
+              <td>{m.fecha_hora}</td>
+              <td>{m.pm25_ugm3}</td>
+              <td>{m.ozono_ppb}</td>
+              <td>{m.intensidad_uv ?? m.indice_uv}</td>
+              <td>{m.temperatura}</td>
+              <td>{m.humedad_relativa}</td>
             </tr>
           ))}
         </tbody>